@@ -2,6 +2,20 @@ from django.contrib import admin
 
 from detect_ai_backend.api_keys.models import APIKey, APIKeyLog
 
+
 # Register your models here.
-admin.site.register(APIKey)
+@admin.register(APIKey)
+class APIKeyAdmin(admin.ModelAdmin):
+    list_display = ["prefix", "user", "api_key_type", "total_usage", "is_default"]
+    search_fields = ["prefix", "user__email"]
+    # The usage is flushed from the counters, see quota.py
+    readonly_fields = ["prefix", "hashed_key", "total_usage"]
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # Only write the edited fields, not usage flushed since the form loaded
+        obj.save(update_fields=form.changed_data)
+
+
 admin.site.register(APIKeyLog)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ApiKeysConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "detect_ai_backend.api_keys"
+
+    def ready(self):
+        import detect_ai_backend.api_keys.signals  # noqa
+
+        return super().ready()
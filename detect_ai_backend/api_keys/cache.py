@@ -0,0 +1,205 @@
+import logging
+import os
+import threading
+import uuid
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from kombu import Exchange, Queue
+from kombu.mixins import ConsumerMixin
+
+from detect_ai_backend.api_keys.models import APIKey
+from detect_ai_backend.celery import app as celery_app
+from detect_ai_backend.utils import metrics
+from detect_ai_backend.utils.cache import LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+# Fields HasAPIKey and the prediction views need, in model field order
+CACHED_FIELDS = [
+    field.attname
+    for field in APIKey._meta.concrete_fields
+    if field.attname
+    in {"id", "hashed_key", "user_id", "api_key_type", "maximum_usage", "is_default"}
+]
+
+local_cache = LocalLRUCache(
+    maxsize=settings.API_KEY_CACHE_LOCAL_MAXSIZE,
+    ttl=settings.API_KEY_CACHE_LOCAL_TTL,
+)
+
+invalidation_exchange = Exchange(
+    "api_key_invalidations", type="fanout", durable=False, auto_delete=True
+)
+
+_listener_lock = threading.Lock()
+_listener_started = False
+# Bumped on every local invalidation, see get_api_key
+_local_generation = 0
+
+
+def _reset_after_fork() -> None:
+    # The listener thread is not forked, a worker process starts its own
+    global _listener_lock, _listener_started
+    _listener_lock = threading.Lock()
+    _listener_started = False
+    local_cache.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _cache_key(hashed_key: str) -> str:
+    return f"api_key:{hashed_key}"
+
+
+def _generation_key(hashed_key: str) -> str:
+    return f"api_key_generation:{hashed_key}"
+
+
+def _invalidate_local(hashed_keys: Iterable[str]) -> None:
+    global _local_generation
+    _local_generation += 1
+    for hashed_key in hashed_keys:
+        local_cache.delete(hashed_key)
+
+
+def _load_api_key(hashed_key: str) -> tuple | None:
+    return (
+        APIKey.objects.filter(hashed_key=hashed_key).values_list(*CACHED_FIELDS).first()
+    )
+
+
+def get_api_key(hashed_key: str) -> APIKey | None:
+    """
+    Resolve an API key by its hash, looking in this process first, then in
+    the shared cache and finally in the database.
+
+    Shared entries are stored with the generation of the key they were read
+    at, which ``invalidate_api_keys`` bumps: a fill racing an invalidation is
+    never served, rather than served until it expires. Local fills racing an
+    invalidation of this process are dropped the same way.
+
+    The returned instance only has ``CACHED_FIELDS`` loaded, the usage
+    counters are deliberately left out because they change on every call.
+    """
+    _ensure_invalidation_listener()
+    values = local_cache.get(hashed_key)
+    if values is not None:
+        metrics.incr("api_key_cache.local_hits")
+    else:
+        local_generation = _local_generation
+        cache_key = _cache_key(hashed_key)
+        generation_key = _generation_key(hashed_key)
+        cached = cache.get_many([cache_key, generation_key])
+        generation = cached.get(generation_key, 0)
+        entry = cached.get(cache_key)
+        if entry is not None and entry[0] == generation:
+            values = entry[1]
+            metrics.incr("api_key_cache.shared_hits")
+        else:
+            metrics.incr("api_key_cache.misses")
+            values = _load_api_key(hashed_key)
+            if values is None:
+                return None
+            cache.set(
+                cache_key, (generation, values), timeout=settings.API_KEY_CACHE_TTL
+            )
+        if local_generation == _local_generation:
+            local_cache.set(hashed_key, values)
+    return APIKey.from_db(DEFAULT_DB_ALIAS, CACHED_FIELDS, values)
+
+
+def invalidate_api_keys(hashed_keys: Iterable[str]) -> None:
+    """
+    Drop keys from both cache levels and tell the other processes to drop
+    them from their local cache.
+    """
+    hashed_keys = [hashed_key for hashed_key in hashed_keys if hashed_key]
+    if not hashed_keys:
+        return
+    _invalidate_local(hashed_keys)
+    for hashed_key in hashed_keys:
+        # Kept without expiry, an entry must never outlive its generation
+        if not cache.add(_generation_key(hashed_key), 1, timeout=None):
+            cache.incr(_generation_key(hashed_key))
+    cache.delete_many([_cache_key(hashed_key) for hashed_key in hashed_keys])
+    if settings.API_KEY_CACHE_BROADCAST_INVALIDATION:
+        with celery_app.producer_pool.acquire(block=True) as producer:
+            producer.publish(
+                {"hashed_keys": hashed_keys},
+                exchange=invalidation_exchange,
+                declare=[invalidation_exchange],
+                serializer="json",
+                retry=True,
+            )
+
+
+def get_cache_stats() -> dict:
+    counters = metrics.get_counters(
+        "api_key_cache.local_hits",
+        "api_key_cache.shared_hits",
+        "api_key_cache.misses",
+    )
+    lookups = sum(counters.values())
+    hits = lookups - counters["api_key_cache.misses"]
+    return {
+        "local_hits": counters["api_key_cache.local_hits"],
+        "shared_hits": counters["api_key_cache.shared_hits"],
+        "misses": counters["api_key_cache.misses"],
+        "hit_ratio": round(hits / lookups, 4) if lookups else 0,
+        "local_size": len(local_cache),
+        "local_maxsize": local_cache.maxsize,
+    }
+
+
+class InvalidationListener(ConsumerMixin):
+    """
+    Consumes invalidations broadcast by other processes through an exclusive
+    queue bound to the fanout exchange.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.queue = Queue(
+            f"api_key_invalidations.{uuid.uuid4().hex}",
+            exchange=invalidation_exchange,
+            durable=False,
+            exclusive=True,
+            auto_delete=True,
+        )
+
+    def get_consumers(self, Consumer, channel):
+        return [
+            Consumer(queues=[self.queue], callbacks=[self.on_message], accept=["json"])
+        ]
+
+    def on_message(self, body, message):
+        _invalidate_local(body.get("hashed_keys", []))
+        message.ack()
+
+    def on_connection_revived(self):
+        # Invalidations may have been missed while disconnected
+        local_cache.clear()
+
+
+def _run_invalidation_listener():
+    with celery_app.connection_for_read() as connection:
+        InvalidationListener(connection).run()
+
+
+def _ensure_invalidation_listener():
+    global _listener_started
+    if _listener_started or not settings.API_KEY_CACHE_BROADCAST_INVALIDATION:
+        return
+    with _listener_lock:
+        if _listener_started:
+            return
+        threading.Thread(
+            target=_run_invalidation_listener,
+            name="api-key-invalidation-listener",
+            daemon=True,
+        ).start()
+        _listener_started = True
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.10 on 2026-10-18 15:35
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_hashed_keys(apps, schema_editor):
+    APIKey = apps.get_model("api_keys", "APIKey")
+    api_keys = list(APIKey.objects.all().only("id", "api_key"))
+    for api_key in api_keys:
+        api_key.hashed_key = hashlib.sha256(api_key.api_key.encode("utf-8")).hexdigest()
+        api_key.prefix = api_key.api_key[:8]
+    APIKey.objects.bulk_update(api_keys, ["hashed_key", "prefix"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_keys", "0002_alter_apikey_api_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="apikey",
+            name="hashed_key",
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="apikey",
+            name="prefix",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=8
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(
+            backfill_hashed_keys, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.10 on 2026-10-18 15:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_keys", "0003_apikey_hashed_key_apikey_prefix"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="apikey",
+            name="hashed_key",
+            field=models.CharField(editable=False, max_length=64, unique=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.10 on 2026-10-18 15:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_keys", "0004_alter_apikey_hashed_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="apikeylog",
+            name="image_key",
+            field=models.CharField(
+                blank=True, db_index=True, default="", max_length=64
+            ),
+        ),
+        migrations.AddField(
+            model_name="apikeylog",
+            name="image_url",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="apikeylog",
+            name="leader",
+            field=models.ForeignKey(
+                blank=True,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="followers",
+                to="api_keys.apikeylog",
+            ),
+        ),
+    ]
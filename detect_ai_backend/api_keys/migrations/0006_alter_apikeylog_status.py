@@ -0,0 +1,28 @@
+# Generated by Django 5.0.10 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_keys", "0005_apikeylog_image_key_apikeylog_image_url_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="apikeylog",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("success", "Success"),
+                    ("failed", "Failed"),
+                    ("pending", "Pending"),
+                    ("cancelled", "Cancelled"),
+                    ("expired", "Expired"),
+                ],
+                default="pending",
+                max_length=15,
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.10 on 2026-10-18 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_keys", "0006_alter_apikeylog_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="apikey",
+            name="usage_flush_token",
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
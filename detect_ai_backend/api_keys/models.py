@@ -1,3 +1,4 @@
+import hashlib
 import secrets
 
 from django.core.validators import MinValueValidator
@@ -9,10 +10,18 @@ from detect_ai_backend.users.models import User
 # Create your models here.
 
 
+API_KEY_PREFIX_LENGTH = 8
+
+
 def api_key_generator():
     return f"ak_{secrets.token_urlsafe(28)}"
 
 
+def hash_api_key(api_key: str) -> str:
+    # Keys are random 224-bit tokens, a fast unsalted digest is enough
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
 class APIKeyType(models.TextChoices):
     FREE_TIER = "free_tier"
     ENTERPRISE_TIER = "enterprise_tier"
@@ -21,6 +30,10 @@ class APIKeyType(models.TextChoices):
 
 class APIKey(models.Model):
     api_key = models.CharField(default=api_key_generator, max_length=42, editable=False)
+    hashed_key = models.CharField(max_length=64, unique=True, editable=False)
+    prefix = models.CharField(
+        max_length=API_KEY_PREFIX_LENGTH, db_index=True, editable=False
+    )
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     last_used = models.DateTimeField(blank=True, null=True, default=None)
@@ -29,6 +42,8 @@ class APIKey(models.Model):
     )
     maximum_usage = models.IntegerField(default=0, validators=[MinValueValidator(0)])
     total_usage = models.BigIntegerField(default=0, validators=[MinValueValidator(0)])
+    # Token of the last usage snapshot added to total_usage, see quota.py
+    usage_flush_token = models.CharField(max_length=32, blank=True, editable=False)
     is_default = models.BooleanField(default=False)
 
     def save(self, *args, **kwargs):
@@ -46,6 +61,10 @@ class APIKey(models.Model):
         if self.total_usage > self.maximum_usage:
             self.total_usage = self.maximum_usage
 
+        if not self.hashed_key:
+            self.hashed_key = hash_api_key(self.api_key)
+            self.prefix = self.api_key[:API_KEY_PREFIX_LENGTH]
+
         super().save(*args, **kwargs)
 
 
@@ -53,6 +72,8 @@ class APIKeyLogStatus(models.TextChoices):
     SUCCESS = "success"
     FAILED = "failed"
     PENDING = "pending"
+    CANCELLED = "cancelled"
+    EXPIRED = "expired"
 
 
 class APIKeyLog(models.Model):
@@ -61,3 +82,15 @@ class APIKeyLog(models.Model):
     status = models.CharField(
         choices=APIKeyLogStatus.choices, default=APIKeyLogStatus.PENDING, max_length=15
     )
+    image_url = models.TextField(blank=True, default="")
+    # Identifies the image (URL or content hash) to coalesce identical predictions
+    image_key = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    # Pending log whose prediction this log waits for instead of running its own
+    leader = models.ForeignKey(
+        "self",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        default=None,
+        related_name="followers",
+    )
@@ -0,0 +1,413 @@
+"""
+Usage metering for API keys.
+
+Reservations are counted in a fast counter store instead of the ``APIKey``
+row. For every key the store holds two counters:
+
+- ``pending``: units reserved since the last flush, which are not in the
+  database yet
+- ``persisted``: a mirror of ``APIKey.total_usage`` as last written by a flush
+
+Quota checks compare ``persisted + pending`` with ``maximum_usage``, so limits
+stay exact between flushes. Keys with pending changes are added to a dirty
+set, and ``flush_usage`` periodically moves their pending units to the
+database with one UPDATE per chunk of keys.
+
+A flush first snapshots the pending units of a key under a new token. The
+UPDATE records the token in ``APIKey.usage_flush_token`` and skips keys which
+already have it, and the snapshot is taken out of ``pending`` afterwards, so
+a flush interrupted before the key leaves the dirty set is completed exactly
+once by the next one.
+"""
+
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.db.models import (
+    BigIntegerField,
+    Case,
+    CharField,
+    DateTimeField,
+    F,
+    Q,
+    Value,
+    When,
+)
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from detect_ai_backend.api_keys.models import APIKey
+
+DIRTY_KEY = "usage:dirty"
+
+# Snapshot the counter KEYS[1] into the hash KEYS[2] under the token ARGV[1],
+# unless a snapshot is left over from an interrupted flush
+SNAPSHOT_SCRIPT = """
+local snapshot = redis.call('HMGET', KEYS[2], 'token', 'value')
+if snapshot[1] then
+    return snapshot
+end
+local value = redis.call('GET', KEYS[1])
+if not value or tonumber(value) == 0 then
+    return {false, false}
+end
+redis.call('HSET', KEYS[2], 'token', ARGV[1], 'value', value)
+return {ARGV[1], value}
+"""
+
+# Take the snapshot KEYS[2] out of the counter KEYS[1], returns what is left
+RELEASE_SCRIPT = """
+local value = redis.call('HGET', KEYS[2], 'value')
+redis.call('DEL', KEYS[2])
+if not value then
+    return tonumber(redis.call('GET', KEYS[1]) or 0)
+end
+return redis.call('INCRBY', KEYS[1], -tonumber(value))
+"""
+
+_local_lock = threading.Lock()
+
+
+class CacheCounterStore:
+    """
+    Counters kept in Django's shared cache, used in production. Sets and
+    snapshots are atomic on Redis, other backends only serve one process.
+    """
+
+    def incr(self, key: str, delta: int) -> int:
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            cache.add(key, 0, timeout=None)
+            return cache.incr(key, delta)
+
+    def get(self, key: str):
+        return cache.get(key)
+
+    def get_many(self, keys: list[str]) -> dict:
+        return cache.get_many(keys)
+
+    def add(self, key: str, value) -> bool:
+        return cache.add(key, value, timeout=None)
+
+    def set(self, key: str, value) -> None:
+        cache.set(key, value, timeout=None)
+
+    def delete_many(self, keys: list[str]) -> None:
+        cache.delete_many(keys)
+
+    def _redis(self, key: str):
+        backend = caches[DEFAULT_CACHE_ALIAS]
+        if not isinstance(backend, RedisCache):
+            return None, key
+        key = backend.make_and_validate_key(key)
+        return backend._cache.get_client(key, write=True), key
+
+    def add_to_set(self, key: str, member) -> None:
+        client, raw_key = self._redis(key)
+        if client is not None:
+            client.sadd(raw_key, member)
+            return
+        with _local_lock:
+            cache.set(key, cache.get(key, set()) | {member}, timeout=None)
+
+    def get_members(self, key: str) -> list:
+        client, raw_key = self._redis(key)
+        if client is not None:
+            return [int(member) for member in client.smembers(raw_key)]
+        return list(cache.get(key, set()))
+
+    def remove_from_set(self, key: str, member) -> None:
+        client, raw_key = self._redis(key)
+        if client is not None:
+            client.srem(raw_key, member)
+            return
+        with _local_lock:
+            cache.set(key, cache.get(key, set()) - {member}, timeout=None)
+
+    def snapshot(self, key: str, snapshot_key: str) -> tuple[str, int] | None:
+        """
+        Record the value of ``key`` under a new token, or return the snapshot
+        left over by an interrupted flush. None when there is nothing to take.
+        """
+        client, raw_key = self._redis(key)
+        if client is not None:
+            raw_snapshot_key = self._redis(snapshot_key)[1]
+            token, value = client.eval(
+                SNAPSHOT_SCRIPT, 2, raw_key, raw_snapshot_key, uuid.uuid4().hex
+            )
+            return (token.decode(), int(value)) if token else None
+        with _local_lock:
+            snapshot = cache.get(snapshot_key)
+            if snapshot is None and cache.get(key):
+                snapshot = (uuid.uuid4().hex, cache.get(key))
+                cache.set(snapshot_key, snapshot, timeout=None)
+        return snapshot
+
+    def release_snapshot(self, key: str, snapshot_key: str) -> int:
+        """
+        Subtract the snapshot from ``key`` and drop it. Returns the value left.
+        """
+        client, raw_key = self._redis(key)
+        if client is not None:
+            raw_snapshot_key = self._redis(snapshot_key)[1]
+            return client.eval(RELEASE_SCRIPT, 2, raw_key, raw_snapshot_key)
+        with _local_lock:
+            snapshot = cache.get(snapshot_key)
+            cache.delete(snapshot_key)
+            value = cache.get(key, 0) - (snapshot[1] if snapshot else 0)
+            cache.set(key, value, timeout=None)
+        return value
+
+
+class LocalCounterStore:
+    """
+    In-memory stand-in for ``CacheCounterStore``, used by the tests.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def incr(self, key: str, delta: int) -> int:
+        with self._lock:
+            self._data[key] = self._data.get(key, 0) + delta
+            return self._data[key]
+
+    def get(self, key: str):
+        return self._data.get(key)
+
+    def get_many(self, keys: list[str]) -> dict:
+        with self._lock:
+            return {key: self._data[key] for key in keys if key in self._data}
+
+    def add(self, key: str, value) -> bool:
+        with self._lock:
+            if key in self._data:
+                return False
+            self._data[key] = value
+            return True
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._data[key] = value
+
+    def delete_many(self, keys: list[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def add_to_set(self, key: str, member) -> None:
+        with self._lock:
+            self._data.setdefault(key, set()).add(member)
+
+    def get_members(self, key: str) -> list:
+        with self._lock:
+            return list(self._data.get(key, set()))
+
+    def remove_from_set(self, key: str, member) -> None:
+        with self._lock:
+            self._data.get(key, set()).discard(member)
+
+    def snapshot(self, key: str, snapshot_key: str) -> tuple[str, int] | None:
+        with self._lock:
+            if snapshot_key not in self._data and self._data.get(key):
+                self._data[snapshot_key] = (uuid.uuid4().hex, self._data[key])
+            return self._data.get(snapshot_key)
+
+    def release_snapshot(self, key: str, snapshot_key: str) -> int:
+        with self._lock:
+            snapshot = self._data.pop(snapshot_key, None)
+            if snapshot:
+                self._data[key] = self._data.get(key, 0) - snapshot[1]
+            return self._data.get(key, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_store = None
+
+
+def get_counter_store():
+    global _store
+    if _store is None:
+        _store = import_string(settings.API_KEY_USAGE_COUNTER_STORE)()
+    return _store
+
+
+def _pending_key(api_key_id: int) -> str:
+    return f"usage:pending:{api_key_id}"
+
+
+def _persisted_key(api_key_id: int) -> str:
+    return f"usage:persisted:{api_key_id}"
+
+
+def _last_used_key(api_key_id: int) -> str:
+    return f"usage:last_used:{api_key_id}"
+
+
+def _snapshot_key(api_key_id: int) -> str:
+    return f"usage:snapshot:{api_key_id}"
+
+
+def _get_persisted_usage(api_key_id: int) -> int:
+    store = get_counter_store()
+    persisted = store.get(_persisted_key(api_key_id))
+    if persisted is None:
+        total_usage = (
+            APIKey.objects.filter(id=api_key_id)
+            .values_list("total_usage", flat=True)
+            .first()
+        )
+        # A concurrent flush may have seeded a fresher value in the meantime
+        store.add(_persisted_key(api_key_id), total_usage or 0)
+        persisted = store.get(_persisted_key(api_key_id))
+    return persisted
+
+
+def get_usage(api_key_id: int) -> int:
+    """
+    Current usage of a key, including units not flushed to the database yet.
+    """
+    pending = get_counter_store().get(_pending_key(api_key_id)) or 0
+    return _get_persisted_usage(api_key_id) + pending
+
+
+def reserve_usage(api_key: APIKey, units: int = 1) -> bool:
+    """
+    Reserve ``units`` of quota for an API key.
+
+    The units are added to the pending counter first and taken back when the
+    key would go over its limit, so concurrent reservations can never exceed
+    ``maximum_usage``. Returns ``False`` when there is not enough quota left.
+    """
+    store = get_counter_store()
+    pending = store.incr(_pending_key(api_key.id), units)
+    if _get_persisted_usage(api_key.id) + pending > api_key.maximum_usage:
+        store.incr(_pending_key(api_key.id), -units)
+        return False
+    store.add_to_set(DIRTY_KEY, api_key.id)
+    return True
+
+
+def commit_usage(api_key_id: int) -> None:
+    """
+    Commit a reservation once its prediction completed. The unit is already
+    counted by ``reserve_usage``, so only the last usage time is recorded and
+    written to the database by the next flush.
+    """
+    store = get_counter_store()
+    store.set(_last_used_key(api_key_id), timezone.now())
+    store.add_to_set(DIRTY_KEY, api_key_id)
+
+
+def release_usage(api_key_id: int, units: int = 1) -> None:
+    """
+    Give back reserved units, e.g. when the prediction failed.
+    """
+    store = get_counter_store()
+    store.incr(_pending_key(api_key_id), -units)
+    store.add_to_set(DIRTY_KEY, api_key_id)
+
+
+def forget_usage(api_key_ids: list[int]) -> None:
+    """
+    Drop the persisted mirrors so they are reloaded from the database, e.g.
+    after ``total_usage`` was edited directly.
+    """
+    get_counter_store().delete_many(
+        [_persisted_key(api_key_id) for api_key_id in api_key_ids]
+    )
+
+
+def flush_usage(chunk_size: int = 1000) -> int:
+    """
+    Write the pending units and last usage times of the dirty keys to the
+    database. Returns the number of keys updated.
+    """
+    store = get_counter_store()
+    api_key_ids = store.get_members(DIRTY_KEY)
+    flushed = 0
+    for start in range(0, len(api_key_ids), chunk_size):
+        end = start + chunk_size
+        flushed += _flush_chunk(store, api_key_ids[start:end])
+    return flushed
+
+
+def _flush_chunk(store, api_key_ids: list[int]) -> int:
+    snapshots = {}
+    for api_key_id in api_key_ids:
+        snapshot = store.snapshot(_pending_key(api_key_id), _snapshot_key(api_key_id))
+        if snapshot is not None:
+            snapshots[api_key_id] = snapshot
+    values = store.get_many([_last_used_key(api_key_id) for api_key_id in api_key_ids])
+    last_used = {
+        api_key_id: values[_last_used_key(api_key_id)]
+        for api_key_id in api_key_ids
+        if _last_used_key(api_key_id) in values
+    }
+    dirty_ids = set(snapshots) | set(last_used)
+    for api_key_id in set(api_key_ids) - dirty_ids:
+        store.remove_from_set(DIRTY_KEY, api_key_id)
+    if not dirty_ids:
+        return 0
+
+    APIKey.objects.filter(id__in=dirty_ids).update(
+        # A snapshot already applied by an interrupted flush is skipped
+        total_usage=Greatest(
+            F("total_usage")
+            + Case(
+                *[
+                    When(
+                        Q(id=api_key_id) & ~Q(usage_flush_token=token),
+                        then=Value(delta),
+                    )
+                    for api_key_id, (token, delta) in snapshots.items()
+                ],
+                default=Value(0),
+                output_field=BigIntegerField(),
+            ),
+            0,
+        ),
+        usage_flush_token=Case(
+            *[
+                When(id=api_key_id, then=Value(token))
+                for api_key_id, (token, _) in snapshots.items()
+            ],
+            default=F("usage_flush_token"),
+            output_field=CharField(),
+        ),
+        last_used=Case(
+            *[
+                When(id=api_key_id, then=Value(t))
+                for api_key_id, t in last_used.items()
+            ],
+            default=F("last_used"),
+            output_field=DateTimeField(),
+        ),
+    )
+    store.delete_many([_last_used_key(api_key_id) for api_key_id in last_used])
+    totals = dict(
+        APIKey.objects.filter(id__in=dirty_ids).values_list("id", "total_usage")
+    )
+    for api_key_id in dirty_ids:
+        # Mirror first, then take the units out of pending: in between they
+        # are counted twice, which can only make the quota check stricter
+        if api_key_id in totals and api_key_id in snapshots:
+            store.set(_persisted_key(api_key_id), totals[api_key_id])
+        store.remove_from_set(DIRTY_KEY, api_key_id)
+        if api_key_id in snapshots:
+            left = store.release_snapshot(
+                _pending_key(api_key_id), _snapshot_key(api_key_id)
+            )
+            if left:
+                # Reserved while flushing
+                store.add_to_set(DIRTY_KEY, api_key_id)
+    return len(dirty_ids)
@@ -6,7 +6,7 @@ from detect_ai_backend.api_keys.models import APIKey
 class CreateAPIKeySerializer(serializers.ModelSerializer):
     class Meta:
         model = APIKey
-        exclude = ["user"]
+        exclude = ["user", "hashed_key"]
         extra_kwargs = {
             "total_usage": {"read_only": True},
             "api_key": {"read_only": True},
@@ -21,7 +21,7 @@ class ListAPIKeySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = APIKey
-        fields = "__all__"
+        exclude = ["hashed_key"]
         extra_kwargs = {
             "total_usage": {"read_only": True},
             "api_key": {"read_only": True},
@@ -56,3 +56,10 @@ class APIKeyUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = APIKey
         fields = ["is_default"]
+
+    def update(self, instance, validated_data):
+        # Never write back the usage counters read with the instance, they are
+        # updated concurrently by predictions
+        instance.is_default = validated_data.get("is_default", instance.is_default)
+        instance.save(update_fields=["is_default"])
+        return instance
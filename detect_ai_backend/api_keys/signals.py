@@ -0,0 +1,29 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from detect_ai_backend.api_keys.cache import invalidate_api_keys
+from detect_ai_backend.api_keys.models import APIKey
+from detect_ai_backend.api_keys.quota import forget_usage
+
+
+@receiver(post_save, sender=APIKey)
+def invalidate_saved_api_key(sender, instance, **kwargs):
+    hashed_keys = [instance.hashed_key]
+    if instance.is_default:
+        # save() clears is_default on the user's other keys with a bulk update
+        hashed_keys += (
+            APIKey.objects.filter(user_id=instance.user_id)
+            .exclude(id=instance.id)
+            .values_list("hashed_key", flat=True)
+        )
+    transaction.on_commit(partial(invalidate_api_keys, hashed_keys))
+    # total_usage may have been edited, reload it on the next quota check
+    transaction.on_commit(partial(forget_usage, [instance.id]))
+
+
+@receiver(post_delete, sender=APIKey)
+def invalidate_deleted_api_key(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_api_keys, [instance.hashed_key]))
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from detect_ai_backend.api_keys.quota import flush_usage
+from detect_ai_backend.celery import app as celery_app
+
+FLUSH_LOCK_KEY = "usage:flush_lock"
+
+
+@celery_app.task(name=f"{settings.APP_NAME}.flush_usage_counters")
+def flush_usage_counters():
+    # A slow flush must not overlap with the next scheduled one
+    if not cache.add(FLUSH_LOCK_KEY, 1, timeout=settings.API_KEY_USAGE_FLUSH_LOCK_TTL):
+        return 0
+    try:
+        return flush_usage()
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
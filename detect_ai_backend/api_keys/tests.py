@@ -1,13 +1,40 @@
 from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
 
 from django.conf import settings
-from django.test import TestCase
+from django.contrib import admin
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django.utils.timezone import now
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from detect_ai_backend.api_keys.models import APIKey, APIKeyLog, APIKeyLogStatus, User
+from detect_ai_backend.api_keys.admin import APIKeyAdmin
+from detect_ai_backend.api_keys.cache import (
+    InvalidationListener,
+    _load_api_key,
+    get_api_key,
+    invalidate_api_keys,
+    local_cache,
+)
+from detect_ai_backend.api_keys.models import (
+    APIKey,
+    APIKeyLog,
+    APIKeyLogStatus,
+    User,
+    hash_api_key,
+)
+from detect_ai_backend.api_keys.quota import (
+    LocalCounterStore,
+    commit_usage,
+    flush_usage,
+    get_counter_store,
+    get_usage,
+    release_usage,
+    reserve_usage,
+)
+from detect_ai_backend.api_keys.tasks import FLUSH_LOCK_KEY, flush_usage_counters
 
 
 class APIKeyViewsTestCase(TestCase):
@@ -30,6 +57,22 @@ class APIKeyViewsTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), 1)
 
+    def test_api_key_is_stored_hashed(self):
+        self.assertEqual(self.api_key.hashed_key, hash_api_key(self.api_key.api_key))
+        self.assertEqual(self.api_key.prefix, self.api_key.api_key[:8])
+        self.assertEqual(
+            APIKey.objects.get(hashed_key=hash_api_key(self.api_key.api_key)),
+            self.api_key,
+        )
+
+    def test_api_key_list_masks_key(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("list_create_api_key"))
+        result = response.data["results"][0]
+        key = self.api_key.api_key
+        self.assertEqual(result["api_key"], key[:5] + "***" + key[-5:])
+        self.assertNotIn("hashed_key", result)
+
     def test_api_key_list_unauthenticated_user(self):
         response = self.client.get(reverse("list_create_api_key"))
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -193,3 +236,234 @@ class APIKeyLogRetrieveViewTestCase(TestCase):
                 datetime.strptime(day, "%Y-%m-%d").date()
                 >= (self.today - timedelta(days=30))
             )
+
+
+class APIKeyQuotaTestCase(TestCase):
+    def setUp(self):
+        get_counter_store().clear()
+        self.user = User.objects.create_user(
+            email="quotauser@example.com",
+            password="testpass",  # nosec
+        )
+        self.api_key = APIKey.objects.create(user=self.user, maximum_usage=3)
+
+    def test_reserve_usage_within_limit(self):
+        self.assertTrue(reserve_usage(self.api_key, 2))
+        self.assertTrue(reserve_usage(self.api_key))
+        self.assertEqual(get_usage(self.api_key.id), 3)
+
+        # Reservations reach the database on flush only
+        self.api_key.refresh_from_db()
+        self.assertEqual(self.api_key.total_usage, 0)
+        self.assertEqual(flush_usage(), 1)
+        self.api_key.refresh_from_db()
+        self.assertEqual(self.api_key.total_usage, 3)
+        self.assertEqual(get_usage(self.api_key.id), 3)
+
+    def test_reserve_usage_over_limit_is_rejected(self):
+        self.assertTrue(reserve_usage(self.api_key, 2))
+        self.assertFalse(reserve_usage(self.api_key, 2))
+        self.assertEqual(get_usage(self.api_key.id), 2)
+
+    def test_limit_includes_persisted_usage(self):
+        APIKey.objects.filter(id=self.api_key.id).update(total_usage=2)
+        self.assertTrue(reserve_usage(self.api_key))
+        self.assertFalse(reserve_usage(self.api_key))
+        flush_usage()
+        self.assertFalse(reserve_usage(self.api_key))
+        self.api_key.refresh_from_db()
+        self.assertEqual(self.api_key.total_usage, 3)
+
+    def test_commit_and_release_usage(self):
+        reserve_usage(self.api_key, 2)
+        commit_usage(self.api_key.id)
+        release_usage(self.api_key.id)
+        flush_usage()
+        self.api_key.refresh_from_db()
+        self.assertEqual(self.api_key.total_usage, 1)
+        self.assertIsNotNone(self.api_key.last_used)
+
+    def test_release_after_flush(self):
+        reserve_usage(self.api_key, 2)
+        flush_usage()
+        release_usage(self.api_key.id, 2)
+        self.assertEqual(get_usage(self.api_key.id), 0)
+        flush_usage()
+        self.api_key.refresh_from_db()
+        self.assertEqual(self.api_key.total_usage, 0)
+
+    def test_flush_only_touches_dirty_keys(self):
+        other = APIKey.objects.create(user=self.user, maximum_usage=3)
+        with self.assertNumQueries(0):
+            self.assertEqual(flush_usage(), 0)
+
+        reserve_usage(other)
+        self.assertEqual(flush_usage(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(flush_usage(), 0)
+        other.refresh_from_db()
+        self.assertEqual(other.total_usage, 1)
+
+    def test_interrupted_flush_is_applied_once(self):
+        APIKey.objects.filter(id=self.api_key.id).update(maximum_usage=10)
+        self.api_key.refresh_from_db()
+        reserve_usage(self.api_key, 2)
+        with patch.object(
+            LocalCounterStore, "release_snapshot", side_effect=RuntimeError
+        ), patch.object(LocalCounterStore, "remove_from_set"):
+            with self.assertRaises(RuntimeError):
+                flush_usage()
+        self.api_key.refresh_from_db()
+        self.assertEqual(self.api_key.total_usage, 2)
+
+        # Reserved after the interrupted flush
+        reserve_usage(self.api_key)
+        self.assertEqual(flush_usage(), 1)
+        self.api_key.refresh_from_db()
+        self.assertEqual(self.api_key.total_usage, 2)
+        self.assertEqual(get_usage(self.api_key.id), 3)
+
+        self.assertEqual(flush_usage(), 1)
+        self.api_key.refresh_from_db()
+        self.assertEqual(self.api_key.total_usage, 3)
+        self.assertEqual(get_usage(self.api_key.id), 3)
+        self.assertEqual(flush_usage(), 0)
+
+    def test_flush_task_skips_when_locked(self):
+        reserve_usage(self.api_key)
+        cache.add(FLUSH_LOCK_KEY, 1)
+        try:
+            self.assertEqual(flush_usage_counters(), 0)
+        finally:
+            cache.delete(FLUSH_LOCK_KEY)
+        self.assertEqual(flush_usage_counters(), 1)
+
+    def test_update_does_not_overwrite_usage(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        stale_key = APIKey.objects.get(id=self.api_key.id)
+        reserve_usage(self.api_key, 2)
+        flush_usage()
+        with patch(
+            "detect_ai_backend.api_keys.views.get_object_or_404",
+            return_value=stale_key,
+        ):
+            response = client.put(
+                reverse("destroy_api_key", kwargs={"id": self.api_key.id}),
+                {"is_default": True},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.api_key.refresh_from_db()
+        self.assertTrue(self.api_key.is_default)
+        self.assertEqual(self.api_key.total_usage, 2)
+
+    def test_admin_change_does_not_overwrite_usage(self):
+        request = RequestFactory().post("/")
+        request.user = User.objects.create_superuser(
+            email="admin@example.com",
+            password="testpass",  # nosec
+        )
+        model_admin = APIKeyAdmin(APIKey, admin.site)
+        stale_key = APIKey.objects.get(id=self.api_key.id)
+        reserve_usage(self.api_key, 2)
+        flush_usage()
+
+        form_class = model_admin.get_form(request, stale_key, change=True)
+        self.assertNotIn("total_usage", form_class.base_fields)
+        form = form_class(
+            data={
+                "user": self.user.id,
+                "api_key_type": stale_key.api_key_type,
+                "maximum_usage": 5,
+                "is_default": stale_key.is_default,
+            },
+            instance=stale_key,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        model_admin.save_model(request, form.save(commit=False), form, change=True)
+
+        self.api_key.refresh_from_db()
+        self.assertEqual(self.api_key.maximum_usage, 5)
+        self.assertEqual(self.api_key.total_usage, 2)
+
+
+class APIKeyCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user(
+            email="cacheuser@example.com",
+            password="testpass",  # nosec
+        )
+        self.api_key = APIKey.objects.create(user=self.user, is_default=True)
+
+    def test_get_api_key_is_cached(self):
+        api_key = get_api_key(self.api_key.hashed_key)
+        self.assertEqual(api_key.id, self.api_key.id)
+        self.assertEqual(api_key.user_id, self.user.id)
+        self.assertTrue(api_key.is_default)
+
+        with self.assertNumQueries(0):
+            get_api_key(self.api_key.hashed_key)
+
+        local_cache.clear()
+        with self.assertNumQueries(0):
+            get_api_key(self.api_key.hashed_key)
+
+    def test_get_unknown_api_key(self):
+        self.assertIsNone(get_api_key(hash_api_key("ak_unknown")))
+
+    def test_save_invalidates_cache(self):
+        get_api_key(self.api_key.hashed_key)
+        with self.captureOnCommitCallbacks(execute=True):
+            other_api_key = APIKey.objects.create(user=self.user, is_default=True)
+
+        self.assertFalse(get_api_key(self.api_key.hashed_key).is_default)
+        self.assertTrue(get_api_key(other_api_key.hashed_key).is_default)
+
+    def test_fill_racing_invalidation_is_not_served(self):
+        def load_then_update(hashed_key):
+            values = _load_api_key(hashed_key)
+            APIKey.objects.filter(id=self.api_key.id).update(is_default=False)
+            invalidate_api_keys([hashed_key])
+            return values
+
+        with patch(
+            "detect_ai_backend.api_keys.cache._load_api_key",
+            side_effect=load_then_update,
+        ):
+            # Read before the update
+            self.assertTrue(get_api_key(self.api_key.hashed_key).is_default)
+
+        self.assertFalse(get_api_key(self.api_key.hashed_key).is_default)
+        local_cache.clear()
+        self.assertFalse(get_api_key(self.api_key.hashed_key).is_default)
+
+    def test_delete_invalidates_cache(self):
+        get_api_key(self.api_key.hashed_key)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.delete(reverse("destroy_api_key", kwargs={"id": self.api_key.id}))
+
+        self.assertIsNone(get_api_key(self.api_key.hashed_key))
+
+    @override_settings(API_KEY_CACHE_BROADCAST_INVALIDATION=True)
+    @patch("detect_ai_backend.api_keys.cache.celery_app")
+    def test_invalidation_is_broadcast(self, mock_celery_app):
+        producer = mock_celery_app.producer_pool.acquire.return_value.__enter__()
+        invalidate_api_keys([self.api_key.hashed_key])
+
+        producer.publish.assert_called_once()
+        body = producer.publish.call_args.args[0]
+        self.assertEqual(body, {"hashed_keys": [self.api_key.hashed_key]})
+
+    def test_broadcast_invalidation_is_applied_locally(self):
+        get_api_key(self.api_key.hashed_key)
+        message = MagicMock()
+        InvalidationListener(MagicMock()).on_message(
+            {"hashed_keys": [self.api_key.hashed_key]}, message
+        )
+
+        self.assertIsNone(local_cache.get(self.api_key.hashed_key))
+        message.ack.assert_called_once()
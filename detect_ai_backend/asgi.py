@@ -17,6 +17,7 @@ asgi_application = get_asgi_application()  # noqa
 
 from django.urls import path  # noqa
 
+from detect_ai_backend.utils.admission import AdmissionMiddleware  # noqa
 from detect_ai_backend.utils.authentication import (  # noqa
     AuthMiddlewareStack,
     HandleRouteNotFoundMiddleware,
@@ -34,8 +35,10 @@ application = ProtocolTypeRouter(
         "http": asgi_application,
         # Just HTTP for now. (We can add other protocols later.)
         "websocket": AllowedHostsOriginValidator(
-            AuthMiddlewareStack(
-                HandleRouteNotFoundMiddleware(URLRouter(websocket_urlpatterns))
+            AdmissionMiddleware(
+                AuthMiddlewareStack(
+                    HandleRouteNotFoundMiddleware(URLRouter(websocket_urlpatterns))
+                )
             )
         ),
     }
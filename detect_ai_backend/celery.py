@@ -20,6 +20,36 @@ app.autodiscover_tasks(settings.CELERY_TASKS)
 app.conf.result_backend = "rpc://"
 app.conf.task_default_queue = f"{settings.CELERY_APP_NAME}_queue"
 app.conf.broker_connection_retry_on_startup = True
+app.conf.task_routes = {
+    f"{settings.APP_NAME}.{task}": {"queue": f"{settings.CELERY_APP_NAME}_{key}"}
+    for task, key in settings.CELERY_QUEUE_ROUTES.items()
+}
+app.conf.beat_schedule = {
+    "flush-api-key-usage": {
+        "task": f"{settings.APP_NAME}.flush_usage_counters",
+        "schedule": settings.API_KEY_USAGE_FLUSH_INTERVAL,
+    },
+    "dispatch-pending-predictions": {
+        "task": f"{settings.APP_NAME}.dispatch_predictions",
+        "schedule": settings.PREDICTION_DISPATCH_INTERVAL,
+    },
+    "ingest-prediction-results": {
+        "task": f"{settings.APP_NAME}.ingest_results",
+        "schedule": settings.PREDICTION_INGEST_INTERVAL,
+    },
+    "prune-prediction-results": {
+        "task": f"{settings.APP_NAME}.prune_prediction_results",
+        "schedule": settings.PREDICTION_RESULT_CACHE_PRUNE_INTERVAL,
+    },
+    "deliver-webhooks": {
+        "task": f"{settings.APP_NAME}.deliver_webhooks",
+        "schedule": settings.WEBHOOK_DELIVERY_INTERVAL,
+    },
+    "relay-outbox": {
+        "task": f"{settings.APP_NAME}.relay_outbox",
+        "schedule": settings.OUTBOX_RELAY_INTERVAL,
+    },
+}
 # app.conf.task_queues = app.conf.task_queues + (
 #         Queue(
 #             f"{settings.SERVICE_NAME}_new_organization",
@@ -10,3 +10,5 @@ class SignedGCPStorageURLResponseSerializer(serializers.Serializer):
 
 class SignedGCPStorageURLRequestSerializer(serializers.Serializer):
     mime_type = serializers.ChoiceField(choices=IMAGE_TYPE_CHOICES)
+    # Hex MD5 of the file, enforced by the storage on upload
+    md5 = serializers.RegexField(r"^[0-9a-fA-F]{32}$", required=False)
@@ -6,6 +6,10 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from detect_ai_backend.predictions.singleflight import (
+    get_image_keys,
+    record_content_hash,
+)
 from detect_ai_backend.users.models import User  # Adjust import as needed
 
 
@@ -60,6 +64,31 @@ class SignedGCPStorageURLViewTestCase(TestCase):
         # Verify the mock was called with correct arguments
         mock_generate_url.assert_called_once_with(self.valid_payload["mime_type"])
 
+    @patch("detect_ai_backend.files.views.generate_upload_signed_url_v4")
+    def test_generate_signed_url_with_md5(self, mock_generate_url):
+        """
+        Test the MD5 is enforced on upload, but not trusted as the content hash
+        of the file before the storage computed it
+        """
+        mock_generate_url.return_value = (
+            "https://storage.googleapis.com/signed-url",
+            "test-file-123.jpg",
+        )
+        md5 = "0123456789abcdef" * 2
+
+        response = self.client.post(
+            self.signed_url_endpoint, {"mime_type": "image/jpeg", "md5": md5}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mock_generate_url.assert_called_once_with("image/jpeg", content_md5=md5)
+        record_content_hash(f"{settings.GCP_STORAGE_URL}/other.jpg", md5)
+        self.assertNotEqual(
+            *get_image_keys(
+                [response.data["file_url"], f"{settings.GCP_STORAGE_URL}/other.jpg"]
+            )
+        )
+
     def test_unauthenticated_access(self):
         """
         Test that unauthenticated users cannot generate signed URLs
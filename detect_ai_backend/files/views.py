@@ -23,12 +23,17 @@ class SignedGCPStorageURLView(generics.CreateAPIView):
         serializer.is_valid(raise_exception=True)
         validated_data = serializer.validated_data
 
-        url, file_name = generate_upload_signed_url_v4(validated_data["mime_type"])
+        md5 = validated_data.get("md5")
+        kwargs = {"content_md5": md5} if md5 else {}
+        url, file_name = generate_upload_signed_url_v4(
+            validated_data["mime_type"], **kwargs
+        )
+        file_url = f"{settings.GCP_STORAGE_URL}/{file_name}"
 
         return response.Response(
             status=status.HTTP_201_CREATED,
             data={
                 "upload_url": url,
-                "file_url": f"{settings.GCP_STORAGE_URL}/{file_name}",
+                "file_url": file_url,
             },
         )
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.10 on 2026-10-18 15:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_keys", "0005_apikeylog_image_key_apikeylog_image_url_and_more"),
+        ("history", "0003_alter_history_created_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="history",
+            name="api_key_log",
+            field=models.OneToOneField(
+                blank=True,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="history",
+                to="api_keys.apikeylog",
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.0.10 on 2026-10-18 17:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def backfill_event_ids(apps, schema_editor):
+    # Clients resume from History ids so far, existing rows keep them
+    History = apps.get_model("history", "History")
+    HistorySequence = apps.get_model("history", "HistorySequence")
+    History.objects.update(event_id=F("id"))
+    HistorySequence.objects.bulk_create(
+        [
+            HistorySequence(user_id=user_id, last_event_id=last_event_id)
+            for user_id, last_event_id in History.objects.values("user_id")
+            .annotate(last_event_id=Max("id"))
+            .values_list("user_id", "last_event_id")
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_keys", "0007_apikey_usage_flush_token"),
+        ("history", "0004_history_api_key_log"),
+        ("users", "0005_seed_users"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HistorySequence",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("last_event_id", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="history",
+            name="event_id",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(
+            backfill_event_ids, reverse_code=migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="history",
+            constraint=models.UniqueConstraint(
+                fields=("user", "event_id"), name="history_user_event_id_unique"
+            ),
+        ),
+    ]
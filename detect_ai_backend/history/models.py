@@ -1,5 +1,6 @@
 from django.db import models
 
+from detect_ai_backend.api_keys.models import APIKeyLog
 from detect_ai_backend.users.models import User
 
 # Create your models here.
@@ -10,3 +11,29 @@ class History(models.Model):
     results = models.JSONField()
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    api_key_log = models.OneToOneField(
+        APIKeyLog,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        default=None,
+        related_name="history",
+    )
+    # Position of the row in the user's result stream, see create_histories
+    event_id = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "event_id"], name="history_user_event_id_unique"
+            )
+        ]
+
+
+class HistorySequence(models.Model):
+    """
+    Last event id given to the history rows of a user.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    last_event_id = models.BigIntegerField(default=0)
@@ -1,3 +1,173 @@
-from django.test import TestCase  # noqa
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from detect_ai_backend.api_keys.models import APIKey, APIKeyLog, APIKeyLogStatus
+from detect_ai_backend.api_keys.quota import (
+    flush_usage,
+    get_counter_store,
+    get_usage,
+    reserve_usage,
+)
+from detect_ai_backend.history.models import History, HistorySequence
+from detect_ai_backend.predictions.ingestion import ingest_results, receive_result
+from detect_ai_backend.predictions.models import ReceivedResult
+from detect_ai_backend.predictions.status import create_histories
+from detect_ai_backend.predictions.tasks import ingest_received_results
+from detect_ai_backend.users.models import User
+
+
+@patch("detect_ai_backend.predictions.fanout.publish_message_to_group")
+@patch("detect_ai_backend.predictions.ingestion.celery_app")
+class ResultIngestionTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_counter_store().clear()
+        self.user = User.objects.create_user(
+            email="historyuser@example.com",
+            password="testpass",  # nosec
+        )
+        self.api_key = APIKey.objects.create(user=self.user)
+        reserve_usage(self.api_key, 3)
+        self.api_key_logs = [
+            APIKeyLog.objects.create(api_key=self.api_key) for _ in range(3)
+        ]
+        self.api_key_log = self.api_key_logs[0]
+        self.image_url = "https://example.com/a.png"
+
+    def receive(self, api_key_log, status):
+        receive_result(
+            {
+                "email": self.user.email,
+                "image_url": self.image_url,
+                "log_id": api_key_log.id,
+                "status": status,
+            }
+        )
+
+    def test_success_commits_reservation(self, *mocks):
+        self.receive(self.api_key_log, APIKeyLogStatus.SUCCESS)
+        ingest_results()
+
+        flush_usage()
+        self.api_key.refresh_from_db()
+        self.api_key_log.refresh_from_db()
+        self.assertEqual(self.api_key.total_usage, 3)
+        self.assertIsNotNone(self.api_key.last_used)
+        self.assertEqual(self.api_key_log.status, APIKeyLogStatus.SUCCESS)
+        self.assertEqual(History.objects.filter(user=self.user).count(), 1)
+
+    def test_failure_releases_reservation(self, *mocks):
+        self.receive(self.api_key_log, APIKeyLogStatus.FAILED)
+        ingest_results()
+
+        self.assertEqual(get_usage(self.api_key.id), 2)
+
+    def test_results_are_ingested_in_batches(self, mock_celery_app, _):
+        statuses = [APIKeyLogStatus.SUCCESS, APIKeyLogStatus.FAILED] * 2
+        statuses = statuses[:3]
+        for api_key_log, status in zip(self.api_key_logs, statuses):
+            self.receive(api_key_log, status)
+        # Results arriving before the batch runs share it
+        mock_celery_app.send_task.assert_called_once()
+
+        with self.assertNumQueries(13):
+            self.assertEqual(ingest_results(batch_size=2), 2)
+        self.assertEqual(ingest_results(batch_size=2), 1)
+
+        self.assertEqual(
+            list(APIKeyLog.objects.order_by("id").values_list("status", flat=True)),
+            statuses,
+        )
+        self.assertEqual(History.objects.count(), 3)
+        self.assertEqual(get_usage(self.api_key.id), 2)
+        # Handed to the delivery queue, one message per user and batch
+        calls = mock_celery_app.send_task.call_args_list[1:]
+        self.assertEqual(
+            [call.args[0] for call in calls],
+            [f"{settings.APP_NAME}.send_results"] * 2,
+        )
+        # Sent with the event ids clients resume from, following storing order
+        event_ids = dict(History.objects.values_list("api_key_log_id", "event_id"))
+        self.assertEqual(sorted(event_ids.values()), [1, 2, 3])
+        for call in calls:
+            _, _, results, sent_event_ids = call.kwargs["args"]
+            self.assertEqual(
+                sent_event_ids, {log_id: event_ids[log_id] for log_id in results}
+            )
+
+    def test_redelivered_result_is_ignored(self, *mocks):
+        self.receive(self.api_key_log, APIKeyLogStatus.FAILED)
+        self.receive(self.api_key_log, APIKeyLogStatus.FAILED)
+        self.assertEqual(ReceivedResult.objects.count(), 1)
+        ingest_results()
+        self.receive(self.api_key_log, APIKeyLogStatus.FAILED)
+        ingest_results()
+
+        self.assertEqual(get_usage(self.api_key.id), 2)
+        self.assertEqual(History.objects.filter(user=self.user).count(), 1)
+
+    def test_late_result_of_cancelled_log_is_not_stored(self, *mocks):
+        APIKeyLog.objects.filter(id=self.api_key_log.id).update(
+            status=APIKeyLogStatus.CANCELLED
+        )
+        self.receive(self.api_key_log, APIKeyLogStatus.SUCCESS)
+        ingest_results()
+
+        self.assertFalse(History.objects.exists())
+
+    @override_settings(
+        PREDICTION_INGEST_BATCH_SIZE=1,
+        CELERY_WORKER_POOLS={
+            "persistence": {"queues": ["persistence"], "concurrency": 4},
+        },
+    )
+    def test_backlog_is_ingested_in_parallel(self, mock_celery_app, _):
+        for api_key_log in self.api_key_logs:
+            self.receive(api_key_log, APIKeyLogStatus.SUCCESS)
+        mock_celery_app.reset_mock()
+
+        ingest_received_results()
+
+        # Two results left, one pass each, within the pool's concurrency
+        slots = [
+            call.kwargs["args"]
+            for call in mock_celery_app.send_task.call_args_list
+            if call.args[0] == f"{settings.APP_NAME}.ingest_results"
+        ]
+        self.assertEqual(slots, [[0], [1]])
+
+
+class CreateHistoriesTestCase(TestCase):
+    def test_event_ids_follow_each_users_sequence(self):
+        users = [
+            User.objects.create_user(
+                email=f"sequence{index}@example.com",
+                password="testpass",  # nosec
+            )
+            for index in range(2)
+        ]
+
+        def create(*users):
+            return [
+                history.event_id
+                for history in create_histories(
+                    [
+                        History(user=user, image_url="a.png", results={})
+                        for user in users
+                    ]
+                )
+            ]
+
+        self.assertEqual(create(users[0], users[1], users[0]), [1, 1, 2])
+        self.assertEqual(create(users[1]), [2])
+        self.assertEqual(
+            list(
+                HistorySequence.objects.order_by("user_id").values_list(
+                    "last_event_id", flat=True
+                )
+            ),
+            [2, 2],
+        )
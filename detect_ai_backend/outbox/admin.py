@@ -0,0 +1,9 @@
+from django.contrib import admin
+
+from detect_ai_backend.outbox.models import OutboxMessage
+
+
+# Register your models here.
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ["task_name", "task_id", "created_at"]
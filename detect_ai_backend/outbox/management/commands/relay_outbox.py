@@ -0,0 +1,38 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from detect_ai_backend.celery import app as celery_app
+from detect_ai_backend.outbox.relay import relay_outbox
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Continuously publish outbox messages to the broker."
+
+    def handle(self, *args, **options):
+        failures = 0
+        while True:
+            try:
+                # One producer, and so one broker connection, until it fails
+                with celery_app.producer_pool.acquire(block=True) as producer:
+                    while True:
+                        # Drop a database connection broken or too old
+                        close_old_connections()
+                        relayed = relay_outbox(producer=producer)
+                        failures = 0
+                        if relayed < settings.OUTBOX_BATCH_SIZE:
+                            time.sleep(settings.OUTBOX_POLL_INTERVAL)
+            except Exception:
+                # The failed batch stays in the outbox for the next pass
+                failures += 1
+                delay = min(
+                    settings.OUTBOX_RETRY_BACKOFF * 2 ** (failures - 1),
+                    settings.OUTBOX_RETRY_BACKOFF_MAX,
+                )
+                logger.exception("Outbox relay failed, retrying in %ss", delay)
+                time.sleep(delay)
@@ -0,0 +1,22 @@
+import uuid
+
+from django.db import models
+from django.utils import timezone
+
+
+def generate_task_id():
+    return uuid.uuid4().hex
+
+
+class OutboxMessage(models.Model):
+    """
+    Celery task to publish once the transaction that wrote it commits, see
+    ``detect_ai_backend.outbox.relay``.
+    """
+
+    task_name = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    options = models.JSONField(default=dict)
+    # Kept across relay attempts, a message published twice has the same id
+    task_id = models.CharField(max_length=64, default=generate_task_id)
+    created_at = models.DateTimeField(default=timezone.now)
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db import transaction
+
+from detect_ai_backend.celery import app as celery_app
+from detect_ai_backend.outbox.models import OutboxMessage
+from detect_ai_backend.utils import metrics
+
+
+def publish_task(task_name: str, args=None, **options) -> None:
+    """
+    Publish a Celery task along with the current transaction: it is written
+    to the outbox and reaches the broker once committed, never when rolled
+    back, and without the request waiting on the broker. ``options`` are
+    ``send_task`` options and must be JSON serializable.
+    """
+    OutboxMessage.objects.create(task_name=task_name, args=args or [], options=options)
+
+
+def relay_outbox(batch_size: int | None = None, producer=None) -> int:
+    """
+    Publish the oldest outbox messages over a single pooled producer and
+    delete them in the same transaction. A failure leaves the whole batch for
+    the next pass; messages published before it go again with the same task
+    id. Returns the number of messages relayed.
+    """
+    if batch_size is None:
+        batch_size = settings.OUTBOX_BATCH_SIZE
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True).order_by("id")[
+                :batch_size
+            ]
+        )
+        if not messages:
+            return 0
+        with celery_app.producer_or_acquire(producer) as producer:
+            for message in messages:
+                celery_app.send_task(
+                    message.task_name,
+                    args=message.args,
+                    task_id=message.task_id,
+                    producer=producer,
+                    **message.options,
+                )
+        OutboxMessage.objects.filter(
+            id__in=[message.id for message in messages]
+        ).delete()
+    metrics.incr("outbox.relayed", len(messages))
+    return len(messages)
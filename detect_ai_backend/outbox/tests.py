@@ -0,0 +1,80 @@
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, transaction
+from django.test import TestCase, override_settings
+
+from detect_ai_backend.outbox.models import OutboxMessage
+from detect_ai_backend.outbox.relay import publish_task, relay_outbox
+
+
+@patch("detect_ai_backend.outbox.relay.celery_app")
+class OutboxRelayTestCase(TestCase):
+    def test_messages_are_relayed_in_order_over_one_producer(self, mock_celery_app):
+        for index in range(3):
+            publish_task("app.task", args=[index], countdown=5)
+        task_ids = list(OutboxMessage.objects.values_list("task_id", flat=True))
+
+        self.assertEqual(relay_outbox(batch_size=2), 2)
+        self.assertEqual(relay_outbox(batch_size=2), 1)
+        self.assertEqual(relay_outbox(), 0)
+
+        self.assertFalse(OutboxMessage.objects.exists())
+        calls = mock_celery_app.send_task.call_args_list
+        self.assertEqual([call.kwargs["args"] for call in calls], [[0], [1], [2]])
+        self.assertEqual([call.kwargs["task_id"] for call in calls], task_ids)
+        self.assertEqual(calls[0].kwargs["countdown"], 5)
+        producer = mock_celery_app.producer_or_acquire.return_value.__enter__()
+        self.assertEqual(calls[0].kwargs["producer"], producer)
+
+    def test_rolled_back_messages_are_not_relayed(self, mock_celery_app):
+        try:
+            with transaction.atomic():
+                publish_task("app.task")
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertEqual(relay_outbox(), 0)
+        mock_celery_app.send_task.assert_not_called()
+
+    def test_failed_publish_keeps_the_batch(self, mock_celery_app):
+        publish_task("app.task")
+        publish_task("app.task")
+        task_ids = list(OutboxMessage.objects.values_list("task_id", flat=True))
+        mock_celery_app.send_task.side_effect = [None, ConnectionError]
+
+        with self.assertRaises(ConnectionError):
+            relay_outbox()
+
+        self.assertEqual(
+            list(OutboxMessage.objects.values_list("task_id", flat=True)), task_ids
+        )
+
+
+@patch("detect_ai_backend.outbox.management.commands.relay_outbox.time.sleep")
+@patch(
+    "detect_ai_backend.outbox.management.commands.relay_outbox.close_old_connections"
+)
+@patch("detect_ai_backend.outbox.management.commands.relay_outbox.celery_app")
+@patch("detect_ai_backend.outbox.management.commands.relay_outbox.relay_outbox")
+class RelayOutboxCommandTestCase(TestCase):
+    @override_settings(OUTBOX_RETRY_BACKOFF=1, OUTBOX_RETRY_BACKOFF_MAX=30)
+    def test_failures_are_retried_with_backoff(
+        self, mock_relay_outbox, mock_celery_app, mock_close, mock_sleep
+    ):
+        mock_relay_outbox.side_effect = [
+            OperationalError(),
+            OperationalError(),
+            settings.OUTBOX_BATCH_SIZE,
+            KeyboardInterrupt(),
+        ]
+
+        with self.assertRaises(KeyboardInterrupt), self.assertLogs(level="ERROR"):
+            call_command("relay_outbox")
+
+        self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [1, 2])
+        # A fresh producer after each failure
+        self.assertEqual(mock_celery_app.producer_pool.acquire.call_count, 3)
+        self.assertEqual(mock_close.call_count, 4)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class PredictionsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "detect_ai_backend.predictions"
+
+    def ready(self):
+        import detect_ai_backend.predictions.checks  # noqa
+
+        return super().ready()
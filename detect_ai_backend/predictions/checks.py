@@ -0,0 +1,8 @@
+from django.core import checks
+
+from detect_ai_backend.utils.celery import check_task_routes
+
+
+@checks.register()
+def check_celery_routes(app_configs, **kwargs):
+    return [checks.Error(error, id="predictions.E001") for error in check_task_routes()]
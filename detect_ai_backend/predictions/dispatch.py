@@ -0,0 +1,411 @@
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from kombu import Exchange, Queue
+
+from detect_ai_backend.api_keys.models import APIKeyLog, APIKeyLogStatus, APIKeyType
+from detect_ai_backend.api_keys.quota import release_usage
+from detect_ai_backend.celery import app as celery_app
+from detect_ai_backend.outbox.relay import publish_task
+from detect_ai_backend.predictions.fanout import send_final_statuses
+from detect_ai_backend.predictions.inline import resolve_inline_images
+from detect_ai_backend.predictions.models import (
+    PendingPrediction,
+    PendingPredictionStatus,
+)
+from detect_ai_backend.utils import metrics
+
+DISPATCH_SCHEDULED_KEY = "predictions:dispatch_scheduled"
+DISPATCH_LOCK_KEY = "predictions:dispatch_lock"
+
+
+def get_route(api_key_type: str) -> dict:
+    """
+    Queue and AMQP priority for predictions made with a key of this tier,
+    see ``PREDICTION_ROUTES``.
+    """
+    route = settings.PREDICTION_ROUTES.get(
+        api_key_type, settings.PREDICTION_ROUTES[APIKeyType.FREE_TIER]
+    )
+    queue_arguments = {}
+    if settings.PREDICTION_QUEUE_MAX_PRIORITY:
+        # Must match the declaration of the AI server or the broker refuses it
+        queue_arguments["x-max-priority"] = settings.PREDICTION_QUEUE_MAX_PRIORITY
+    queue_name = route["queue"].format(ai_server_name=settings.AI_SERVER_NAME)
+    return {
+        "queue": Queue(
+            queue_name,
+            Exchange(queue_name),
+            routing_key=queue_name,
+            queue_arguments=queue_arguments,
+        ),
+        "priority": route.get("priority", 0),
+    }
+
+
+def _get_expires(payloads: list[dict]) -> float | None:
+    """
+    Seconds until the message may be dropped unrun: the latest deadline of its
+    predictions, none when one of them has no deadline.
+    """
+    deadlines = [payload.get("expires_at") for payload in payloads]
+    if not all(deadlines):
+        return None
+    return max(max(deadlines) - time.time(), 0)
+
+
+def send_predictions(
+    payloads: list[dict], api_key_type: str, producer=None
+) -> list[str]:
+    """
+    Publish predictions to the AI server on the route of the key's tier.
+    A single image goes out as ``predict``, several are packed into
+    ``predict_batch`` messages of ``PREDICTION_BATCH_MESSAGE_SIZE`` images.
+    Messages of predictions with deadlines expire, so the AI server drops them
+    unrun once stale. Returns the task id of each prediction.
+    """
+    route = get_route(api_key_type)
+    payloads = resolve_inline_images(payloads)
+    dispatched_at = time.time()
+    for payload in payloads:
+        # Echoed back with the result to measure the time spent queued
+        payload["tier"] = api_key_type
+        payload["dispatched_at"] = dispatched_at
+
+    if len(payloads) == 1:
+        task_id = uuid.uuid4().hex
+        celery_app.send_task(
+            f"{settings.AI_SERVER_NAME}.predict",
+            args=(payloads[0],),
+            task_id=task_id,
+            expires=_get_expires(payloads),
+            producer=producer,
+            **route,
+        )
+        return [task_id]
+
+    task_ids = []
+    chunk_size = settings.PREDICTION_BATCH_MESSAGE_SIZE
+    for start in range(0, len(payloads), chunk_size):
+        end = start + chunk_size
+        task_id = uuid.uuid4().hex
+        celery_app.send_task(
+            f"{settings.AI_SERVER_NAME}.predict_batch",
+            args=(payloads[start:end],),
+            task_id=task_id,
+            expires=_get_expires(payloads[start:end]),
+            producer=producer,
+            **route,
+        )
+        task_ids += [task_id] * len(payloads[start:end])
+    return task_ids
+
+
+def enqueue_predictions(
+    user, api_key_type: str, api_key_logs, payloads, expires_at=None
+) -> None:
+    """
+    Add predictions to the user's backlog. They reach the AI server once the
+    fair-share dispatcher releases them, see ``release_pending_predictions``.
+    Predictions still pending at ``expires_at`` are dropped.
+    """
+    if expires_at is not None:
+        for payload in payloads:
+            payload["expires_at"] = expires_at.timestamp()
+    PendingPrediction.objects.bulk_create(
+        [
+            PendingPrediction(
+                api_key_log=api_key_log,
+                user=user,
+                api_key_type=api_key_type,
+                payload=payload,
+                expires_at=expires_at,
+            )
+            for api_key_log, payload in zip(api_key_logs, payloads)
+        ]
+    )
+    schedule_dispatch(outbox=True)
+
+
+def schedule_dispatch(outbox: bool = False) -> None:
+    """
+    Ask a worker to run a dispatch pass. Requests arriving while a pass is
+    already scheduled share it instead of publishing one message each.
+    With ``outbox``, the request goes through the outbox with the current
+    transaction instead of straight to the broker.
+    """
+    if cache.add(
+        DISPATCH_SCHEDULED_KEY, 1, timeout=settings.PREDICTION_DISPATCH_INTERVAL
+    ):
+        task_name = f"{settings.APP_NAME}.dispatch_predictions"
+        if outbox:
+            publish_task(task_name)
+        else:
+            celery_app.send_task(task_name)
+
+
+def complete_pending_predictions(log_ids) -> None:
+    """
+    Free the in-flight slots of predictions whose results arrived. The next
+    dispatch pass is scheduled once they are committed, a pass running earlier
+    would still count them in flight.
+    """
+    if PendingPrediction.objects.filter(api_key_log_id__in=log_ids).delete()[0]:
+        transaction.on_commit(schedule_dispatch)
+
+
+def _finish_pending_logs(log_ids, status: str) -> list[int]:
+    """
+    Settle pending logs that will get no result: set their status, release
+    their reserved usage and drop them from the backlog. Once committed, the
+    status is delivered to their users. Returns the ids of the logs that were
+    still pending.
+    """
+    logs = list(
+        APIKeyLog.objects.select_for_update(of=("self",))
+        .filter(id__in=log_ids, status=APIKeyLogStatus.PENDING)
+        .values_list("id", "api_key_id", "api_key__user_id", "api_key__user__email")
+    )
+    pending_ids = [log[0] for log in logs]
+    APIKeyLog.objects.filter(id__in=pending_ids).update(status=status)
+    for api_key_id, units in Counter(log[1] for log in logs).items():
+        release_usage(api_key_id, units)
+    users = {}
+    for log_id, _, user_id, email in logs:
+        users.setdefault((user_id, email), []).append(log_id)
+    for (user_id, email), user_log_ids in users.items():
+        transaction.on_commit(
+            partial(send_final_statuses, user_id, email, user_log_ids, status)
+        )
+    return pending_ids
+
+
+def cancel_prediction(user, log_id: int) -> bool | None:
+    """
+    Cancel a pending prediction of the user: a queued one never leaves the
+    backlog, a dispatched one sent alone is revoked. A prediction shared with
+    identical pending submissions keeps running for them, and a late result
+    of a cancelled log is not stored. Returns None when there is no such
+    prediction and False when it already completed.
+    """
+    with transaction.atomic():
+        if not APIKeyLog.objects.filter(id=log_id, api_key__user=user).exists():
+            return None
+        if not _finish_pending_logs([log_id], APIKeyLogStatus.CANCELLED):
+            return False
+
+        pending = (
+            PendingPrediction.objects.select_for_update()
+            .filter(api_key_log_id=log_id)
+            .first()
+        )
+        has_followers = APIKeyLog.objects.filter(
+            leader_id=log_id, status=APIKeyLogStatus.PENDING
+        ).exists()
+        if pending is None or has_followers:
+            return True
+        task_id = pending.task_id
+        shares_task = (
+            task_id
+            and PendingPrediction.objects.filter(task_id=task_id)
+            .exclude(id=pending.id)
+            .exists()
+        )
+        pending.delete()
+
+    if task_id and not shares_task:
+        celery_app.control.revoke(task_id)
+    schedule_dispatch(outbox=True)
+    return True
+
+
+def expire_pending_predictions() -> int:
+    """
+    Drop predictions whose deadline passed. The AI server drops their messages
+    unrun, so they would otherwise stay pending forever.
+    """
+    with transaction.atomic():
+        expired = dict(
+            PendingPrediction.objects.select_for_update(skip_locked=True)
+            .filter(expires_at__lte=timezone.now())
+            .values_list("id", "api_key_log_id")
+        )
+        if not expired:
+            return 0
+        expired_log_ids = _finish_pending_logs(
+            expired.values(), APIKeyLogStatus.EXPIRED
+        )
+        PendingPrediction.objects.filter(id__in=expired).delete()
+    metrics.incr("predictions.expired", len(expired_log_ids))
+    return len(expired_log_ids)
+
+
+def _get_fair_shares(budget: int) -> list[tuple[int, int]]:
+    """
+    Number of predictions to release per user in this pass, in weighted
+    round-robin order: users who waited longest come first and each round
+    gives every user up to its tier weight, within its in-flight cap.
+    """
+    in_flight_since = timezone.now() - timedelta(
+        seconds=settings.PREDICTION_IN_FLIGHT_TIMEOUT
+    )
+    in_flight = dict(
+        PendingPrediction.objects.filter(
+            status=PendingPredictionStatus.DISPATCHED,
+            dispatched_at__gte=in_flight_since,
+        )
+        .values("user_id")
+        .annotate(count=Count("id"))
+        .values_list("user_id", "count")
+    )
+    backlog = (
+        PendingPrediction.objects.filter(status=PendingPredictionStatus.QUEUED)
+        .values("user_id", "api_key_type")
+        .annotate(count=Count("id"), oldest=Min("id"))
+        .order_by("oldest")
+    )
+    backlog_sizes, weights, users = {}, {}, []
+    for item in backlog:
+        user_id = item["user_id"]
+        if user_id not in backlog_sizes:
+            users.append(user_id)
+            backlog_sizes[user_id] = 0
+            weights[user_id] = 0
+        backlog_sizes[user_id] += item["count"]
+        weights[user_id] = max(
+            weights[user_id],
+            settings.PREDICTION_FAIR_SHARE_WEIGHTS.get(item["api_key_type"], 1),
+        )
+    allowance = {
+        user_id: max(
+            min(
+                settings.PREDICTION_MAX_IN_FLIGHT_PER_USER - in_flight.get(user_id, 0),
+                backlog_sizes[user_id],
+            ),
+            0,
+        )
+        for user_id in users
+    }
+
+    order = []
+    while budget > 0 and any(allowance.values()):
+        for user_id in users:
+            share = min(weights[user_id], allowance[user_id], budget)
+            if share:
+                order.append((user_id, share))
+                allowance[user_id] -= share
+                budget -= share
+    return order
+
+
+def release_pending_predictions(budget: int | None = None) -> int:
+    """
+    Release queued predictions to the broker in weighted round-robin order
+    across users. Returns the number of predictions released.
+    """
+    if budget is None:
+        budget = settings.PREDICTION_DISPATCH_BATCH_SIZE
+    if not cache.add(
+        DISPATCH_LOCK_KEY, 1, timeout=settings.PREDICTION_DISPATCH_LOCK_TTL
+    ):
+        return 0
+    try:
+        expire_pending_predictions()
+        with transaction.atomic():
+            shares = _get_fair_shares(budget)
+            queued = {}
+            for user_id in {user_id for user_id, _ in shares}:
+                total = sum(share for uid, share in shares if uid == user_id)
+                queued[user_id] = list(
+                    PendingPrediction.objects.select_for_update(skip_locked=True)
+                    .filter(status=PendingPredictionStatus.QUEUED, user_id=user_id)
+                    .order_by("id")[:total]
+                )
+
+            released = []
+            for user_id, share in shares:
+                released += queued[user_id][:share]
+                queued[user_id] = queued[user_id][share:]
+            if not released:
+                return 0
+
+            by_tier = {}
+            for pending in released:
+                by_tier.setdefault(pending.api_key_type, []).append(pending)
+            dispatched_at = timezone.now()
+            # The whole pass goes out over one pooled producer
+            with celery_app.producer_or_acquire() as producer:
+                for api_key_type, pendings in by_tier.items():
+                    task_ids = send_predictions(
+                        [pending.payload for pending in pendings],
+                        api_key_type,
+                        producer=producer,
+                    )
+                    for pending, task_id in zip(pendings, task_ids):
+                        pending.status = PendingPredictionStatus.DISPATCHED
+                        pending.dispatched_at = dispatched_at
+                        # Lets a cancellation revoke the task
+                        pending.task_id = task_id
+            PendingPrediction.objects.bulk_update(
+                released, ["status", "dispatched_at", "task_id"]
+            )
+        return len(released)
+    finally:
+        cache.delete(DISPATCH_LOCK_KEY)
+
+
+def record_queue_time(payload: dict) -> None:
+    """
+    Record per tier how long a prediction took from dispatch to result and,
+    when the AI server reports when it started working, how long it queued.
+    """
+    tier = payload.pop("tier", None)
+    dispatched_at = payload.pop("dispatched_at", None)
+    started_at = payload.pop("started_at", None)
+    if not tier or not dispatched_at:
+        return
+    metrics.incr(f"predictions.{tier}.count")
+    metrics.incr(
+        f"predictions.{tier}.turnaround_ms",
+        int((time.time() - dispatched_at) * 1000),
+    )
+    if started_at:
+        metrics.incr(f"predictions.{tier}.queued_count")
+        metrics.incr(
+            f"predictions.{tier}.queued_ms",
+            int((started_at - dispatched_at) * 1000),
+        )
+
+
+def get_queue_stats() -> list[dict]:
+    stats = []
+    for tier in APIKeyType.values:
+        names = [
+            f"predictions.{tier}.{name}"
+            for name in ["count", "turnaround_ms", "queued_count", "queued_ms"]
+        ]
+        count, turnaround_ms, queued_count, queued_ms = metrics.get_counters(
+            *names
+        ).values()
+        stats.append(
+            {
+                "tier": tier,
+                "priority": get_route(tier)["priority"],
+                "count": count,
+                "avg_turnaround_seconds": (
+                    round(turnaround_ms / count / 1000, 3) if count else None
+                ),
+                "avg_queued_seconds": (
+                    round(queued_ms / queued_count / 1000, 3) if queued_count else None
+                ),
+            }
+        )
+    return stats
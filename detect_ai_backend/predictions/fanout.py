@@ -0,0 +1,42 @@
+from detect_ai_backend.predictions.status import (
+    cache_final_statuses,
+    cache_prediction_statuses,
+)
+from detect_ai_backend.utils.celery import get_user_group, publish_message_to_group
+
+
+def send_results(
+    user_id: int,
+    email: str,
+    results: dict[int, dict],
+    event_ids: dict[int, int] | None = None,
+) -> None:
+    """
+    Deliver results to a user, by log id: to the status endpoint and to the
+    user's group, which the user's websockets and result streams listen to.
+    ``event_ids`` are the event ids of the results' ``History`` rows, which clients
+    resume from on reconnect. Runs on the delivery queue, webhook deliveries
+    are stored with the results.
+    """
+    cache_prediction_statuses(email, results)
+    group = get_user_group(user_id)
+    event_ids = event_ids or {}
+    for log_id, result in results.items():
+        message = {
+            "type": "send_result",
+            "log_id": log_id,
+            "event_id": event_ids.get(log_id),
+            "message": result,
+        }
+        publish_message_to_group(message=message, group=group)
+
+
+def send_final_statuses(user_id: int, email: str, log_ids, status: str) -> None:
+    """
+    Deliver the final status of predictions settled without a result, such as
+    cancelled or expired ones: to the status endpoint, and to the user's group
+    to wake the requests waiting for them.
+    """
+    cache_final_statuses(email, log_ids, status)
+    message = {"type": "settle_predictions", "log_ids": list(log_ids), "status": status}
+    publish_message_to_group(message=message, group=get_user_group(user_id))
@@ -0,0 +1,161 @@
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from detect_ai_backend.api_keys.models import APIKeyLog, APIKeyLogStatus
+from detect_ai_backend.api_keys.quota import commit_usage, release_usage
+from detect_ai_backend.celery import app as celery_app
+from detect_ai_backend.history.models import History
+from detect_ai_backend.predictions.dispatch import (
+    complete_pending_predictions,
+    record_queue_time,
+)
+from detect_ai_backend.predictions.models import ReceivedResult
+from detect_ai_backend.predictions.result_cache import cache_results
+from detect_ai_backend.predictions.singleflight import get_recipients
+from detect_ai_backend.predictions.status import create_histories
+from detect_ai_backend.utils import metrics
+from detect_ai_backend.webhooks.delivery import enqueue_webhook_deliveries
+
+logger = logging.getLogger(__name__)
+
+INGESTION_SCHEDULED_KEY = "predictions:ingestion_scheduled"
+
+# Fields of the AI server's message that are not part of the result
+MESSAGE_FIELDS = ["email", "log_id", "expires_at", "image_data", "mime_type"]
+
+
+def receive_result(payload: dict) -> None:
+    """
+    Stage a result of the AI server for the next ingestion batch. A result
+    redelivered before its batch ran is dropped.
+    """
+    log_id = payload.get("log_id")
+    if not log_id:
+        logger.warning("Dropped a prediction result without log id")
+        return
+    record_queue_time(payload)
+    ReceivedResult.objects.bulk_create(
+        [ReceivedResult(log_id=log_id, payload=payload)], ignore_conflicts=True
+    )
+    schedule_ingestion()
+
+
+def schedule_ingestion(slots: int = 1, delay: float | None = None) -> None:
+    """
+    Ask workers to ingest the staged results, by default shortly so results
+    arriving meanwhile join the same batch. Up to ``slots`` passes run in
+    parallel, at most one queued per slot.
+    """
+    if delay is None:
+        delay = settings.PREDICTION_INGEST_DELAY
+    for slot in range(slots):
+        if cache.add(
+            f"{INGESTION_SCHEDULED_KEY}:{slot}",
+            1,
+            timeout=settings.PREDICTION_INGEST_INTERVAL,
+        ):
+            celery_app.send_task(
+                f"{settings.APP_NAME}.ingest_results", args=[slot], countdown=delay
+            )
+
+
+def get_ingestion_backlog() -> int:
+    """
+    Number of ingestion passes the staged results need.
+    """
+    batch_size = settings.PREDICTION_INGEST_BATCH_SIZE
+    return -(-ReceivedResult.objects.count() // batch_size)
+
+
+def ingest_results(batch_size: int | None = None) -> int:
+    """
+    Ingest a batch of staged results: free their in-flight slots, store them
+    for reuse, settle the logs waiting for them with one history row each and
+    their usage aggregated per key and their webhook deliveries, then hand
+    them to the delivery queue. Logs no
+    longer pending are skipped, so redelivered results are harmless. Returns
+    the number of results ingested.
+    """
+    if batch_size is None:
+        batch_size = settings.PREDICTION_INGEST_BATCH_SIZE
+    with transaction.atomic():
+        received = list(
+            ReceivedResult.objects.select_for_update(skip_locked=True).order_by("id")[
+                :batch_size
+            ]
+        )
+        if not received:
+            return 0
+        payloads = {}
+        for item in received:
+            payloads[item.log_id] = {
+                key: value
+                for key, value in item.payload.items()
+                if key not in MESSAGE_FIELDS
+            }
+
+        cache_results(payloads)
+        # Identical images submitted meanwhile share the result of their leader
+        recipients = get_recipients(payloads)
+        results, committed, released, deliveries = {}, Counter(), Counter(), {}
+        for log_id, leader_id, api_key_id, user_id, email, image_url in recipients:
+            payload = payloads[log_id if log_id in payloads else leader_id]
+            # Logs created before image URLs were recorded use the echoed one
+            result = {**payload, "image_url": image_url or payload.get("image_url")}
+            results[log_id] = (user_id, result)
+            if result.get("status") == APIKeyLogStatus.SUCCESS:
+                committed[api_key_id] += 1
+            else:
+                released[api_key_id] += 1
+            deliveries.setdefault((user_id, email), {})[log_id] = result
+
+        APIKeyLog.objects.bulk_update(
+            [
+                APIKeyLog(
+                    id=log_id, status=result.get("status", APIKeyLogStatus.FAILED)
+                )
+                for log_id, (_, result) in results.items()
+            ],
+            ["status"],
+        )
+        histories = create_histories(
+            [
+                History(
+                    user_id=user_id,
+                    results=result,
+                    image_url=result["image_url"],
+                    api_key_log_id=log_id,
+                )
+                for log_id, (user_id, result) in results.items()
+            ]
+        )
+        enqueue_webhook_deliveries(
+            {log_id: result for log_id, (_, result) in results.items()}
+        )
+        ReceivedResult.objects.filter(id__in=[item.id for item in received]).delete()
+        complete_pending_predictions(list(payloads))
+
+    for api_key_id in committed:
+        commit_usage(api_key_id)
+    for api_key_id, units in released.items():
+        release_usage(api_key_id, units)
+    # Live delivery runs on its own queue, away from persistence work
+    event_ids = {history.api_key_log_id: history.event_id for history in histories}
+    with celery_app.producer_or_acquire() as producer:
+        for (user_id, email), user_results in deliveries.items():
+            celery_app.send_task(
+                f"{settings.APP_NAME}.send_results",
+                args=[
+                    user_id,
+                    email,
+                    user_results,
+                    {log_id: event_ids[log_id] for log_id in user_results},
+                ],
+                producer=producer,
+            )
+    metrics.incr("predictions.ingested", len(received))
+    return len(received)
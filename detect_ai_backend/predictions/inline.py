@@ -0,0 +1,85 @@
+import base64
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from detect_ai_backend.outbox.relay import publish_task
+from detect_ai_backend.predictions.singleflight import record_content_hash
+from detect_ai_backend.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _image_cache_key(content_hash: str) -> str:
+    return f"predictions:inline_image:{content_hash}"
+
+
+def stash_inline_image(image: dict) -> None:
+    """
+    Keep an inline image in the cache under its content hash, the one copy
+    the dispatch and the archive read. The database only stores the hash.
+    """
+    cache.set(
+        _image_cache_key(image["content_hash"]),
+        image["data"],
+        timeout=settings.PREDICTION_INLINE_IMAGE_CACHE_TTL,
+    )
+
+
+def get_inline_image(content_hash: str) -> bytes | None:
+    return cache.get(_image_cache_key(content_hash))
+
+
+def get_inline_payload(image: dict) -> dict:
+    """
+    Fields referring to an inline image in a prediction payload, resolved by
+    ``resolve_inline_images`` when the prediction is sent.
+    """
+    return {"inline_image": image["content_hash"], "mime_type": image["mime_type"]}
+
+
+def resolve_inline_images(payloads: list[dict]) -> list[dict]:
+    """
+    Payloads with their inline images in ``image_data``, which the AI server
+    reads instead of fetching ``image_url``. An image evicted from the cache
+    is left out, the AI server then fetches the archived copy.
+    """
+    content_hashes = {
+        payload["inline_image"] for payload in payloads if "inline_image" in payload
+    }
+    if not content_hashes:
+        return payloads
+    images = cache.get_many([_image_cache_key(key) for key in content_hashes])
+    resolved = []
+    for payload in payloads:
+        if "inline_image" in payload:
+            payload = dict(payload)
+            data = images.get(_image_cache_key(payload.pop("inline_image")))
+            if data is not None:
+                payload["image_data"] = base64.b64encode(data).decode()
+            else:
+                metrics.incr("predictions.inline_image_missing")
+                logger.warning("Inline image of log %s expired", payload.get("log_id"))
+        resolved.append(payload)
+    return resolved
+
+
+def archive_inline_image(image: dict) -> str:
+    """
+    Schedule the upload of an inline image to the storage, through the
+    outbox, so its history links to it. Returns the URL the image will have,
+    empty when ``PREDICTION_INLINE_IMAGE_ARCHIVE`` is off.
+    """
+    if not settings.PREDICTION_INLINE_IMAGE_ARCHIVE:
+        return ""
+    file_name = str(uuid.uuid4())
+    image_url = f"{settings.GCP_STORAGE_URL}/{file_name}"
+    # A later submission of the archived URL matches the inline prediction
+    record_content_hash(image_url, image["content_hash"])
+    publish_task(
+        f"{settings.APP_NAME}.archive_inline_image",
+        args=[file_name, image["content_hash"], image["mime_type"]],
+    )
+    return image_url
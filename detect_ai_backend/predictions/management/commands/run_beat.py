@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from detect_ai_backend.celery import app as celery_app
+
+
+class Command(BaseCommand):
+    help = "Start the Celery beat scheduler of the periodic tasks."
+
+    def handle(self, *args, **options):
+        celery_app.start(["beat", "--loglevel=INFO"])
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from detect_ai_backend.celery import app as celery_app
+from detect_ai_backend.utils.celery import check_task_routes, get_queue_name
+
+
+class Command(BaseCommand):
+    help = "Start the Celery worker of a pool of CELERY_WORKER_POOLS."
+
+    def add_arguments(self, parser):
+        parser.add_argument("pool", choices=list(settings.CELERY_WORKER_POOLS))
+
+    def handle(self, *args, **options):
+        errors = check_task_routes()
+        if errors:
+            raise CommandError("\n".join(errors))
+
+        name = options["pool"]
+        pool = settings.CELERY_WORKER_POOLS[name]
+        argv = [
+            "worker",
+            "--loglevel=INFO",
+            f"--queues={','.join(get_queue_name(key) for key in pool['queues'])}",
+            f"--pool={pool['pool']}",
+            f"--concurrency={pool['concurrency']}",
+            f"--hostname={name}_worker@%h",
+            "--task-events",
+        ]
+        celery_app.worker_main(argv)
@@ -0,0 +1,81 @@
+# Generated by Django 5.0.10 on 2026-10-18 15:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("api_keys", "0004_alter_apikey_hashed_key"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingPrediction",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "api_key_type",
+                    models.CharField(
+                        choices=[
+                            ("free_tier", "Free Tier"),
+                            ("enterprise_tier", "Enterprise Tier"),
+                            ("custom_tier", "Custom Tier"),
+                        ],
+                        default="free_tier",
+                        max_length=15,
+                    ),
+                ),
+                ("payload", models.JSONField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("queued", "Queued"), ("dispatched", "Dispatched")],
+                        default="queued",
+                        max_length=15,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "dispatched_at",
+                    models.DateTimeField(blank=True, default=None, null=True),
+                ),
+                (
+                    "api_key_log",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pending_prediction",
+                        to="api_keys.apikeylog",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["status", "user", "id"],
+                        name="predictions_status_56a2c1_idx",
+                    )
+                ],
+            },
+        ),
+    ]
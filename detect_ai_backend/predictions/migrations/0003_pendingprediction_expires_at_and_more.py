@@ -0,0 +1,27 @@
+# Generated by Django 5.0.10 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("predictions", "0002_predictionresult"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pendingprediction",
+            name="expires_at",
+            field=models.DateTimeField(
+                blank=True, db_index=True, default=None, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="pendingprediction",
+            name="task_id",
+            field=models.CharField(
+                blank=True, db_index=True, default="", max_length=64
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.10 on 2026-10-18 16:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("predictions", "0003_pendingprediction_expires_at_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReceivedResult",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("log_id", models.BigIntegerField(unique=True)),
+                ("payload", models.JSONField()),
+                ("received_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,66 @@
+from django.db import models
+from django.utils import timezone
+
+from detect_ai_backend.api_keys.models import APIKeyLog, APIKeyType
+from detect_ai_backend.users.models import User
+
+# Create your models here.
+
+
+class PendingPredictionStatus(models.TextChoices):
+    QUEUED = "queued"
+    DISPATCHED = "dispatched"
+
+
+class PendingPrediction(models.Model):
+    """
+    A prediction waiting for, or running on, the AI server. Rows are released
+    to the broker by ``release_pending_predictions`` and deleted once the
+    result arrived.
+    """
+
+    api_key_log = models.OneToOneField(
+        APIKeyLog, on_delete=models.CASCADE, related_name="pending_prediction"
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    api_key_type = models.CharField(
+        choices=APIKeyType.choices, default=APIKeyType.FREE_TIER, max_length=15
+    )
+    payload = models.JSONField()
+    status = models.CharField(
+        choices=PendingPredictionStatus.choices,
+        default=PendingPredictionStatus.QUEUED,
+        max_length=15,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(blank=True, null=True, default=None)
+    # Task carrying the prediction, shared by the predictions of a batch message
+    task_id = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    expires_at = models.DateTimeField(
+        blank=True, null=True, default=None, db_index=True
+    )
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "user", "id"])]
+
+
+class PredictionResult(models.Model):
+    """
+    Result of a successful prediction, reused for identical images. Rows
+    expire after ``PREDICTION_RESULT_CACHE_TTL`` and are pruned periodically.
+    """
+
+    image_key = models.CharField(max_length=64, unique=True)
+    result = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+
+class ReceivedResult(models.Model):
+    """
+    Result sent by the AI server, waiting to be ingested with others in a
+    batch by ``ingest_results``. A result is staged once per log.
+    """
+
+    log_id = models.BigIntegerField(unique=True)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
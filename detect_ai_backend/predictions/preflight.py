@@ -0,0 +1,166 @@
+import base64
+import binascii
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlsplit
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+from detect_ai_backend.predictions.singleflight import get_url_key, record_content_hash
+from detect_ai_backend.utils import metrics
+from detect_ai_backend.utils.constants import IMAGE_TYPE_CHOICES
+from detect_ai_backend.utils.http import get_session
+
+IMAGE_TYPES = {mime_type for mime_type, _ in IMAGE_TYPE_CHOICES}
+
+
+class TransientError(Exception):
+    """
+    The image could not be checked now, it is neither accepted nor rejected.
+    """
+
+
+class FetchError(Exception):
+    """
+    The image could not be fetched. It is rejected, but only for now: its
+    upload may still be in progress or be retried.
+    """
+
+
+def _get_allowed_prefixes() -> list[str]:
+    return settings.PREDICTION_PREFLIGHT_ALLOWED_PREFIXES or [
+        f"{settings.GCP_STORAGE_URL}/"
+    ]
+
+
+def _is_allowed(image_url: str, allowed_prefixes: list[str]) -> bool:
+    # Dot segments are resolved when the URL is fetched, which could step out
+    # of the allowed prefix, so URLs with any are refused
+    segments = urlsplit(image_url).path.split("/")
+    if any(unquote(segment) in (".", "..") for segment in segments):
+        return False
+    return image_url.startswith(tuple(allowed_prefixes))
+
+
+def _get_size(response) -> int | None:
+    # "bytes 0-0/<size>" when the range was served, the whole body otherwise
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range:
+        size = content_range.rsplit("/", 1)[1]
+        return int(size) if size.isdigit() else None
+    content_length = response.headers.get("Content-Length", "")
+    return int(content_length) if content_length.isdigit() else None
+
+
+def _get_md5(response) -> str:
+    # "crc32c=<base64>, md5=<base64>", computed by the storage on upload
+    for part in response.headers.get("x-goog-hash", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name == "md5":
+            try:
+                return base64.b64decode(value, validate=True).hex()
+            except (binascii.Error, ValueError):
+                return ""
+    return ""
+
+
+def _probe(image_url: str) -> str:
+    """
+    Fetch the first byte of the image, a ranged GET rather than a HEAD since
+    signed storage URLs are only valid for GET. Returns the rejection reason,
+    empty when the image is acceptable.
+    """
+    session = get_session("preflight", settings.PREDICTION_PREFLIGHT_CONCURRENCY)
+    try:
+        with session.get(
+            image_url,
+            headers={"Range": "bytes=0-0"},
+            timeout=settings.PREDICTION_PREFLIGHT_TIMEOUT,
+            allow_redirects=False,
+            stream=True,
+        ) as response:
+            if response.status_code >= 500:
+                raise TransientError(f"HTTP {response.status_code}")
+            if response.status_code not in (200, 206):
+                raise FetchError(
+                    f"Image could not be fetched (HTTP {response.status_code})."
+                )
+            content_type = response.headers.get("Content-Type", "")
+            content_type = content_type.split(";")[0].strip().lower()
+            if content_type not in IMAGE_TYPES:
+                return f"Unsupported content type: {content_type or 'unknown'}."
+            size = _get_size(response)
+            if size is not None and size > settings.PREDICTION_IMAGE_MAX_SIZE:
+                return (
+                    "Image is larger than "
+                    f"{settings.PREDICTION_IMAGE_MAX_SIZE} bytes."
+                )
+            md5 = _get_md5(response)
+            if md5:
+                record_content_hash(image_url, md5)
+            return ""
+    except requests.RequestException as exc:
+        raise TransientError(str(exc)) from exc
+
+
+def _check(image_url: str) -> tuple[str | None, bool]:
+    """
+    Rejection reason of the image, None when it could not be checked, and
+    whether the outcome may be cached.
+    """
+    try:
+        return _probe(image_url), True
+    except FetchError as exc:
+        return str(exc), False
+    except TransientError:
+        # Storage hiccups should not block submissions, the AI server decides
+        metrics.incr("predictions.preflight.unchecked")
+        return None, False
+
+
+def preflight_images(image_urls: list[str]) -> dict[int, str]:
+    """
+    Check the images before they are dispatched: they must be hosted by us,
+    of an image content type and at most ``PREDICTION_IMAGE_MAX_SIZE`` bytes.
+    The MD5 the storage reports is recorded as their content hash.
+    Probes run concurrently and their outcome is cached per image, unless the
+    image could not be fetched, which may be fixed by its upload. Returns the
+    rejection reason of each rejected image, by index.
+    """
+    if not settings.PREDICTION_PREFLIGHT_ENABLED:
+        return {}
+
+    errors = {}
+    allowed_prefixes = _get_allowed_prefixes()
+    cache_keys = {}
+    for index, image_url in enumerate(image_urls):
+        if not _is_allowed(image_url, allowed_prefixes):
+            errors[index] = "Image must be uploaded to our storage."
+        else:
+            cache_key = f"predictions:preflight:{get_url_key(image_url)}"
+            cache_keys.setdefault(cache_key, []).append(index)
+
+    cached = cache.get_many(cache_keys)
+    unchecked = [key for key in cache_keys if key not in cached]
+    if unchecked:
+        urls = [image_urls[cache_keys[key][0]] for key in unchecked]
+        if len(urls) == 1:
+            results = [_check(urls[0])]
+        else:
+            with ThreadPoolExecutor(
+                min(len(urls), settings.PREDICTION_PREFLIGHT_CONCURRENCY)
+            ) as executor:
+                results = list(executor.map(_check, urls))
+        checked = dict(zip(unchecked, results))
+        cache.set_many(
+            {key: result for key, (result, cacheable) in checked.items() if cacheable},
+            timeout=settings.PREDICTION_PREFLIGHT_CACHE_TTL,
+        )
+        cached.update({key: result for key, (result, _) in checked.items()})
+
+    for cache_key, indexes in cache_keys.items():
+        if cached.get(cache_key):
+            for index in indexes:
+                errors[index] = cached[cache_key]
+    return errors
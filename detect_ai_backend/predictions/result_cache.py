@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from detect_ai_backend.api_keys.models import APIKeyLog, APIKeyLogStatus
+from detect_ai_backend.predictions.models import PredictionResult
+from detect_ai_backend.utils import metrics
+
+
+def get_cached_results(image_keys) -> dict[str, dict]:
+    """
+    Results of past predictions of the images, by image key.
+    """
+    image_keys = set(image_keys)
+    since = timezone.now() - timedelta(seconds=settings.PREDICTION_RESULT_CACHE_TTL)
+    results = dict(
+        PredictionResult.objects.filter(
+            image_key__in=image_keys, created_at__gte=since
+        ).values_list("image_key", "result")
+    )
+    if results:
+        metrics.incr("prediction_results.hits", len(results))
+    if len(image_keys) > len(results):
+        metrics.incr("prediction_results.misses", len(image_keys) - len(results))
+    return results
+
+
+def cache_results(results: dict[int, dict]) -> None:
+    """
+    Store the results of successful predictions, by log id, under the image
+    keys of their logs.
+    """
+    results = {
+        log_id: result
+        for log_id, result in results.items()
+        if result.get("status") == APIKeyLogStatus.SUCCESS
+    }
+    if not results:
+        return
+    image_keys = dict(
+        APIKeyLog.objects.filter(id__in=results)
+        .exclude(image_key="")
+        .values_list("id", "image_key")
+    )
+    # One row per image, the last result wins
+    rows = {
+        image_key: PredictionResult(
+            image_key=image_key,
+            result={
+                key: value
+                for key, value in results[log_id].items()
+                if key != "image_url"
+            },
+        )
+        for log_id, image_key in image_keys.items()
+    }
+    PredictionResult.objects.bulk_create(
+        rows.values(),
+        update_conflicts=True,
+        unique_fields=["image_key"],
+        update_fields=["result", "created_at"],
+    )
+
+
+def prune_results() -> int:
+    """
+    Delete expired results and the oldest ones beyond the size bound.
+    """
+    since = timezone.now() - timedelta(seconds=settings.PREDICTION_RESULT_CACHE_TTL)
+    deleted, _ = PredictionResult.objects.filter(created_at__lt=since).delete()
+    # The newest rows within the size bound are kept
+    max_size = settings.PREDICTION_RESULT_CACHE_MAX_SIZE
+    cutoff = (
+        PredictionResult.objects.order_by("-created_at", "-id")
+        .values("created_at", "id")[max_size:]
+        .first()
+    )
+    if cutoff is not None:
+        deleted += PredictionResult.objects.filter(
+            Q(created_at__lt=cutoff["created_at"])
+            | Q(created_at=cutoff["created_at"], id__lte=cutoff["id"])
+        ).delete()[0]
+    return deleted
+
+
+def get_result_cache_stats() -> dict:
+    counters = metrics.get_counters(
+        "prediction_results.hits",
+        "prediction_results.misses",
+        "predictions.coalesced",
+    )
+    hits = counters["prediction_results.hits"]
+    lookups = hits + counters["prediction_results.misses"]
+    return {
+        "hits": hits,
+        "misses": counters["prediction_results.misses"],
+        "hit_ratio": round(hits / lookups, 4) if lookups else 0,
+        "coalesced": counters["predictions.coalesced"],
+        "saved_gpu_calls": hits + counters["predictions.coalesced"],
+        "size": PredictionResult.objects.count(),
+        "max_size": settings.PREDICTION_RESULT_CACHE_MAX_SIZE,
+    }
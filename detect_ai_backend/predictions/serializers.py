@@ -1,5 +1,125 @@
+import base64
+import binascii
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 from rest_framework import serializers
 
+from detect_ai_backend.predictions.preflight import IMAGE_TYPES, preflight_images
+
+# Leading bytes of the common formats, for base64 images sent without a type
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+]
+
+
+class InlineImageField(serializers.Field):
+    """
+    Image sent in the request body: a multipart file or a base64 string,
+    optionally a ``data:<mime type>;base64,`` URI. Validates to a dict of its
+    ``data``, ``mime_type`` and ``content_hash`` (MD5 hex digest).
+    """
+
+    default_error_messages = {
+        "invalid": "Expected an image file or a base64 encoded image.",
+        "empty": "The image is empty.",
+        "max_size": "Image is larger than {max_size} bytes.",
+        "mime_type": "Unsupported content type: {mime_type}.",
+    }
+
+    def to_internal_value(self, data):
+        max_size = settings.PREDICTION_INLINE_IMAGE_MAX_SIZE
+        mime_type = ""
+        if isinstance(data, UploadedFile):
+            if data.size > max_size:
+                self.fail("max_size", max_size=max_size)
+            mime_type = data.content_type or ""
+            content = data.read()
+        elif isinstance(data, str):
+            if data.startswith("data:"):
+                header, _, data = data.partition(",")
+                mime_type = header.removeprefix("data:").split(";")[0]
+            # Checked before decoding, base64 takes 4 characters per 3 bytes
+            if len(data) > (max_size + 2) // 3 * 4:
+                self.fail("max_size", max_size=max_size)
+            try:
+                content = base64.b64decode(data, validate=True)
+            except (binascii.Error, ValueError):
+                self.fail("invalid")
+        else:
+            self.fail("invalid")
+
+        if not content:
+            self.fail("empty")
+        if not mime_type:
+            mime_type = next(
+                (
+                    signature_type
+                    for signature, signature_type in IMAGE_SIGNATURES
+                    if content.startswith(signature)
+                ),
+                "unknown",
+            )
+        if mime_type not in IMAGE_TYPES:
+            self.fail("mime_type", mime_type=mime_type)
+        return {
+            "data": content,
+            "mime_type": mime_type,
+            "content_hash": hashlib.md5(content, usedforsecurity=False).hexdigest(),
+        }
+
+    def to_representation(self, value):
+        return value["mime_type"]
+
 
 class PredictionsSerializer(serializers.Serializer):
-    image_url = serializers.URLField()
+    image_url = serializers.URLField(required=False)
+    # Small images may be sent along instead of uploaded to the storage first
+    image = InlineImageField(required=False)
+    # Seconds after which the prediction is dropped if it has not run yet
+    expires_in = serializers.IntegerField(
+        required=False, min_value=1, max_value=settings.PREDICTION_MAX_EXPIRES_IN
+    )
+
+    def validate_image_url(self, value):
+        errors = preflight_images([value])
+        if errors:
+            raise serializers.ValidationError(errors[0])
+        return value
+
+    def validate(self, attrs):
+        if ("image_url" in attrs) == ("image" in attrs):
+            raise serializers.ValidationError(
+                "Provide either an image_url or an image."
+            )
+        return attrs
+
+
+class BatchPredictionsSerializer(serializers.Serializer):
+    image_urls = serializers.ListField(
+        child=serializers.URLField(),
+        min_length=1,
+        max_length=settings.PREDICTION_BATCH_MAX_SIZE,
+    )
+    expires_in = serializers.IntegerField(
+        required=False, min_value=1, max_value=settings.PREDICTION_MAX_EXPIRES_IN
+    )
+
+    def validate_image_urls(self, value):
+        errors = preflight_images(value)
+        if errors:
+            raise serializers.ValidationError(
+                {index: [error] for index, error in errors.items()}
+            )
+        return value
+
+
+class BatchPredictionsResponseSerializer(serializers.Serializer):
+    log_ids = serializers.ListField(child=serializers.IntegerField())
@@ -0,0 +1,114 @@
+import hashlib
+from datetime import timedelta
+from urllib.parse import urlsplit, urlunsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from detect_ai_backend.api_keys.models import APIKeyLog, APIKeyLogStatus
+
+
+def get_url_key(image_url: str) -> str:
+    """
+    Hash of the normalized URL. The signature query of our storage URLs is
+    dropped so every signed URL of an object matches.
+    """
+    parts = urlsplit(image_url)
+    query = parts.query
+    if image_url.startswith(f"{settings.GCP_STORAGE_URL}/"):
+        query = ""
+    normalized = urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path, query, "")
+    )
+    return hashlib.sha256(f"url:{normalized}".encode()).hexdigest()
+
+
+def get_content_key(content_hash: str) -> str:
+    """
+    Key of an image known by the MD5 hex digest of its content.
+    """
+    return hashlib.sha256(f"content:{content_hash.lower()}".encode()).hexdigest()
+
+
+def _content_hash_cache_key(url_key: str) -> str:
+    return f"predictions:content_hash:{url_key}"
+
+
+def record_content_hash(image_url: str, content_hash: str) -> None:
+    """
+    Remember the content hash of an image, see ``get_image_keys``. Only hashes
+    computed by the server or by our storage are recorded, never ones supplied
+    by clients, which could claim any image's hash.
+    """
+    cache.set(
+        _content_hash_cache_key(get_url_key(image_url)),
+        content_hash.lower(),
+        timeout=settings.PREDICTION_CONTENT_HASH_TTL,
+    )
+
+
+def get_image_keys(image_urls: list[str]) -> list[str]:
+    """
+    Keys identifying the images of predictions: the recorded content hash,
+    falling back to the normalized URL.
+    """
+    url_keys = [get_url_key(image_url) for image_url in image_urls]
+    content_hashes = cache.get_many(
+        [_content_hash_cache_key(url_key) for url_key in set(url_keys)]
+    )
+    image_keys = []
+    for url_key in url_keys:
+        content_hash = content_hashes.get(_content_hash_cache_key(url_key))
+        if content_hash:
+            url_key = get_content_key(content_hash)
+        image_keys.append(url_key)
+    return image_keys
+
+
+def find_leaders(image_keys) -> dict[str, int]:
+    """
+    Map image keys to the id of the pending log already predicting that image.
+    Logs whose result arrived are no longer in the backlog and do not lead,
+    nor do logs with a deadline, which may expire without a result.
+    """
+    since = timezone.now() - timedelta(seconds=settings.PREDICTION_SINGLEFLIGHT_WINDOW)
+    return dict(
+        APIKeyLog.objects.filter(
+            image_key__in=set(image_keys),
+            status=APIKeyLogStatus.PENDING,
+            leader__isnull=True,
+            pending_prediction__isnull=False,
+            pending_prediction__expires_at__isnull=True,
+            timestamp__gte=since,
+        )
+        .values("image_key")
+        .annotate(leader_id=Min("id"))
+        .values_list("image_key", "leader_id")
+    )
+
+
+def get_recipients(log_ids) -> list[tuple]:
+    """
+    (log_id, leader_id, api_key_id, user_id, email, image_url) of the logs and
+    of the logs waiting for them, when still pending: cancelled logs and
+    redelivered results get nothing. The logs are locked until the end of
+    the transaction.
+    """
+    return list(
+        APIKeyLog.objects.select_for_update(of=("self",))
+        .filter(
+            Q(id__in=log_ids) | Q(leader_id__in=log_ids),
+            status=APIKeyLogStatus.PENDING,
+        )
+        .order_by("id")
+        .values_list(
+            "id",
+            "leader_id",
+            "api_key_id",
+            "api_key__user_id",
+            "api_key__user__email",
+            "image_url",
+        )
+    )
@@ -0,0 +1,139 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from detect_ai_backend.api_keys.models import APIKeyLog, APIKeyLogStatus
+from detect_ai_backend.history.models import History, HistorySequence
+
+
+def _status_cache_key(log_id: int) -> str:
+    return f"predictions:status:{log_id}"
+
+
+def cache_prediction_statuses(email: str, results: dict[int, dict]) -> None:
+    """
+    Keep the results delivered to a user hot for the status endpoint, by log id.
+    """
+    cache.set_many(
+        {
+            _status_cache_key(log_id): {
+                "email": email,
+                "status": result.get("status"),
+                "result": result,
+            }
+            for log_id, result in results.items()
+        },
+        timeout=settings.PREDICTION_STATUS_CACHE_TTL,
+    )
+
+
+def cache_final_statuses(email: str, log_ids, status: str) -> None:
+    """
+    Keep the final status of a user's predictions settled without a result,
+    such as cancelled or expired ones, hot for the status endpoint.
+    """
+    cache.set_many(
+        {
+            _status_cache_key(log_id): {
+                "email": email,
+                "status": status,
+                "result": None,
+            }
+            for log_id in log_ids
+        },
+        timeout=settings.PREDICTION_STATUS_CACHE_TTL,
+    )
+
+
+def _from_cache(user, cached: dict) -> dict[int, dict]:
+    return {
+        int(key.rsplit(":", 1)[1]): {
+            "id": int(key.rsplit(":", 1)[1]),
+            "status": value["status"],
+            "result": value["result"],
+        }
+        for key, value in cached.items()
+        if value["email"] == user.email
+    }
+
+
+def get_cached_prediction_statuses(user, log_ids) -> dict[int, dict]:
+    cached = cache.get_many([_status_cache_key(log_id) for log_id in log_ids])
+    return _from_cache(user, cached)
+
+
+async def aget_cached_prediction_statuses(user, log_ids) -> dict[int, dict]:
+    cached = await cache.aget_many([_status_cache_key(log_id) for log_id in log_ids])
+    return _from_cache(user, cached)
+
+
+def get_prediction_statuses(user, log_ids) -> dict[int, dict]:
+    """
+    Status and result of the user's predictions, from the hot cache and
+    falling back to the API key logs and their history.
+    """
+    statuses = get_cached_prediction_statuses(user, log_ids)
+    missing = [log_id for log_id in log_ids if log_id not in statuses]
+    if missing:
+        for log_id, status, result in APIKeyLog.objects.filter(
+            id__in=missing, api_key__user=user
+        ).values_list("id", "status", "history__results"):
+            statuses[log_id] = {"id": log_id, "status": status, "result": result}
+    return statuses
+
+
+def is_complete(status: dict) -> bool:
+    return status["status"] != APIKeyLogStatus.PENDING
+
+
+def create_histories(histories: list[History]) -> list[History]:
+    """
+    Store history rows with the next event ids of their users. Must run in the
+    transaction storing the results: the users' sequences stay locked until it
+    commits, so each user's event ids follow the order the rows become visible
+    in, unlike ids, which concurrent transactions commit out of order.
+    """
+    user_ids = sorted({history.user_id for history in histories})
+    HistorySequence.objects.bulk_create(
+        [HistorySequence(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+    sequences = {
+        sequence.user_id: sequence
+        for sequence in HistorySequence.objects.select_for_update()
+        .filter(user_id__in=user_ids)
+        .order_by("user_id")
+    }
+    for history in histories:
+        sequence = sequences[history.user_id]
+        sequence.last_event_id += 1
+        history.event_id = sequence.last_event_id
+    HistorySequence.objects.bulk_update(sequences.values(), ["last_event_id"])
+    return History.objects.bulk_create(histories)
+
+
+def get_missed_results(user_id: int, last_event_id: int) -> list[tuple[int, int, dict]]:
+    """
+    (event_id, log_id, result) of the user's results stored after the result
+    ``last_event_id``, in the order they were stored, see ``create_histories``.
+    """
+    return list(
+        History.objects.filter(user_id=user_id, event_id__gt=last_event_id)
+        .order_by("event_id")
+        .values_list("event_id", "api_key_log_id", "results")[
+            : settings.PREDICTION_STREAM_REPLAY_PAGE_SIZE
+        ]
+    )
+
+
+async def areplay_missed_results(user_id: int, last_event_id: int):
+    """
+    Every result returned by ``get_missed_results``, read a page at a time.
+    """
+    while True:
+        missed = await sync_to_async(get_missed_results)(user_id, last_event_id)
+        for item in missed:
+            yield item
+        if len(missed) < settings.PREDICTION_STREAM_REPLAY_PAGE_SIZE:
+            return
+        last_event_id = missed[-1][0]
@@ -1,42 +1,77 @@
-import asyncio
+import logging
 
-from asgiref.sync import async_to_sync
 from celery import shared_task
-from channels.layers import get_channel_layer
 from django.conf import settings
+from django.core.cache import cache
 
 from detect_ai_backend.celery import app as celery_app
-from detect_ai_backend.utils.celery import publish_message_to_group
-from detect_ai_backend.websocket.models import Websocket
-
-
-@async_to_sync
-async def publish(connection_ids: list[str], message):
-    channel_layer = get_channel_layer()
-    return await asyncio.gather(
-        *[
-            channel_layer.group_send(connection_id, message)
-            for connection_id in connection_ids
-        ]
-    )
+from detect_ai_backend.predictions.dispatch import (
+    DISPATCH_SCHEDULED_KEY,
+    release_pending_predictions,
+)
+from detect_ai_backend.predictions.fanout import send_results
+from detect_ai_backend.predictions.ingestion import (
+    INGESTION_SCHEDULED_KEY,
+    get_ingestion_backlog,
+    ingest_results,
+    receive_result,
+    schedule_ingestion,
+)
+from detect_ai_backend.predictions.inline import get_inline_image
+from detect_ai_backend.predictions.result_cache import prune_results
+from detect_ai_backend.utils.celery import get_task_concurrency
+
+logger = logging.getLogger(__name__)
 
 
-def single_publish(connection_id, message):
-    channel_layer = get_channel_layer()
-    channel_layer.group_send(connection_id, message)
+@shared_task(name=f"{settings.APP_NAME}.send_results")
+def send_results_task(user_id, email, results, event_ids=None):
+    # Log ids arrive as strings, JSON object keys
+    send_results(
+        user_id,
+        email,
+        {int(log_id): result for log_id, result in results.items()},
+        {int(log_id): event_id for log_id, event_id in (event_ids or {}).items()},
+    )
 
 
 @shared_task(name=f"{settings.APP_NAME}.predict_result")
 def handle_predict_result(payload):
-    email = payload.pop("email", "")
-    image_url = payload.get("image_url", "")
-    log_id = payload.pop("log_id", "")
-    websockets = Websocket.objects.filter(user__email=email)
-    connection_ids = [websocket.connection_id for websocket in websockets]
-    message = {"type": "send_result", "message": payload}
-    for connection_id in connection_ids:
-        publish_message_to_group(message=message, group=connection_id)
-    celery_app.send_task(
-        f"{settings.APP_NAME}.post_predict_result",
-        args=[email, image_url, log_id, payload],
-    )
+    receive_result(payload)
+
+
+@shared_task(name=f"{settings.APP_NAME}.ingest_results")
+def ingest_received_results(slot=0):
+    cache.delete(f"{INGESTION_SCHEDULED_KEY}:{slot}")
+    ingested = ingest_results()
+    if ingested >= settings.PREDICTION_INGEST_BATCH_SIZE:
+        # A backlog is drained by as many passes as the workers can run
+        schedule_ingestion(
+            slots=min(get_ingestion_backlog(), get_task_concurrency("ingest_results")),
+            delay=0,
+        )
+    return ingested
+
+
+@shared_task(name=f"{settings.APP_NAME}.dispatch_predictions")
+def dispatch_pending_predictions():
+    cache.delete(DISPATCH_SCHEDULED_KEY)
+    released = release_pending_predictions()
+    if released >= settings.PREDICTION_DISPATCH_BATCH_SIZE:
+        celery_app.send_task(f"{settings.APP_NAME}.dispatch_predictions")
+    return released
+
+
+@shared_task(name=f"{settings.APP_NAME}.prune_prediction_results")
+def prune_prediction_results():
+    return prune_results()
+
+
+@shared_task(name=f"{settings.APP_NAME}.archive_inline_image")
+def archive_inline_image(file_name, content_hash, mime_type):
+    data = get_inline_image(content_hash)
+    if data is None:
+        logger.warning("Inline image %s expired before it was archived", file_name)
+        return
+    blob = settings.GCP_FILES_BUCKET.blob(file_name)
+    blob.upload_from_string(data, content_type=mime_type)
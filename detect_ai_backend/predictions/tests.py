@@ -0,0 +1,1166 @@
+import asyncio
+import base64
+import hashlib
+from unittest.mock import MagicMock, patch
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from detect_ai_backend.api_keys.models import (
+    APIKey,
+    APIKeyLog,
+    APIKeyLogStatus,
+    APIKeyType,
+)
+from detect_ai_backend.api_keys.quota import get_counter_store, get_usage
+from detect_ai_backend.history.models import History
+from detect_ai_backend.outbox.models import OutboxMessage
+from detect_ai_backend.predictions.dispatch import (
+    complete_pending_predictions,
+    expire_pending_predictions,
+    get_queue_stats,
+    get_route,
+    record_queue_time,
+    release_pending_predictions,
+    send_predictions,
+)
+from detect_ai_backend.predictions.ingestion import ingest_results
+from detect_ai_backend.predictions.models import (
+    PendingPrediction,
+    PendingPredictionStatus,
+    PredictionResult,
+)
+from detect_ai_backend.predictions.result_cache import (
+    cache_results,
+    get_result_cache_stats,
+    prune_results,
+)
+from detect_ai_backend.predictions.singleflight import (
+    get_image_keys,
+    record_content_hash,
+)
+from detect_ai_backend.predictions.status import (
+    cache_prediction_statuses,
+    get_cached_prediction_statuses,
+)
+from detect_ai_backend.predictions.tasks import (
+    archive_inline_image,
+    handle_predict_result,
+    send_results_task,
+)
+from detect_ai_backend.users.models import User
+from detect_ai_backend.utils import metrics
+from detect_ai_backend.utils.celery import get_user_group
+from detect_ai_backend.utils.testing import ImageServer
+
+
+class PredictionCreateViewTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_counter_store().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="predictor@example.com",
+            password="testpass",  # nosec
+        )
+        self.api_key = APIKey.objects.create(user=self.user, is_default=True)
+        self.client.force_authenticate(user=self.user)
+        self.client.credentials(HTTP_X_API_KEY=self.api_key.api_key)
+        self.url = reverse("prediction_create_api_view")
+
+    @patch("detect_ai_backend.predictions.dispatch.celery_app")
+    def test_single_prediction(self, mock_celery_app):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                self.url, {"image_url": "https://example.com/a.png"}, format="json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {"log_id": APIKeyLog.objects.get().id})
+        pending = PendingPrediction.objects.get()
+        self.assertEqual(pending.status, PendingPredictionStatus.QUEUED)
+        self.assertEqual(pending.payload["image_url"], "https://example.com/a.png")
+        # Only a dispatch pass is scheduled, the prediction waits in the backlog
+        mock_celery_app.send_task.assert_not_called()
+        self.assertEqual(
+            OutboxMessage.objects.get().task_name,
+            f"{settings.APP_NAME}.dispatch_predictions",
+        )
+
+    @override_settings(PREDICTION_BATCH_MESSAGE_SIZE=2)
+    @patch("detect_ai_backend.predictions.dispatch.celery_app")
+    def test_batch_prediction(self, mock_celery_app):
+        image_urls = [f"https://example.com/{i}.png" for i in range(5)]
+        response = self.client.post(self.url, {"image_urls": image_urls}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        logs = APIKeyLog.objects.filter(api_key=self.api_key).order_by("id")
+        self.assertEqual(response.data["log_ids"], [log.id for log in logs])
+        self.assertTrue(all(log.status == APIKeyLogStatus.PENDING for log in logs))
+        self.assertEqual(release_pending_predictions(), 5)
+
+        # 5 images packed 2 per message
+        self.assertEqual(mock_celery_app.send_task.call_count, 3)
+        name = mock_celery_app.send_task.call_args.args[0]
+        self.assertEqual(name, f"{settings.AI_SERVER_NAME}.predict_batch")
+        sent = [
+            payload["image_url"]
+            for call in mock_celery_app.send_task.call_args_list
+            for payload in call.kwargs["args"][0]
+        ]
+        self.assertEqual(sent, image_urls)
+
+        self.assertEqual(get_usage(self.api_key.id), 5)
+
+    @patch("detect_ai_backend.predictions.dispatch.celery_app")
+    def test_batch_prediction_exceeding_quota(self, mock_celery_app):
+        image_urls = [f"https://example.com/{i}.png" for i in range(101)]
+        response = self.client.post(self.url, {"image_urls": image_urls}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(APIKeyLog.objects.count(), 0)
+        self.assertEqual(PendingPrediction.objects.count(), 0)
+        mock_celery_app.send_task.assert_not_called()
+
+    def test_batch_prediction_invalid_url(self):
+        response = self.client.post(
+            self.url, {"image_urls": ["not-a-url"]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch("detect_ai_backend.predictions.dispatch.celery_app")
+    def test_single_prediction_exceeding_quota(self, mock_celery_app):
+        APIKey.objects.filter(id=self.api_key.id).update(total_usage=100)
+        response = self.client.post(
+            self.url, {"image_url": "https://example.com/a.png"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(APIKeyLog.objects.count(), 0)
+        mock_celery_app.send_task.assert_not_called()
+
+    def test_prediction_with_unknown_api_key(self):
+        self.client.credentials(HTTP_X_API_KEY="ak_unknown")
+        response = self.client.post(
+            self.url, {"image_url": "https://example.com/a.png"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @patch("detect_ai_backend.predictions.dispatch.celery_app")
+    def test_prediction_has_rate_limit_headers(self, mock_celery_app):
+        response = self.client.post(
+            self.url, {"image_url": "https://example.com/a.png"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        burst = settings.API_KEY_RATE_LIMITS["free_tier"]["burst"]
+        self.assertEqual(response["X-RateLimit-Limit"], str(burst))
+        self.assertEqual(response["X-RateLimit-Remaining"], str(burst - 1))
+        self.assertIn("X-RateLimit-Reset", response)
+
+    @override_settings(API_KEY_RATE_LIMITS={"free_tier": {"rate": 0.1, "burst": 3}})
+    @patch("detect_ai_backend.predictions.dispatch.celery_app")
+    def test_prediction_rate_limited(self, mock_celery_app):
+        response = self.client.post(
+            self.url,
+            {"image_urls": ["https://example.com/a.png"] * 2},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.post(
+            self.url,
+            {"image_urls": ["https://example.com/a.png"] * 2},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "10")
+        self.assertEqual(response["X-RateLimit-Remaining"], "1")
+        # Throttled before anything is written
+        self.assertEqual(APIKeyLog.objects.count(), 2)
+        self.assertEqual(get_usage(self.api_key.id), 2)
+
+    @patch(
+        "detect_ai_backend.predictions.views.get_cached_results",
+        side_effect=DatabaseError,
+    )
+    def test_failed_prediction_releases_reservation(self, mock_get_cached_results):
+        with self.assertRaises(DatabaseError):
+            self.client.post(
+                self.url, {"image_url": "https://example.com/a.png"}, format="json"
+            )
+
+        self.assertEqual(get_usage(self.api_key.id), 0)
+        self.assertFalse(APIKeyLog.objects.exists())
+
+    @override_settings(API_KEY_RATE_LIMITS={"free_tier": {"rate": 0.1, "burst": 3}})
+    @patch("detect_ai_backend.predictions.dispatch.celery_app")
+    def test_batch_larger_than_burst_is_charged_in_full(self, mock_celery_app):
+        response = self.client.post(
+            self.url,
+            {"image_urls": ["https://example.com/a.png"] * 5},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response["X-RateLimit-Remaining"], "0")
+
+        response = self.client.post(
+            self.url, {"image_url": "https://example.com/a.png"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # The two tokens of debt and the one requested
+        self.assertEqual(response["Retry-After"], "30")
+
+
+class PredictionDispatchTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(PREDICTION_QUEUE_MAX_PRIORITY=10)
+    @patch("detect_ai_backend.predictions.dispatch.celery_app")
+    def test_send_predictions_routes_by_tier(self, mock_celery_app):
+        send_predictions(
+            [{"image_url": "https://example.com/a.png", "log_id": 1}],
+            APIKeyType.ENTERPRISE_TIER,
+        )
+
+        call = mock_celery_app.send_task.call_args
+        self.assertEqual(call.args[0], f"{settings.AI_SERVER_NAME}.predict")
+        self.assertEqual(call.kwargs["priority"], 9)
+        queue = call.kwargs["queue"]
+        self.assertEqual(queue.name, f"{settings.AI_SERVER_NAME}_queue")
+        self.assertEqual(
+            queue.queue_arguments,
+            {"x-max-priority": 10},
+        )
+        payload = call.kwargs["args"][0]
+        self.assertEqual(payload["tier"], APIKeyType.ENTERPRISE_TIER)
+        self.assertIn("dispatched_at", payload)
+
+    @override_settings(
+        PREDICTION_ROUTES={"free_tier": {"queue": "{ai_server_name}_free"}},
+    )
+    def test_get_route_is_configurable(self):
+        route = get_route(APIKeyType.CUSTOM_TIER)
+        self.assertEqual(route["queue"].name, f"{settings.AI_SERVER_NAME}_free")
+        self.assertEqual(route["queue"].queue_arguments, {})
+        self.assertEqual(route["priority"], 0)
+
+    @override_settings(METRICS_FLUSH_INTERVAL=0)
+    @patch("detect_ai_backend.predictions.dispatch.time.time")
+    def test_record_queue_time(self, mock_time):
+        mock_time.return_value = 110.0
+        payload = {
+            "status": "success",
+            "tier": APIKeyType.FREE_TIER,
+            "dispatched_at": 100.0,
+            "started_at": 104.0,
+        }
+        record_queue_time(payload)
+
+        self.assertEqual(payload, {"status": "success"})
+        stats = {item["tier"]: item for item in get_queue_stats()}
+        self.assertEqual(stats[APIKeyType.FREE_TIER]["count"], 1)
+        self.assertEqual(stats[APIKeyType.FREE_TIER]["avg_turnaround_seconds"], 10)
+        self.assertEqual(stats[APIKeyType.FREE_TIER]["avg_queued_seconds"], 4)
+        self.assertIsNone(stats[APIKeyType.ENTERPRISE_TIER]["avg_queued_seconds"])
+
+
+@patch("detect_ai_backend.predictions.dispatch.celery_app")
+class PredictionFairShareTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def enqueue(self, email, api_key_type, count):
+        user = User.objects.create_user(email=email, password="testpass")  # nosec
+        api_key = APIKey.objects.create(user=user, api_key_type=api_key_type)
+        for i in range(count):
+            api_key_log = APIKeyLog.objects.create(
+                api_key=api_key, status=APIKeyLogStatus.PENDING
+            )
+            PendingPrediction.objects.create(
+                api_key_log=api_key_log,
+                user=user,
+                api_key_type=api_key_type,
+                payload={"email": email, "image_url": f"{i}", "log_id": api_key_log.id},
+            )
+        return user
+
+    def sent_emails(self, mock_celery_app):
+        emails = []
+        for call in mock_celery_app.send_task.call_args_list:
+            payloads = call.kwargs["args"][0]
+            if isinstance(payloads, dict):
+                payloads = [payloads]
+            emails += [payload["email"] for payload in payloads]
+        return emails
+
+    def test_release_interleaves_users(self, mock_celery_app):
+        self.enqueue("bulk@example.com", APIKeyType.FREE_TIER, 100)
+        self.enqueue("small@example.com", APIKeyType.FREE_TIER, 2)
+
+        self.assertEqual(release_pending_predictions(budget=4), 4)
+
+        # The small backlog is not stuck behind the bulk one
+        self.assertEqual(
+            PendingPrediction.objects.filter(
+                user__email="small@example.com",
+                status=PendingPredictionStatus.DISPATCHED,
+            ).count(),
+            2,
+        )
+
+    def test_release_uses_tier_weights(self, mock_celery_app):
+        self.enqueue("free@example.com", APIKeyType.FREE_TIER, 10)
+        self.enqueue("enterprise@example.com", APIKeyType.ENTERPRISE_TIER, 10)
+
+        release_pending_predictions(budget=5)
+
+        emails = self.sent_emails(mock_celery_app)
+        self.assertEqual(emails.count("free@example.com"), 1)
+        self.assertEqual(emails.count("enterprise@example.com"), 4)
+
+    @override_settings(PREDICTION_MAX_IN_FLIGHT_PER_USER=3)
+    def test_release_respects_in_flight_limit(self, mock_celery_app):
+        user = self.enqueue("bulk@example.com", APIKeyType.ENTERPRISE_TIER, 5)
+
+        self.assertEqual(release_pending_predictions(), 3)
+        self.assertEqual(release_pending_predictions(), 0)
+
+        # A result frees a slot and schedules another pass
+        log_id = (
+            PendingPrediction.objects.filter(
+                user=user, status=PendingPredictionStatus.DISPATCHED
+            )
+            .first()
+            .api_key_log_id
+        )
+        mock_celery_app.send_task.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_pending_predictions([log_id])
+            mock_celery_app.send_task.assert_not_called()
+        mock_celery_app.send_task.assert_called_with(
+            f"{settings.APP_NAME}.dispatch_predictions"
+        )
+        self.assertEqual(release_pending_predictions(), 1)
+        self.assertEqual(
+            PendingPrediction.objects.filter(
+                status=PendingPredictionStatus.QUEUED
+            ).count(),
+            1,
+        )
+
+
+@patch("detect_ai_backend.predictions.dispatch.celery_app")
+class PredictionSingleflightTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_counter_store().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="predictor@example.com",
+            password="testpass",  # nosec
+        )
+        self.api_key = APIKey.objects.create(user=self.user, is_default=True)
+        self.client.force_authenticate(user=self.user)
+        self.client.credentials(HTTP_X_API_KEY=self.api_key.api_key)
+        self.url = reverse("prediction_create_api_view")
+
+    def test_get_image_keys(self, mock_celery_app):
+        storage_url = f"{settings.GCP_STORAGE_URL}/image"
+        keys = get_image_keys(
+            [
+                f"{storage_url}?X-Goog-Signature=a",
+                f"{storage_url}?X-Goog-Signature=b",
+                "https://example.com/image?id=1",
+                "https://example.com/image?id=2",
+            ]
+        )
+        self.assertEqual(keys[0], keys[1])
+        self.assertNotEqual(keys[2], keys[3])
+
+    def test_get_image_keys_uses_recorded_content_hash(self, mock_celery_app):
+        record_content_hash(f"{settings.GCP_STORAGE_URL}/a", "AB" * 16)
+        record_content_hash(f"{settings.GCP_STORAGE_URL}/b", "ab" * 16)
+
+        keys = get_image_keys(
+            [f"{settings.GCP_STORAGE_URL}/a", f"{settings.GCP_STORAGE_URL}/b"]
+        )
+        self.assertEqual(keys[0], keys[1])
+
+    def test_resubmission_follows_pending_prediction(self, mock_celery_app):
+        data = {"image_url": "https://example.com/a.png"}
+        self.client.post(self.url, data, format="json")
+        self.client.post(self.url, data, format="json")
+
+        leader, follower = APIKeyLog.objects.order_by("id")
+        self.assertIsNone(leader.leader_id)
+        self.assertEqual(follower.leader_id, leader.id)
+        self.assertEqual(PendingPrediction.objects.count(), 1)
+        # Both reserve quota, each log is settled with the shared result
+        self.assertEqual(get_usage(self.api_key.id), 2)
+
+    def test_batch_coalesces_duplicate_images(self, mock_celery_app):
+        image_urls = ["https://example.com/a.png"] * 3 + ["https://example.com/b.png"]
+        response = self.client.post(self.url, {"image_urls": image_urls}, format="json")
+
+        self.assertEqual(len(response.data["log_ids"]), 4)
+        self.assertEqual(PendingPrediction.objects.count(), 2)
+        first = APIKeyLog.objects.get(id=response.data["log_ids"][0])
+        self.assertEqual(
+            list(first.followers.values_list("id", flat=True)),
+            response.data["log_ids"][1:3],
+        )
+
+    def test_completed_prediction_does_not_lead(self, mock_celery_app):
+        data = {"image_url": "https://example.com/a.png"}
+        self.client.post(self.url, data, format="json")
+        PendingPrediction.objects.all().delete()
+        self.client.post(self.url, data, format="json")
+
+        self.assertFalse(APIKeyLog.objects.filter(leader__isnull=False).exists())
+        self.assertEqual(PendingPrediction.objects.count(), 1)
+
+    @patch("detect_ai_backend.predictions.fanout.publish_message_to_group")
+    @patch("detect_ai_backend.predictions.ingestion.celery_app")
+    def test_result_fans_out_to_followers(self, mock_tasks_celery_app, mock_publish, _):
+        other = User.objects.create_user(
+            email="other@example.com", password="testpass"  # nosec
+        )
+        other_key = APIKey.objects.create(user=other, is_default=True)
+        self.client.post(
+            self.url, {"image_url": "https://example.com/a.png"}, format="json"
+        )
+        self.client.credentials(HTTP_X_API_KEY=other_key.api_key)
+        self.client.force_authenticate(user=other)
+        self.client.post(
+            self.url, {"image_url": "https://example.com/a.png"}, format="json"
+        )
+        leader, follower = APIKeyLog.objects.order_by("id")
+
+        handle_predict_result(
+            {
+                "email": self.user.email,
+                "image_url": "https://example.com/a.png",
+                "log_id": leader.id,
+                "status": "success",
+            }
+        )
+        self.assertEqual(ingest_results(), 1)
+        for call in mock_tasks_celery_app.send_task.call_args_list:
+            if call.args[0] == f"{settings.APP_NAME}.send_results":
+                send_results_task(*call.kwargs["args"])
+
+        self.assertEqual(
+            list(History.objects.order_by("id").values_list("user", "api_key_log")),
+            [(self.user.id, leader.id), (other.id, follower.id)],
+        )
+        self.assertEqual(
+            [call.kwargs["group"] for call in mock_publish.call_args_list],
+            [get_user_group(self.user.id), get_user_group(other.id)],
+        )
+        self.assertFalse(PendingPrediction.objects.exists())
+
+
+@override_settings(METRICS_FLUSH_INTERVAL=0)
+@patch("detect_ai_backend.predictions.dispatch.celery_app")
+class PredictionResultCacheTestCase(TestCase):
+    def setUp(self):
+        # Counters buffered by earlier tests must not land in this one
+        metrics.flush()
+        cache.clear()
+        get_counter_store().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="predictor@example.com",
+            password="testpass",  # nosec
+        )
+        self.api_key = APIKey.objects.create(user=self.user, is_default=True)
+        self.client.force_authenticate(user=self.user)
+        self.client.credentials(HTTP_X_API_KEY=self.api_key.api_key)
+        self.url = reverse("prediction_create_api_view")
+        self.image_url = "https://example.com/meme.png"
+        self.image_key = get_image_keys([self.image_url])[0]
+
+    @patch("detect_ai_backend.predictions.fanout.publish_message_to_group")
+    def test_cache_hit_completes_prediction(self, mock_publish, mock_celery_app):
+        PredictionResult.objects.create(
+            image_key=self.image_key, result={"status": "success", "results": [1]}
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                self.url, {"image_url": self.image_url}, format="json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(APIKeyLog.objects.get().status, APIKeyLogStatus.SUCCESS)
+        self.assertFalse(PendingPrediction.objects.exists())
+        history = History.objects.get()
+        self.assertEqual(history.results["results"], [1])
+        self.assertEqual(history.image_url, self.image_url)
+        mock_publish.assert_not_called()
+
+        # Delivered by a worker once relayed from the outbox
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.task_name, f"{settings.APP_NAME}.send_results")
+        send_results_task(*message.args)
+        self.assertEqual(
+            [call.kwargs["group"] for call in mock_publish.call_args_list],
+            [get_user_group(self.user.id)],
+        )
+        self.assertEqual(
+            mock_publish.call_args.kwargs["message"]["message"]["image_url"],
+            self.image_url,
+        )
+        mock_celery_app.send_task.assert_not_called()
+
+        stats = get_result_cache_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["saved_gpu_calls"], 1)
+
+    def test_cache_miss_is_dispatched(self, mock_celery_app):
+        self.client.post(self.url, {"image_url": self.image_url}, format="json")
+
+        self.assertEqual(PendingPrediction.objects.count(), 1)
+        self.assertEqual(get_result_cache_stats()["misses"], 1)
+
+    @override_settings(PREDICTION_RESULT_CACHE_TTL=0)
+    def test_expired_result_is_not_used(self, mock_celery_app):
+        PredictionResult.objects.create(
+            image_key=self.image_key, result={"status": "success"}
+        )
+        self.client.post(self.url, {"image_url": self.image_url}, format="json")
+
+        self.assertEqual(PendingPrediction.objects.count(), 1)
+
+    def test_cache_result_stores_successful_results(self, mock_celery_app):
+        self.client.post(self.url, {"image_url": self.image_url}, format="json")
+        log_id = APIKeyLog.objects.get().id
+
+        cache_results({log_id: {"status": "failed", "image_url": self.image_url}})
+        self.assertFalse(PredictionResult.objects.exists())
+
+        cache_results({log_id: {"status": "success", "image_url": self.image_url}})
+        cache_results({log_id: {"status": "success", "results": [2]}})
+        result = PredictionResult.objects.get(image_key=self.image_key)
+        self.assertEqual(result.result, {"status": "success", "results": [2]})
+
+    @override_settings(PREDICTION_RESULT_CACHE_MAX_SIZE=2)
+    def test_prune_results_bounds_size(self, mock_celery_app):
+        for i in range(4):
+            PredictionResult.objects.create(image_key=f"{i}", result={})
+
+        self.assertEqual(prune_results(), 2)
+        self.assertEqual(
+            set(PredictionResult.objects.values_list("image_key", flat=True)),
+            {"2", "3"},
+        )
+
+
+class PredictionStatusViewTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="predictor@example.com",
+            password="testpass",  # nosec
+        )
+        self.api_key = APIKey.objects.create(user=self.user, is_default=True)
+        self.headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.user)}"
+        }
+        self.pending = APIKeyLog.objects.create(api_key=self.api_key)
+        self.done = APIKeyLog.objects.create(
+            api_key=self.api_key, status=APIKeyLogStatus.SUCCESS
+        )
+        History.objects.create(
+            user=self.user,
+            image_url="https://example.com/a.png",
+            results={"status": "success"},
+            api_key_log=self.done,
+        )
+
+    def test_requires_authentication(self):
+        url = reverse("prediction_status_api_view", args=[self.done.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_status_falls_back_to_history(self):
+        url = reverse("prediction_status_api_view", args=[self.done.id])
+        response = self.client.get(url, **self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json(),
+            {"id": self.done.id, "status": "success", "result": {"status": "success"}},
+        )
+
+    def test_status_of_other_user_is_not_found(self):
+        other = User.objects.create_user(
+            email="other@example.com", password="testpass"  # nosec
+        )
+        url = reverse("prediction_status_api_view", args=[self.done.id])
+        response = self.client.get(
+            url, HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(other)}"
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_status_list(self):
+        cache_prediction_statuses(
+            self.user.email, {self.pending.id: {"status": "failed"}}
+        )
+        url = reverse("prediction_status_list_api_view")
+        response = self.client.get(
+            url, {"ids": f"{self.pending.id},{self.done.id},0"}, **self.headers
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item["id"], item["status"]) for item in response.json()["results"]],
+            [(self.pending.id, "failed"), (self.done.id, "success")],
+        )
+
+    def test_status_list_rejects_invalid_ids(self):
+        url = reverse("prediction_status_list_api_view")
+        response = self.client.get(url, {"ids": "a,b"}, **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def wait_for_event(self, event):
+        url = reverse("prediction_status_api_view", args=[self.pending.id])
+        request = asyncio.ensure_future(
+            self.async_client.get(
+                url,
+                {"wait": 10},
+                headers={"Authorization": self.headers["HTTP_AUTHORIZATION"]},
+            )
+        )
+        channel_layer = get_channel_layer()
+        group = get_user_group(self.user.id)
+        for _ in range(500):
+            if channel_layer.groups.get(group):
+                break
+            await asyncio.sleep(0.01)
+        await channel_layer.group_send(group, event)
+        return await asyncio.wait_for(request, timeout=5)
+
+    async def test_wait_returns_when_result_arrives(self):
+        response = await self.wait_for_event(
+            {
+                "type": "send_result",
+                "log_id": self.pending.id,
+                "event_id": 1,
+                "message": {"status": "success"},
+            }
+        )
+
+        self.assertEqual(
+            response.json(),
+            {
+                "id": self.pending.id,
+                "status": "success",
+                "result": {"status": "success"},
+            },
+        )
+
+    async def test_wait_returns_when_prediction_is_settled(self):
+        response = await self.wait_for_event(
+            {
+                "type": "settle_predictions",
+                "log_ids": [self.pending.id],
+                "status": APIKeyLogStatus.CANCELLED,
+            }
+        )
+
+        self.assertEqual(response.json()["status"], APIKeyLogStatus.CANCELLED)
+        self.assertIsNone(response.json()["result"])
+
+    def test_wait_returns_result_delivered_before_subscribing(self):
+        cache_prediction_statuses(
+            self.user.email, {self.pending.id: {"status": "success"}}
+        )
+        APIKeyLog.objects.filter(id=self.pending.id).update(
+            status=APIKeyLogStatus.SUCCESS
+        )
+        url = reverse("prediction_status_api_view", args=[self.pending.id])
+        response = self.client.get(url, {"wait": 10}, **self.headers)
+
+        self.assertEqual(response.json()["result"], {"status": "success"})
+
+    def test_wait_times_out_pending(self):
+        url = reverse("prediction_status_api_view", args=[self.pending.id])
+        response = self.client.get(url, {"wait": 0.05}, **self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["status"], APIKeyLogStatus.PENDING)
+        self.assertIsNone(response.json()["result"])
+
+
+class PredictionStreamViewTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="predictor@example.com",
+            password="testpass",  # nosec
+        )
+        self.api_key = APIKey.objects.create(user=self.user, is_default=True)
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        self.logs = [APIKeyLog.objects.create(api_key=self.api_key) for _ in range(3)]
+        # Results complete out of submission order, and rows are stored out of
+        # id order by concurrent transactions
+        self.histories = [
+            History.objects.create(
+                user=self.user,
+                image_url="https://example.com/a.png",
+                results={"status": "success", "n": log.id},
+                api_key_log=log,
+                event_id=event_id,
+            )
+            for log, event_id in [
+                (self.logs[2], 1),
+                (self.logs[0], 3),
+                (self.logs[1], 2),
+            ]
+        ]
+        self.url = reverse("prediction_stream_api_view")
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_stream_replays_missed_results_then_streams(self):
+        seen, second, first = self.histories
+        response = await self.async_client.get(
+            self.url, headers={**self.headers, "Last-Event-ID": "1"}
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        content = response.streaming_content
+
+        # The results completed after the last one seen, whatever their log ids
+        self.assertEqual(
+            await anext(content),
+            f'id: 2\nevent: result\ndata: {{"status": "success", '
+            f'"n": {first.api_key_log_id}}}\n\n'.encode(),
+        )
+        self.assertTrue((await anext(content)).startswith(b"id: 3\n"))
+
+        # A result published meanwhile and already replayed is not sent twice
+        channel_layer = get_channel_layer()
+        group = get_user_group(self.user.id)
+        for log_id, event_id in [
+            (second.api_key_log_id, 3),
+            (seen.api_key_log_id + 1, 4),
+        ]:
+            await channel_layer.group_send(
+                group,
+                {
+                    "type": "send_result",
+                    "log_id": log_id,
+                    "event_id": event_id,
+                    "message": {"n": log_id},
+                },
+            )
+        self.assertEqual(
+            await anext(content),
+            "id: 4\nevent: result\ndata: "
+            f'{{"n": {seen.api_key_log_id + 1}}}\n\n'.encode(),
+        )
+        await content.aclose()
+
+    @override_settings(PREDICTION_STREAM_HEARTBEAT_INTERVAL=0.01)
+    async def test_idle_stream_sends_heartbeats(self):
+        response = await self.async_client.get(self.url, headers=self.headers)
+        content = response.streaming_content
+
+        self.assertEqual(await anext(content), b": heartbeat\n\n")
+        await content.aclose()
+
+
+@patch("detect_ai_backend.predictions.dispatch.celery_app")
+class PredictionCancellationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_counter_store().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="predictor@example.com",
+            password="testpass",  # nosec
+        )
+        self.api_key = APIKey.objects.create(user=self.user, is_default=True)
+        self.client.force_authenticate(user=self.user)
+        self.client.credentials(HTTP_X_API_KEY=self.api_key.api_key)
+        self.url = reverse("prediction_create_api_view")
+        self.headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.user)}"
+        }
+
+    def submit(self, **data):
+        data.setdefault("image_url", "https://example.com/a.png")
+        return self.client.post(self.url, data, format="json").data
+
+    def cancel(self, log_id, headers=None):
+        url = reverse("prediction_status_api_view", args=[log_id])
+        return self.client.delete(url, **(headers or self.headers))
+
+    @patch("detect_ai_backend.predictions.fanout.publish_message_to_group")
+    def test_cancelled_status_is_delivered(self, mock_publish, mock_celery_app):
+        log_id = self.submit()["log_id"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cancel(log_id)
+
+        self.assertEqual(
+            get_cached_prediction_statuses(self.user, [log_id]),
+            {log_id: {"id": log_id, "status": "cancelled", "result": None}},
+        )
+        mock_publish.assert_called_once_with(
+            message={
+                "type": "settle_predictions",
+                "log_ids": [log_id],
+                "status": APIKeyLogStatus.CANCELLED,
+            },
+            group=get_user_group(self.user.id),
+        )
+
+    def test_cancel_queued_prediction(self, mock_celery_app):
+        log_id = self.submit()["log_id"]
+
+        response = self.cancel(log_id)
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            APIKeyLog.objects.get(id=log_id).status, APIKeyLogStatus.CANCELLED
+        )
+        self.assertFalse(PendingPrediction.objects.exists())
+        self.assertEqual(get_usage(self.api_key.id), 0)
+        self.assertEqual(release_pending_predictions(), 0)
+        mock_celery_app.control.revoke.assert_not_called()
+
+        response = self.cancel(log_id)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_cancel_prediction_without_csrf_token(self, mock_celery_app):
+        log_id = self.submit()["log_id"]
+        client = Client(enforce_csrf_checks=True)
+
+        response = client.delete(
+            reverse("prediction_status_api_view", args=[log_id]), **self.headers
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_cancel_prediction_of_other_user(self, mock_celery_app):
+        log_id = self.submit()["log_id"]
+        other = User.objects.create_user(
+            email="other@example.com", password="testpass"  # nosec
+        )
+
+        response = self.cancel(
+            log_id, {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(other)}"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(PendingPrediction.objects.count(), 1)
+
+    def test_cancel_dispatched_prediction_revokes_task(self, mock_celery_app):
+        log_id = self.submit()["log_id"]
+        release_pending_predictions()
+        task_id = mock_celery_app.send_task.call_args.kwargs["task_id"]
+
+        self.cancel(log_id)
+
+        mock_celery_app.control.revoke.assert_called_once_with(task_id)
+        self.assertFalse(PendingPrediction.objects.exists())
+
+    def test_cancel_prediction_sharing_batch_task(self, mock_celery_app):
+        image_urls = ["https://example.com/a.png", "https://example.com/b.png"]
+        log_ids = self.client.post(
+            self.url, {"image_urls": image_urls}, format="json"
+        ).data["log_ids"]
+        release_pending_predictions()
+
+        self.cancel(log_ids[0])
+
+        # The other image of the message still runs
+        mock_celery_app.control.revoke.assert_not_called()
+        self.assertEqual(PendingPrediction.objects.get().api_key_log_id, log_ids[1])
+
+    @patch("detect_ai_backend.predictions.fanout.publish_message_to_group")
+    @patch("detect_ai_backend.predictions.ingestion.celery_app")
+    def test_cancelled_leader_still_serves_followers(
+        self, mock_tasks_celery_app, mock_publish, mock_celery_app
+    ):
+        leader_id = self.submit()["log_id"]
+        follower_id = self.submit()["log_id"]
+
+        self.cancel(leader_id)
+        self.assertEqual(PendingPrediction.objects.count(), 1)
+
+        handle_predict_result(
+            {
+                "email": self.user.email,
+                "image_url": "https://example.com/a.png",
+                "log_id": leader_id,
+                "status": "success",
+            }
+        )
+        ingest_results()
+        self.assertEqual(
+            list(History.objects.values_list("api_key_log", flat=True)),
+            [follower_id],
+        )
+
+    def test_deadline_expires_message(self, mock_celery_app):
+        self.submit(expires_in=30)
+        release_pending_predictions()
+
+        call = mock_celery_app.send_task.call_args
+        self.assertAlmostEqual(call.kwargs["expires"], 30, delta=2)
+        self.assertIn("expires_at", call.kwargs["args"][0])
+
+    def test_prediction_without_deadline_does_not_expire(self, mock_celery_app):
+        self.submit()
+        release_pending_predictions()
+
+        self.assertIsNone(mock_celery_app.send_task.call_args.kwargs["expires"])
+
+    @patch("detect_ai_backend.predictions.fanout.publish_message_to_group")
+    def test_expired_predictions_are_dropped(self, mock_publish, mock_celery_app):
+        log_id = self.submit(expires_in=30)["log_id"]
+        PendingPrediction.objects.update(expires_at=timezone.now())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_pending_predictions(), 1)
+
+        self.assertEqual(
+            get_cached_prediction_statuses(self.user, [log_id])[log_id]["status"],
+            APIKeyLogStatus.EXPIRED,
+        )
+        mock_publish.assert_called_once()
+
+        self.assertEqual(
+            APIKeyLog.objects.get(id=log_id).status, APIKeyLogStatus.EXPIRED
+        )
+        self.assertFalse(PendingPrediction.objects.exists())
+        self.assertEqual(get_usage(self.api_key.id), 0)
+
+    def test_prediction_with_deadline_is_not_followed(self, mock_celery_app):
+        self.submit(expires_in=30)
+        self.submit()
+
+        self.assertEqual(PendingPrediction.objects.count(), 2)
+
+
+@patch("detect_ai_backend.predictions.dispatch.celery_app")
+class PredictionPreflightTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_counter_store().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="preflight@example.com",
+            password="testpass",  # nosec
+        )
+        self.api_key = APIKey.objects.create(user=self.user, is_default=True)
+        self.client.force_authenticate(user=self.user)
+        self.client.credentials(HTTP_X_API_KEY=self.api_key.api_key)
+        self.url = reverse("prediction_create_api_view")
+        self.server = ImageServer(
+            {
+                "/ok.png": ("image/png", 1024),
+                "/big.jpg": ("image/jpeg", 20 * 1024 * 1024),
+                "/doc.pdf": ("application/pdf", 1024),
+            }
+        )
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__)
+        settings_override = override_settings(
+            PREDICTION_PREFLIGHT_ENABLED=True,
+            PREDICTION_PREFLIGHT_ALLOWED_PREFIXES=[self.server.url],
+            PREDICTION_IMAGE_MAX_SIZE=10 * 1024 * 1024,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_valid_image_is_accepted(self, mock_celery_app):
+        response = self.client.post(
+            self.url, {"image_url": self.server.url + "ok.png"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_invalid_images_are_rejected(self, mock_celery_app):
+        for name in ["missing.png", "big.jpg", "doc.pdf"]:
+            response = self.client.post(
+                self.url, {"image_url": self.server.url + name}, format="json"
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("image_url", response.data)
+
+        self.assertFalse(APIKeyLog.objects.exists())
+        self.assertEqual(get_usage(self.api_key.id), 0)
+
+    def test_foreign_host_is_rejected_without_fetching(self, mock_celery_app):
+        response = self.client.post(
+            self.url, {"image_url": "https://example.com/a.png"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.server.requests, [])
+
+    def test_dot_segments_are_rejected_without_fetching(self, mock_celery_app):
+        for path in ["../ok.png", "a/%2e%2e/ok.png", "./ok.png"]:
+            response = self.client.post(
+                self.url, {"image_url": self.server.url + path}, format="json"
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertEqual(self.server.requests, [])
+
+    def test_batch_errors_are_reported_by_index(self, mock_celery_app):
+        image_urls = [self.server.url + name for name in ["ok.png", "doc.pdf"]]
+        response = self.client.post(self.url, {"image_urls": image_urls}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(response.data["image_urls"]), [1])
+        self.assertFalse(APIKeyLog.objects.exists())
+
+    def test_storage_md5_is_recorded_as_content_hash(self, mock_celery_app):
+        self.server.images["/copy.png"] = self.server.images["/ok.png"]
+        image_urls = [self.server.url + name for name in ["ok.png", "copy.png"]]
+        self.client.post(self.url, {"image_urls": image_urls}, format="json")
+
+        self.assertEqual(*get_image_keys(image_urls))
+        self.assertEqual(APIKeyLog.objects.filter(leader__isnull=False).count(), 1)
+
+    def test_checks_are_cached(self, mock_celery_app):
+        image_url = self.server.url + "ok.png"
+        self.client.post(self.url, {"image_url": image_url}, format="json")
+        self.client.post(self.url, {"image_url": image_url}, format="json")
+
+        self.assertEqual(self.server.requests, ["/ok.png"])
+
+    def test_missing_image_is_checked_again(self, mock_celery_app):
+        # Submitted before its upload finished
+        image_url = self.server.url + "late.png"
+        response = self.client.post(self.url, {"image_url": image_url}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.server.images["/late.png"] = ("image/png", 1024)
+        response = self.client.post(self.url, {"image_url": image_url}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.server.requests, ["/late.png", "/late.png"])
+
+    def test_unreachable_storage_does_not_block(self, mock_celery_app):
+        image_url = self.server.url + "ok.png"
+        self.server.__exit__()
+
+        response = self.client.post(self.url, {"image_url": image_url}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 100
+
+
+@patch("detect_ai_backend.predictions.dispatch.celery_app")
+class PredictionInlineImageTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_counter_store().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="inline@example.com",
+            password="testpass",  # nosec
+        )
+        self.api_key = APIKey.objects.create(user=self.user, is_default=True)
+        self.client.force_authenticate(user=self.user)
+        self.client.credentials(HTTP_X_API_KEY=self.api_key.api_key)
+        self.url = reverse("prediction_create_api_view")
+
+    def test_base64_image_is_sent_inline(self, mock_celery_app):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                self.url, {"image": base64.b64encode(PNG).decode()}, format="json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # The database only refers to the image, kept once in the cache
+        content_hash = hashlib.md5(PNG, usedforsecurity=False).hexdigest()
+        self.assertEqual(
+            PendingPrediction.objects.get().payload["inline_image"], content_hash
+        )
+
+        release_pending_predictions()
+        payload = mock_celery_app.send_task.call_args.kwargs["args"][0]
+        self.assertEqual(base64.b64decode(payload["image_data"]), PNG)
+        self.assertEqual(payload["mime_type"], "image/png")
+        self.assertNotIn("inline_image", payload)
+
+        # Archived to the storage for the history
+        log = APIKeyLog.objects.get()
+        self.assertTrue(log.image_url.startswith(settings.GCP_STORAGE_URL))
+        message = OutboxMessage.objects.get(
+            task_name=f"{settings.APP_NAME}.archive_inline_image"
+        )
+        self.assertEqual(
+            message.args, [log.image_url.rsplit("/", 1)[1], content_hash, "image/png"]
+        )
+        self.assertEqual(get_image_keys([log.image_url]), [log.image_key])
+
+        bucket = MagicMock()
+        with override_settings(GCP_FILES_BUCKET=bucket):
+            archive_inline_image(*message.args)
+        bucket.blob.assert_called_once_with(message.args[0])
+        bucket.blob.return_value.upload_from_string.assert_called_once_with(
+            PNG, content_type="image/png"
+        )
+
+    def test_multipart_image(self, mock_celery_app):
+        image = SimpleUploadedFile("a.jpg", b"\xff\xd8\xff" + b"\0" * 10, "image/jpeg")
+        response = self.client.post(self.url, {"image": image}, format="multipart")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            PendingPrediction.objects.get().payload["mime_type"], "image/jpeg"
+        )
+
+    @override_settings(PREDICTION_INLINE_IMAGE_ARCHIVE=False)
+    def test_identical_inline_images_are_coalesced(self, mock_celery_app):
+        data = "data:image/png;base64," + base64.b64encode(PNG).decode()
+        self.client.post(self.url, {"image": data}, format="json")
+        self.client.post(self.url, {"image": data}, format="json")
+
+        self.assertEqual(PendingPrediction.objects.count(), 1)
+        self.assertEqual(APIKeyLog.objects.filter(leader__isnull=False).count(), 1)
+        self.assertEqual(APIKeyLog.objects.first().image_url, "")
+        self.assertFalse(
+            OutboxMessage.objects.filter(
+                task_name=f"{settings.APP_NAME}.archive_inline_image"
+            ).exists()
+        )
+
+    @override_settings(PREDICTION_INLINE_IMAGE_MAX_SIZE=64)
+    def test_invalid_inline_images_are_rejected(self, mock_celery_app):
+        for data in [
+            base64.b64encode(PNG).decode(),
+            base64.b64encode(b"%PDF-1.4").decode(),
+            "not base64!",
+        ]:
+            response = self.client.post(self.url, {"image": data}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            self.url,
+            {"image": base64.b64encode(PNG[:20]).decode(), "image_url": "https://a.b"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(APIKeyLog.objects.exists())
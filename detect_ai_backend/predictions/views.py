@@ -1,55 +1,410 @@
 import asyncio
+import json
+import time
+from datetime import timedelta
 
-from asgiref.sync import async_to_sync
+from asgiref.sync import sync_to_async
 from channels.layers import get_channel_layer
 from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import generics, permissions, response, status
+from rest_framework import exceptions, generics, permissions, response, status
 
 from detect_ai_backend.api_keys.models import APIKeyLog, APIKeyLogStatus
-from detect_ai_backend.celery import app as celery_app
-from detect_ai_backend.predictions.serializers import PredictionsSerializer
-from detect_ai_backend.utils.permissions import HasAPIKey
+from detect_ai_backend.api_keys.quota import commit_usage, release_usage, reserve_usage
+from detect_ai_backend.history.models import History
+from detect_ai_backend.outbox.relay import publish_task
+from detect_ai_backend.predictions.dispatch import (
+    cancel_prediction,
+    enqueue_predictions,
+)
+from detect_ai_backend.predictions.inline import (
+    archive_inline_image,
+    get_inline_payload,
+    stash_inline_image,
+)
+from detect_ai_backend.predictions.result_cache import get_cached_results
+from detect_ai_backend.predictions.serializers import (
+    BatchPredictionsResponseSerializer,
+    BatchPredictionsSerializer,
+    PredictionsSerializer,
+)
+from detect_ai_backend.predictions.singleflight import (
+    find_leaders,
+    get_content_key,
+    get_image_keys,
+)
+from detect_ai_backend.predictions.status import (
+    aget_cached_prediction_statuses,
+    areplay_missed_results,
+    create_histories,
+    get_prediction_statuses,
+    is_complete,
+)
+from detect_ai_backend.utils import metrics
+from detect_ai_backend.utils.authentication import authenticate
+from detect_ai_backend.utils.celery import get_user_group
+from detect_ai_backend.utils.permissions import HasAPIKey, LimitExceededException
 from detect_ai_backend.utils.swagger import get_api_key_header
+from detect_ai_backend.utils.throttling import APIKeyRateThrottle, RateLimitHeadersMixin
+from detect_ai_backend.webhooks.delivery import enqueue_webhook_deliveries
 
 
-class PredictionCreateView(generics.CreateAPIView):
+class PredictionCreateView(RateLimitHeadersMixin, generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated, HasAPIKey]
+    throttle_classes = [APIKeyRateThrottle]
     serializer_class = PredictionsSerializer
 
-    @swagger_auto_schema(manual_parameters=[get_api_key_header()])
-    def post(self, request, *args, **kwargs):
+    def get_throttle_cost(self, request):
+        image_urls = (
+            request.data.get("image_urls") if isinstance(request.data, dict) else None
+        )
+        if isinstance(image_urls, list):
+            return max(len(image_urls), 1)
+        return 1
 
-        api_key = self.request.api_key
-        api_key.total_usage += 1
-        api_key.save()
+    def get_serializer_class(self):
+        if "image_urls" in self.request.data:
+            return BatchPredictionsSerializer
+        return PredictionsSerializer
+
+    @swagger_auto_schema(
+        manual_parameters=[get_api_key_header()],
+        responses={status.HTTP_201_CREATED: BatchPredictionsResponseSerializer},
+    )
+    def post(self, request, *args, **kwargs):
+        self.reserved_units = 0
+        try:
+            with transaction.atomic():
+                return self.submit_predictions(request)
+        except BaseException:
+            # Nothing was recorded, give back the quota reserved meanwhile
+            if self.reserved_units:
+                release_usage(request.api_key.id, self.reserved_units)
+            raise
 
+    def submit_predictions(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         validated_data = serializer.validated_data
 
-        api_key_log = APIKeyLog.objects.create(
-            api_key=self.request.api_key, status=APIKeyLogStatus.PENDING
+        if "image_urls" in validated_data:
+            api_key_logs = self.create_predictions(
+                validated_data["image_urls"], validated_data.get("expires_in")
+            )
+            return response.Response(
+                status=status.HTTP_201_CREATED,
+                data={"log_ids": [api_key_log.id for api_key_log in api_key_logs]},
+            )
+
+        image = validated_data.get("image")
+        image_url = validated_data.get("image_url")
+        if image is not None:
+            stash_inline_image(image)
+            image_url = archive_inline_image(image)
+        api_key_logs = self.create_predictions(
+            [image_url], validated_data.get("expires_in"), inline_image=image
+        )
+        return response.Response(
+            status=status.HTTP_201_CREATED, data={"log_id": api_key_logs[0].id}
+        )
+
+    def create_predictions(
+        self,
+        image_urls: list[str],
+        expires_in: int | None = None,
+        inline_image: dict | None = None,
+    ) -> list[APIKeyLog]:
+        """
+        Log and enqueue predictions of the images. Images predicted before are
+        answered from the result cache, and an image that is already being
+        predicted is not enqueued again: its log follows the pending one.
+        Predictions not run within ``expires_in`` seconds are dropped.
+        An ``inline_image`` is sent to the AI server within the message.
+        """
+        api_key = self.request.api_key
+        if not reserve_usage(api_key, len(image_urls)):
+            raise LimitExceededException
+        self.reserved_units += len(image_urls)
+
+        if inline_image is not None:
+            image_keys = [get_content_key(inline_image["content_hash"])]
+        else:
+            image_keys = get_image_keys(image_urls)
+        cached_results = get_cached_results(image_keys)
+        leaders = find_leaders(
+            [image_key for image_key in image_keys if image_key not in cached_results]
         )
-        payload = {
-            "email": request.user.email,
-            "image_url": validated_data["image_url"],
-            "log_id": api_key_log.id,
+        api_key_logs = [
+            APIKeyLog(
+                api_key=api_key,
+                status=cached_results.get(image_key, {}).get(
+                    "status", APIKeyLogStatus.PENDING
+                ),
+                image_url=image_url,
+                image_key=image_key,
+                leader_id=leaders.get(image_key),
+            )
+            for image_url, image_key in zip(image_urls, image_keys)
+        ]
+        cached_logs = [
+            api_key_log
+            for api_key_log in api_key_logs
+            if api_key_log.image_key in cached_results
+        ]
+        if cached_logs:
+            self.complete_cached_predictions(cached_logs, cached_results)
+
+        # The first of several identical images in the request leads the others
+        new_leaders = {}
+        for api_key_log in api_key_logs:
+            if api_key_log.pk is None and api_key_log.leader_id is None:
+                new_leaders.setdefault(api_key_log.image_key, api_key_log)
+        leader_logs = APIKeyLog.objects.bulk_create(new_leaders.values())
+        for api_key_log in api_key_logs:
+            leader = new_leaders.get(api_key_log.image_key)
+            if leader is not None and leader is not api_key_log:
+                api_key_log.leader_id = leader.id
+        followers = [
+            api_key_log for api_key_log in api_key_logs if api_key_log.pk is None
+        ]
+        APIKeyLog.objects.bulk_create(followers)
+        if followers:
+            metrics.incr("predictions.coalesced", len(followers))
+
+        payloads = [
+            {
+                "email": self.request.user.email,
+                "image_url": api_key_log.image_url,
+                "log_id": api_key_log.id,
+                **(get_inline_payload(inline_image) if inline_image else {}),
+            }
+            for api_key_log in leader_logs
+        ]
+        if leader_logs:
+            expires_at = None
+            if expires_in:
+                expires_at = timezone.now() + timedelta(seconds=expires_in)
+            enqueue_predictions(
+                self.request.user,
+                api_key.api_key_type,
+                leader_logs,
+                payloads,
+                expires_at=expires_at,
+            )
+        return api_key_logs
+
+    def complete_cached_predictions(self, api_key_logs, cached_results) -> None:
+        APIKeyLog.objects.bulk_create(api_key_logs)
+        results = {
+            api_key_log.id: {
+                **cached_results[api_key_log.image_key],
+                "image_url": api_key_log.image_url,
+            }
+            for api_key_log in api_key_logs
         }
-        celery_app.send_task(
-            f"{settings.AI_SERVER_NAME}.predict",
-            args=(payload,),
-            queue=f"{settings.AI_SERVER_NAME}_queue",
+        histories = create_histories(
+            [
+                History(
+                    user=self.request.user,
+                    results=result,
+                    image_url=result["image_url"],
+                    api_key_log_id=log_id,
+                )
+                for log_id, result in results.items()
+            ]
+        )
+        enqueue_webhook_deliveries(results)
+        commit_usage(self.request.api_key.id)
+        user = self.request.user
+        event_ids = {history.api_key_log_id: history.event_id for history in histories}
+        publish_task(
+            f"{settings.APP_NAME}.send_results",
+            args=[user.id, user.email, results, event_ids],
         )
 
-        return response.Response(status=status.HTTP_201_CREATED)
 
-    @async_to_sync
-    async def publish(self, connection_ids: list[str], message):
+# Authenticated by JWT like the REST framework views, which are CSRF exempt
+@method_decorator(csrf_exempt, name="dispatch")
+class PredictionStatusView(View):
+    """
+    Status and result of the user's predictions: ``api/predictions/<id>`` for
+    one, ``api/predictions/results?ids=1,2`` for several. With ``wait=<seconds>``
+    the request is held until they complete, awaiting the user's group like
+    the result stream, so it holds no thread and does not poll.
+    DELETE ``api/predictions/<id>`` cancels a pending prediction.
+    """
+
+    async def get(self, request, id=None):
+        try:
+            user = await authenticate(request)
+        except exceptions.APIException as exc:
+            return JsonResponse({"detail": str(exc.detail)}, status=exc.status_code)
+
+        try:
+            log_ids = [id] if id is not None else self.get_log_ids(request)
+            wait = min(
+                float(request.GET.get("wait", 0)), settings.PREDICTION_STATUS_MAX_WAIT
+            )
+        except ValueError:
+            return JsonResponse(
+                {"detail": "Invalid ids or wait parameter."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        statuses = await sync_to_async(get_prediction_statuses)(user, log_ids)
+        pending = {log_id for log_id, item in statuses.items() if not is_complete(item)}
+        if wait > 0 and pending:
+            statuses.update(await self.wait_for(user, pending, wait))
+
+        if id is not None:
+            if id not in statuses:
+                return JsonResponse(
+                    {"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND
+                )
+            return JsonResponse(statuses[id])
+        return JsonResponse(
+            {"results": [statuses[log_id] for log_id in log_ids if log_id in statuses]}
+        )
+
+    async def delete(self, request, id=None):
+        try:
+            user = await authenticate(request)
+        except exceptions.APIException as exc:
+            return JsonResponse({"detail": str(exc.detail)}, status=exc.status_code)
+        if id is None:
+            return self.http_method_not_allowed(request)
+
+        cancelled = await sync_to_async(cancel_prediction)(user, id)
+        if cancelled is None:
+            return JsonResponse(
+                {"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+        if not cancelled:
+            return JsonResponse(
+                {"detail": "Prediction already completed."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+    async def wait_for(self, user, pending: set[int], wait: float) -> dict[int, dict]:
+        """
+        Statuses of the pending predictions that complete within ``wait``
+        seconds, as delivered to the user's group.
+        """
         channel_layer = get_channel_layer()
-        return await asyncio.gather(
-            *[
-                channel_layer.group_send(connection_id, message)
-                for connection_id in connection_ids
-            ]
+        channel = await channel_layer.new_channel()
+        group = get_user_group(user.id)
+        await channel_layer.group_add(group, channel)
+        try:
+            # Delivered between the first read and subscribing
+            statuses = await aget_cached_prediction_statuses(user, pending)
+            pending -= statuses.keys()
+            deadline = time.monotonic() + wait
+            while pending:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(
+                        channel_layer.receive(channel), timeout=timeout
+                    )
+                except asyncio.TimeoutError:
+                    break
+                if event["type"] == "send_result":
+                    log_id, result = event.get("log_id"), event["message"]
+                    if log_id in pending:
+                        statuses[log_id] = {
+                            "id": log_id,
+                            "status": result.get("status"),
+                            "result": result,
+                        }
+                elif event["type"] == "settle_predictions":
+                    for log_id in pending.intersection(event["log_ids"]):
+                        statuses[log_id] = {
+                            "id": log_id,
+                            "status": event["status"],
+                            "result": None,
+                        }
+                pending -= statuses.keys()
+        finally:
+            await channel_layer.group_discard(group, channel)
+        return statuses
+
+    def get_log_ids(self, request) -> list[int]:
+        log_ids = [int(log_id) for log_id in request.GET.get("ids", "").split(",")]
+        if len(log_ids) > settings.PREDICTION_STATUS_MAX_IDS:
+            raise ValueError
+        return list(dict.fromkeys(log_ids))
+
+
+# Authenticated by JWT like the REST framework views, which are CSRF exempt
+@method_decorator(csrf_exempt, name="dispatch")
+class PredictionStreamView(View):
+    """
+    Server-Sent Events stream of the user's results, for clients that cannot
+    keep a websocket. Each event id is the ``event_id`` of the result's
+    ``History`` row, which increases in storing order: a client reconnecting with
+    ``Last-Event-ID`` first receives the results it missed. Idle streams only
+    await the channel layer, so they hold no thread.
+    """
+
+    async def get(self, request):
+        try:
+            user = await authenticate(request)
+        except exceptions.APIException as exc:
+            return JsonResponse({"detail": str(exc.detail)}, status=exc.status_code)
+
+        try:
+            last_event_id = int(request.headers.get("Last-Event-ID") or 0)
+        except ValueError:
+            last_event_id = 0
+
+        response = StreamingHttpResponse(
+            self.stream(user, last_event_id), content_type="text/event-stream"
         )
+        response["Cache-Control"] = "no-cache"
+        # Keep proxies such as nginx from buffering the stream
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def stream(self, user, last_event_id: int):
+        channel_layer = get_channel_layer()
+        channel = await channel_layer.new_channel()
+        group = get_user_group(user.id)
+        # Subscribe before replaying so nothing published meanwhile is lost
+        await channel_layer.group_add(group, channel)
+        try:
+            replayed = set()
+            if last_event_id:
+                missed = areplay_missed_results(user.id, last_event_id)
+                async for event_id, log_id, result in missed:
+                    replayed.add(log_id)
+                    yield self.format_event(event_id, result)
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        channel_layer.receive(channel),
+                        timeout=settings.PREDICTION_STREAM_HEARTBEAT_INTERVAL,
+                    )
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if event["type"] != "send_result" or event.get("log_id") in replayed:
+                    continue
+                yield self.format_event(event.get("event_id"), event["message"])
+        finally:
+            await channel_layer.group_discard(group, channel)
+
+    @staticmethod
+    def format_event(event_id, result) -> str:
+        event = f"event: result\ndata: {json.dumps(result)}\n\n"
+        if event_id is not None:
+            event = f"id: {event_id}\n{event}"
+        return event
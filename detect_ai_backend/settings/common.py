@@ -44,6 +44,8 @@ INSTALLED_APPS = [
     "detect_ai_backend.api_keys",
     "detect_ai_backend.stats",
     "detect_ai_backend.predictions",
+    "detect_ai_backend.webhooks",
+    "detect_ai_backend.outbox",
     "allauth",
     "allauth.account",
     "allauth.headless",
@@ -199,4 +201,165 @@ HEADLESS_ONLY = True
 CELERY_TASKS = [
     "detect_ai_backend.predictions",
     "detect_ai_backend.history",
+    "detect_ai_backend.api_keys",
+    "detect_ai_backend.webhooks",
+    "detect_ai_backend.outbox",
 ]
+
+# Predictions
+PREDICTION_BATCH_MAX_SIZE = 1000
+# Number of images packed into a single message sent to the AI server
+PREDICTION_BATCH_MESSAGE_SIZE = 100
+
+# Resolved API keys are cached in-process and in the shared cache
+API_KEY_CACHE_LOCAL_MAXSIZE = 1024
+API_KEY_CACHE_LOCAL_TTL = 30
+API_KEY_CACHE_TTL = 300
+# Fan invalidations out to every process through the message broker
+API_KEY_CACHE_BROADCAST_INVALIDATION = False
+
+# Verified websocket access tokens cached in-process, each until it expires
+WEBSOCKET_TOKEN_CACHE_MAXSIZE = 10000
+# Websocket handshakes in progress per process and per user; extra ones are
+# refused with a retry after WEBSOCKET_RETRY_AFTER to twice as many seconds
+WEBSOCKET_MAX_HANDSHAKES = 100
+WEBSOCKET_MAX_USER_HANDSHAKES = 5
+WEBSOCKET_RETRY_AFTER = 2
+
+# Seconds between pushes of buffered metric counters to the shared cache
+METRICS_FLUSH_INTERVAL = 5
+
+# API key usage is metered in a counter store and flushed to the database
+API_KEY_USAGE_COUNTER_STORE = "detect_ai_backend.api_keys.quota.CacheCounterStore"
+API_KEY_USAGE_FLUSH_INTERVAL = 5
+API_KEY_USAGE_FLUSH_LOCK_TTL = 60
+
+# Token bucket per API key: tokens refilled per second and bucket size
+API_KEY_RATE_LIMITS = {
+    "free_tier": {"rate": 1, "burst": 20},
+    "enterprise_tier": {"rate": 100, "burst": 1000},
+    "custom_tier": {"rate": 50, "burst": 500},
+}
+
+# Queue (formatted with the AI server name) and AMQP priority per API key tier
+PREDICTION_ROUTES = {
+    "free_tier": {"queue": "{ai_server_name}_queue", "priority": 0},
+    "custom_tier": {"queue": "{ai_server_name}_queue", "priority": 5},
+    "enterprise_tier": {"queue": "{ai_server_name}_queue", "priority": 9},
+}
+# x-max-priority of the AI server queues, None for queues without priorities.
+# Priorities are opt-in: the broker refuses publishing to an existing queue
+# declared with other arguments, so the AI server queue must be recreated with
+# the same x-max-priority before this is set. Without it tiers only pick queues
+PREDICTION_QUEUE_MAX_PRIORITY = None
+
+# Fair-share dispatch: predictions wait in a per-user backlog and are released
+# in weighted round-robin order, at most this many in flight per user
+PREDICTION_MAX_IN_FLIGHT_PER_USER = 50
+PREDICTION_FAIR_SHARE_WEIGHTS = {
+    "free_tier": 1,
+    "custom_tier": 2,
+    "enterprise_tier": 4,
+}
+PREDICTION_DISPATCH_BATCH_SIZE = 500
+PREDICTION_DISPATCH_INTERVAL = 2
+PREDICTION_DISPATCH_LOCK_TTL = 60
+# Dispatched predictions without a result after this many seconds no longer
+# count against the user's in-flight limit
+PREDICTION_IN_FLIGHT_TIMEOUT = 300
+
+# Seconds a pending prediction of an image is shared with identical submissions
+PREDICTION_SINGLEFLIGHT_WINDOW = 300
+
+# Results of successful predictions are reused for identical images, keyed by
+# the content hash reported by the storage or computed for inline images, or
+# the normalized URL
+PREDICTION_CONTENT_HASH_TTL = 60 * 60 * 24
+PREDICTION_RESULT_CACHE_TTL = 60 * 60 * 24
+PREDICTION_RESULT_CACHE_MAX_SIZE = 100_000
+PREDICTION_RESULT_CACHE_PRUNE_INTERVAL = 60 * 10
+
+# Prediction status endpoint: results stay hot in the cache for this long, and
+# a request may wait up to PREDICTION_STATUS_MAX_WAIT seconds for them
+PREDICTION_STATUS_CACHE_TTL = 60 * 10
+PREDICTION_STATUS_MAX_WAIT = 30
+PREDICTION_STATUS_MAX_IDS = 100
+
+# Server-Sent Events result stream: seconds between heartbeats of idle
+# streams, and number of missed results read per query when a stream or a
+# websocket reconnects, until all of them are replayed
+PREDICTION_STREAM_HEARTBEAT_INTERVAL = 15
+PREDICTION_STREAM_REPLAY_PAGE_SIZE = 100
+
+# Webhooks: results are posted in batches of up to WEBHOOK_BATCH_SIZE, signed
+# with HMAC-SHA256, and retried with exponential backoff. Webhook hosts must
+# resolve to public addresses, checked on registration and on every connection
+WEBHOOK_ALLOWED_SCHEMES = ["https"]
+WEBHOOK_ALLOW_PRIVATE_ADDRESSES = False
+WEBHOOK_BATCH_SIZE = 50
+WEBHOOK_DELIVERY_LIMIT = 1000
+WEBHOOK_DELIVERY_CONCURRENCY = 10
+WEBHOOK_DELIVERY_INTERVAL = 5
+WEBHOOK_TIMEOUT = 10
+WEBHOOK_MAX_ATTEMPTS = 8
+WEBHOOK_RETRY_BACKOFF = 5
+WEBHOOK_RETRY_BACKOFF_MAX = 60 * 60
+
+# Longest deadline (expires_in, seconds) a client may set on a prediction
+PREDICTION_MAX_EXPIRES_IN = 60 * 60 * 24
+
+# Images are checked before dispatch: hosted under one of the allowed prefixes
+# (our storage when empty), of an image content type and at most this size
+PREDICTION_PREFLIGHT_ENABLED = True
+PREDICTION_PREFLIGHT_ALLOWED_PREFIXES = []
+PREDICTION_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+PREDICTION_PREFLIGHT_TIMEOUT = 5
+PREDICTION_PREFLIGHT_CONCURRENCY = 20
+PREDICTION_PREFLIGHT_CACHE_TTL = 60 * 60
+
+# Images up to this size may be sent inline with the prediction request,
+# skipping the upload to the storage; archived there afterwards for history
+PREDICTION_INLINE_IMAGE_MAX_SIZE = 256 * 1024
+PREDICTION_INLINE_IMAGE_ARCHIVE = True
+# Inline images are kept in the cache until dispatched and archived, not in
+# the database, so this must outlast the longest wait in the backlog
+PREDICTION_INLINE_IMAGE_CACHE_TTL = 60 * 60 * 24
+
+# Outbox: tasks published by requests are relayed to the broker in batches by
+# the relay_outbox command, polling every OUTBOX_POLL_INTERVAL seconds, and by
+# a periodic task as a fallback. The command retries broker and database
+# failures with exponential backoff
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_POLL_INTERVAL = 0.1
+OUTBOX_RETRY_BACKOFF = 1
+OUTBOX_RETRY_BACKOFF_MAX = 30
+OUTBOX_RELAY_INTERVAL = 10
+
+# Results of the AI server are ingested in batches of up to this size, each
+# started PREDICTION_INGEST_DELAY seconds after the first result so that
+# others arriving meanwhile join it
+PREDICTION_INGEST_BATCH_SIZE = 200
+PREDICTION_INGEST_DELAY = 0.2
+PREDICTION_INGEST_INTERVAL = 2
+
+# Celery queues, named "<CELERY_APP_NAME>_<key>": tasks not routed here run on
+# the default queue, which also receives results from the AI server
+CELERY_QUEUE_ROUTES = {
+    # Latency-critical, pushes results to users
+    "send_results": "delivery",
+    # Bulk database and storage work
+    "ingest_results": "persistence",
+    "flush_usage_counters": "persistence",
+    "prune_prediction_results": "persistence",
+    "deliver_webhooks": "persistence",
+    "archive_inline_image": "persistence",
+}
+# Worker pools started by the run_worker command, each consuming its queues
+# with its own pool implementation and concurrency. The periodic tasks are
+# scheduled by the separate run_beat process, so any pool can be scaled out
+CELERY_WORKER_POOLS = {
+    # Staging of AI server results and dispatch, mostly waiting on I/O
+    "backend": {"queues": ["default"], "pool": "threads", "concurrency": 8},
+    "delivery": {"queues": ["delivery"], "pool": "threads", "concurrency": 8},
+    "persistence": {"queues": ["persistence"], "pool": "prefork", "concurrency": 2},
+}
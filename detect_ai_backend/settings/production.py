@@ -31,6 +31,9 @@ DATABASES = {
         "PASSWORD": os.getenv("DB_PASSWORD", "postgres"),  # noqa
         "HOST": os.getenv("DB_HOST", "localhost"),  # noqa
         "PORT": "5432",
+        # Workers keep their connections across tasks, see docker-entrypoint.sh
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 0)),  # noqa
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
@@ -105,6 +108,13 @@ MESSAGE_BROKER_PASSWORD = os.getenv("MESSAGE_BROKER_PASSWORD", "")  # noqa
 MESSAGE_BROKER_HOST = os.getenv("MESSAGE_BROKER_HOST", "")  # noqa
 MESSAGE_BROKER_VHOST = os.getenv("MESSAGE_BROKER_VHOST", "")  # noqa
 CELERY_APP_NAME = "detect_ai_backend"
+# Worker topology, e.g. CELERY_PERSISTENCE_POOL=threads and
+# CELERY_PERSISTENCE_CONCURRENCY=8 to scale result ingestion
+for name, pool in CELERY_WORKER_POOLS.items():  # noqa
+    pool["pool"] = os.getenv(f"CELERY_{name.upper()}_POOL", pool["pool"])  # noqa
+    pool["concurrency"] = int(
+        os.getenv(f"CELERY_{name.upper()}_CONCURRENCY", pool["concurrency"])  # noqa
+    )
 CELERY_BROKER_URL = f"amqp://{MESSAGE_BROKER_USERNAME}:{MESSAGE_BROKER_PASSWORD}@{MESSAGE_BROKER_HOST}/{MESSAGE_BROKER_VHOST}"  # noqa
 CHANNEL_LAYERS = {
     "default": {
@@ -115,3 +125,11 @@ CHANNEL_LAYERS = {
     }
 }
 AI_SERVER_NAME = os.getenv("AI_SERVER_NAME", "")  # noqa
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL", "redis://localhost:6379/0"),  # noqa
+    }
+}
+API_KEY_CACHE_BROADCAST_INVALIDATION = True
@@ -110,3 +110,18 @@ MESSAGE_BROKER_VHOST = os.getenv("MESSAGE_BROKER_VHOST", "")  # noqa
 CELERY_APP_NAME = "detect_ai_backend"
 CELERY_BROKER_URL = f"amqp://{MESSAGE_BROKER_USERNAME}:{MESSAGE_BROKER_PASSWORD}@{MESSAGE_BROKER_HOST}/{MESSAGE_BROKER_VHOST}"  # noqa
 AI_SERVER_NAME = os.getenv("AI_SERVER_NAME", "")  # noqa
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+API_KEY_USAGE_COUNTER_STORE = "detect_ai_backend.api_keys.quota.LocalCounterStore"
+
+# Tests post webhooks to a local plain HTTP server
+WEBHOOK_ALLOWED_SCHEMES = ["http", "https"]
+WEBHOOK_ALLOW_PRIVATE_ADDRESSES = True
+
+# Tests submit arbitrary image URLs, pre-flight tests enable the check
+PREDICTION_PREFLIGHT_ENABLED = False
@@ -19,3 +19,30 @@ class StastsAPICallSerializer(StatsBase):
 
 class StastsSuccessActionSerializer(StatsBase):
     total_successfull_actions = serializers.IntegerField()
+
+
+class StatsAPIKeyCacheSerializer(serializers.Serializer):
+    local_hits = serializers.IntegerField()
+    shared_hits = serializers.IntegerField()
+    misses = serializers.IntegerField()
+    hit_ratio = serializers.FloatField()
+    local_size = serializers.IntegerField()
+    local_maxsize = serializers.IntegerField()
+
+
+class StatsPredictionQueueSerializer(serializers.Serializer):
+    tier = serializers.CharField()
+    priority = serializers.IntegerField()
+    count = serializers.IntegerField()
+    avg_turnaround_seconds = serializers.FloatField(allow_null=True)
+    avg_queued_seconds = serializers.FloatField(allow_null=True)
+
+
+class StatsPredictionResultCacheSerializer(serializers.Serializer):
+    hits = serializers.IntegerField()
+    misses = serializers.IntegerField()
+    hit_ratio = serializers.FloatField()
+    coalesced = serializers.IntegerField()
+    saved_gpu_calls = serializers.IntegerField()
+    size = serializers.IntegerField()
+    max_size = serializers.IntegerField()
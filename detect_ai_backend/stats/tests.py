@@ -156,3 +156,66 @@ class StatsCreatedUsersViewTestCase(TestCase):
 
         # Verify only regular users are counted
         self.assertEqual(response.data["total_users_joined"], 5)
+
+
+class StatsAPIKeyCacheViewTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("list_stats_api_key_cache")
+        self.admin_user = User.objects.create_user(
+            email="cacheadmin@gmail.com",  # nosec
+            password="testpass",  # nosec
+            is_staff=True,
+        )
+
+    def test_admin_can_read_cache_stats(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for field in ["local_hits", "shared_hits", "misses", "hit_ratio"]:
+            self.assertIn(field, response.data)
+
+    def test_regular_user_cannot_read_cache_stats(self):
+        user = User.objects.create_user(
+            email="cacheuser@gmail.com",  # nosec
+            password="testpass",  # nosec
+        )
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class StatsPredictionQueuesViewTestCase(TestCase):
+    def test_admin_can_read_queue_stats(self):
+        admin_user = User.objects.create_user(
+            email="queueadmin@gmail.com",  # nosec
+            password="testpass",  # nosec
+            is_staff=True,
+        )
+        client = APIClient()
+        client.force_authenticate(user=admin_user)
+        response = client.get(reverse("list_stats_prediction_queues"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {item["tier"] for item in response.data},
+            {"free_tier", "enterprise_tier", "custom_tier"},
+        )
+
+
+class StatsPredictionResultCacheViewTestCase(TestCase):
+    def test_admin_can_read_result_cache_stats(self):
+        admin_user = User.objects.create_user(
+            email="resultadmin@gmail.com",  # nosec
+            password="testpass",  # nosec
+            is_staff=True,
+        )
+        client = APIClient()
+        client.force_authenticate(user=admin_user)
+        response = client.get(reverse("list_stats_prediction_result_cache"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for field in ["hits", "misses", "hit_ratio", "saved_gpu_calls", "size"]:
+            self.assertIn(field, response.data)
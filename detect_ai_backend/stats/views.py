@@ -8,13 +8,19 @@ from django.utils.timezone import now
 from django.views.decorators.cache import cache_page
 from rest_framework import generics, permissions, response
 
+from detect_ai_backend.api_keys.cache import get_cache_stats
 from detect_ai_backend.api_keys.models import APIKey, APIKeyLog, APIKeyLogStatus
 from detect_ai_backend.api_keys.serializers import DayGroupSerializer
+from detect_ai_backend.predictions.dispatch import get_queue_stats
+from detect_ai_backend.predictions.result_cache import get_result_cache_stats
 from detect_ai_backend.stats.serializers import (
     StastsAPICallSerializer,
     StastsAPIKeysCreateSerializer,
     StastsSuccessActionSerializer,
+    StatsAPIKeyCacheSerializer,
     StatsCreatedUsersSerializer,
+    StatsPredictionQueueSerializer,
+    StatsPredictionResultCacheSerializer,
 )
 from detect_ai_backend.users.models import User
 
@@ -220,3 +226,28 @@ class StastsSuccessActionsView(generics.RetrieveAPIView):
             ),
         )
         return response.Response(stats)
+
+
+class StatsAPIKeyCacheView(generics.RetrieveAPIView):
+    serializer_class = StatsAPIKeyCacheSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return response.Response(get_cache_stats())
+
+
+class StatsPredictionQueuesView(generics.ListAPIView):
+    serializer_class = StatsPredictionQueueSerializer
+    permission_classes = [permissions.IsAdminUser]
+    pagination_class = None
+
+    def get(self, request, *args, **kwargs):
+        return response.Response(get_queue_stats())
+
+
+class StatsPredictionResultCacheView(generics.RetrieveAPIView):
+    serializer_class = StatsPredictionResultCacheSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return response.Response(get_result_cache_stats())
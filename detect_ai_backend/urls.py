@@ -36,19 +36,27 @@ from detect_ai_backend.authentication.views import (
 )
 from detect_ai_backend.files.views import SignedGCPStorageURLView
 from detect_ai_backend.history.views import ListHistoryView, ListRecentHistoryView
-from detect_ai_backend.predictions.views import PredictionCreateView
+from detect_ai_backend.predictions.views import (
+    PredictionCreateView,
+    PredictionStatusView,
+    PredictionStreamView,
+)
 from detect_ai_backend.stats.views import (
     StastsAPICallView,
     StastsSuccessActionsView,
+    StatsAPIKeyCacheView,
     StatsAPIKeyLogListView,
     StatsCreatedAPIKeysView,
     StatsCreatedUsersView,
+    StatsPredictionQueuesView,
+    StatsPredictionResultCacheView,
 )
 from detect_ai_backend.users.views import (
     ListUserView,
     RegistrationAPIView,
     RetrieveUpdateUserProfileView,
 )
+from detect_ai_backend.webhooks.views import WebhookView
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -122,6 +130,11 @@ urlpatterns = [
         APIKeyLogRetrieveView.as_view(),
         name="list_create_api_key_log",
     ),
+    path(
+        "api/api-keys/<str:id>/webhook",
+        WebhookView.as_view(),
+        name="api_key_webhook",
+    ),
     path(
         "api/stats/api-key-logs",
         StatsAPIKeyLogListView.as_view(),
@@ -147,11 +160,41 @@ urlpatterns = [
         StastsSuccessActionsView.as_view(),
         name="list_stats_api_call_success",
     ),
+    path(
+        "api/stats/api-key-cache",
+        StatsAPIKeyCacheView.as_view(),
+        name="list_stats_api_key_cache",
+    ),
+    path(
+        "api/stats/prediction-queues",
+        StatsPredictionQueuesView.as_view(),
+        name="list_stats_prediction_queues",
+    ),
+    path(
+        "api/stats/prediction-result-cache",
+        StatsPredictionResultCacheView.as_view(),
+        name="list_stats_prediction_result_cache",
+    ),
     path(
         "api/predictions",
         PredictionCreateView.as_view(),
         name="prediction_create_api_view",
     ),
+    path(
+        "api/predictions/results",
+        PredictionStatusView.as_view(),
+        name="prediction_status_list_api_view",
+    ),
+    path(
+        "api/predictions/stream",
+        PredictionStreamView.as_view(),
+        name="prediction_stream_api_view",
+    ),
+    path(
+        "api/predictions/<int:id>",
+        PredictionStatusView.as_view(),
+        name="prediction_status_api_view",
+    ),
     path(
         "api/history",
         ListHistoryView.as_view(),
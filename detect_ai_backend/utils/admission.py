@@ -0,0 +1,106 @@
+import logging
+import random
+from collections import Counter
+
+from django.conf import settings
+from rest_framework_simplejwt.settings import api_settings
+
+from detect_ai_backend.utils.authentication import get_access_token, verify_token
+
+logger = logging.getLogger(__name__)
+
+# Like HTTP 429, the client should reconnect after the advertised delay
+CLOSE_CODE_OVERLOADED = 4029
+
+
+class AdmissionMiddleware:
+    """
+    Caps the websocket handshakes in progress in this process, and per user,
+    so a reconnect storm is spread over time instead of overloading the node.
+    Refused handshakes are accepted and closed at once with
+    ``CLOSE_CODE_OVERLOADED`` and a jittered ``retry-after=<seconds>`` reason.
+    A handshake ends when the application closes the socket or has handled
+    the connect, including what it sends right after accepting, such as the
+    missed results it replays.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        # Handshakes of this process, which serves them on a single event loop
+        self.handshakes = 0
+        self.user_handshakes = Counter()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "websocket":
+            return await self.inner(scope, receive, send)
+
+        user_id = self.get_user_id(scope)
+        if self.handshakes >= settings.WEBSOCKET_MAX_HANDSHAKES or (
+            user_id is not None
+            and self.user_handshakes[user_id] >= settings.WEBSOCKET_MAX_USER_HANDSHAKES
+        ):
+            return await self.refuse(receive, send)
+
+        self.handshakes += 1
+        if user_id is not None:
+            self.user_handshakes[user_id] += 1
+        in_progress = True
+
+        def end_handshake():
+            nonlocal in_progress
+            if not in_progress:
+                return
+            in_progress = False
+            self.handshakes -= 1
+            if user_id is not None:
+                self.user_handshakes[user_id] -= 1
+                if not self.user_handshakes[user_id]:
+                    del self.user_handshakes[user_id]
+
+        connected = False
+
+        async def receive_wrapper():
+            nonlocal connected
+            # The application only asks for another message once its connect
+            # handler has returned
+            if connected:
+                end_handshake()
+            message = await receive()
+            connected = connected or message["type"] == "websocket.connect"
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "websocket.close":
+                end_handshake()
+            await send(message)
+
+        try:
+            return await self.inner(scope, receive_wrapper, send_wrapper)
+        finally:
+            end_handshake()
+
+    @staticmethod
+    def get_user_id(scope):
+        # Tokens are verified once per process, the auth middleware reuses it
+        claims = verify_token(get_access_token(scope))
+        if claims is None:
+            return None
+        return claims[api_settings.USER_ID_CLAIM]
+
+    @staticmethod
+    async def refuse(receive, send):
+        message = await receive()
+        if message["type"] != "websocket.connect":
+            return
+        # A close before the accept would reach the client as a bare HTTP 403
+        await send({"type": "websocket.accept", "subprotocol": "Token"})
+        retry_after = settings.WEBSOCKET_RETRY_AFTER
+        retry_after = random.randint(retry_after, 2 * retry_after)  # nosec
+        await send(
+            {
+                "type": "websocket.close",
+                "code": CLOSE_CODE_OVERLOADED,
+                "reason": f"retry-after={retry_after}",
+            }
+        )
+        logger.info("Refused websocket handshake, retry after %ss", retry_after)
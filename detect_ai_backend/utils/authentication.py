@@ -1,16 +1,31 @@
+import hashlib
 import logging
+import time
 
 from channels.auth import BaseMiddleware
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.urls.exceptions import Resolver404
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework import exceptions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import AccessToken
 
 from detect_ai_backend.users.models import User
+from detect_ai_backend.utils.cache import LocalLRUCache
 
 logger = logging.getLogger(__name__)
 
+# Claims of verified access tokens by token hash, each kept until its token
+# expires, so reconnecting sockets skip the signature check
+verified_tokens = LocalLRUCache(
+    maxsize=settings.WEBSOCKET_TOKEN_CACHE_MAXSIZE,
+    ttl=settings.SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"].total_seconds(),
+)
+
 
 @database_sync_to_async
 def get_user(user_id):
@@ -20,6 +35,63 @@ def get_user(user_id):
         return AnonymousUser()
 
 
+@database_sync_to_async
+def authenticate(request):
+    """
+    Authenticate a plain (async) Django request like the REST framework views.
+    """
+    result = JWTAuthentication().authenticate(request)
+    if result is None:
+        raise exceptions.NotAuthenticated
+    return result[0]
+
+
+def verify_token(token: str) -> dict | None:
+    """
+    Claims of a valid access token, None when the token is invalid or expired.
+    """
+    key = hashlib.sha256(token.encode()).hexdigest()
+    claims = verified_tokens.get(key)
+    if claims is None:
+        try:
+            claims = dict(AccessToken(token).payload)
+        except TokenError:
+            return None
+        if api_settings.USER_ID_CLAIM not in claims:
+            return None
+    ttl = claims["exp"] - time.time()
+    if ttl <= 0:
+        verified_tokens.delete(key)
+        return None
+    verified_tokens.set(key, claims, ttl=ttl)
+    return claims
+
+
+def get_access_token(scope) -> str:
+    """
+    Access token of a websocket handshake, sent as the last subprotocol.
+    """
+    headers = dict(scope.get("headers", []))
+    token = headers.get(b"sec-websocket-protocol", b"").decode("utf-8")
+    return token.split(" ")[-1]
+
+
+class LazyUser(TokenUser):
+    """
+    User built from the claims of its access token. The database row is only
+    loaded by ``aget_user``, for consumers which need more than the id.
+    """
+
+    def __init__(self, claims: dict) -> None:
+        super().__init__(claims)
+        self._user = None
+
+    async def aget_user(self) -> User:
+        if self._user is None:
+            self._user = await User.objects.aget(id=self.id)
+        return self._user
+
+
 class AuthMiddleware(BaseMiddleware):
     """
     Custom middleware for WebSocket authentication using JWT
@@ -30,52 +102,25 @@ class AuthMiddleware(BaseMiddleware):
         self.app = app
 
     async def __call__(self, scope, receive, send):
-        # Parse headers
-        headers = dict(scope.get("headers", []))
-
         # Look for authentication token
-        token = headers.get(b"sec-websocket-protocol", b"").decode("utf-8")
-        if not token:
-            await send({"type": "websocket.close", "code": 4001})
-            return
-
-        access_token = token.split(" ")[-1]
+        access_token = get_access_token(scope)
         if not access_token:
             await send({"type": "websocket.close", "code": 4001})
             return
-        # Authenticate user
-        user = await self.authenticate_user(access_token)
+        # Authenticate user, without touching the database
+        claims = verify_token(access_token)
 
-        if not user or not user.id:
+        if claims is None:
             # Close connection if authentication fails
             await send({"type": "websocket.close", "code": 4001})
             return
 
         # Add authenticated user to scope
-        scope["user"] = user
+        scope["user"] = LazyUser(claims)
 
         # Continue with the application
         return await self.app(scope, receive, send)
 
-    @database_sync_to_async
-    def authenticate_user(self, token):
-        """
-        Authenticate user using JWT token
-        """
-        try:
-            # Validate the token
-            validated_token = AccessToken(token)
-
-            # Get the user ID from the token
-            user_id = validated_token["user_id"]
-
-            # Fetch the user
-            user = User.objects.get(id=user_id)
-            return user
-
-        except (InvalidToken, TokenError, User.DoesNotExist):
-            return None
-
 
 def AuthMiddlewareStack(inner):
     return AuthMiddleware(inner)
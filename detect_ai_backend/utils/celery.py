@@ -1,10 +1,19 @@
 from typing import Any, Dict
 
 import msgpack
+from celery.concurrency import ALIASES
+from django.conf import settings
 
 from detect_ai_backend.celery import app as current_app
 
 
+def get_user_group(user_id: int) -> str:
+    """
+    Channel layer group every connection of the user listens to.
+    """
+    return f"user_{user_id}"
+
+
 def publish_message_to_group(message: Dict[str, Any], group: str) -> None:
     with current_app.producer_pool.acquire(block=True) as producer:
         producer.publish(
@@ -19,3 +28,50 @@ def publish_message_to_group(message: Dict[str, Any], group: str) -> None:
             routing_key=group,
             retry=False,  # Channel Layer at-most once semantics
         )
+
+
+def get_queue_name(key: str) -> str:
+    if key == "default":
+        return current_app.conf.task_default_queue
+    return f"{settings.CELERY_APP_NAME}_{key}"
+
+
+def check_task_routes() -> list[str]:
+    """
+    Problems of ``CELERY_QUEUE_ROUTES`` and ``CELERY_WORKER_POOLS``: routes to
+    queues no pool consumes, which would pile up unnoticed, and routes of
+    tasks that do not exist.
+    """
+    current_app.autodiscover_tasks(settings.CELERY_TASKS, force=True)
+    consumed = {
+        key for pool in settings.CELERY_WORKER_POOLS.values() for key in pool["queues"]
+    }
+    errors = []
+    if "default" not in consumed:
+        errors.append("No worker pool consumes the default queue.")
+    for name, pool in settings.CELERY_WORKER_POOLS.items():
+        if pool.get("pool", "prefork") not in ALIASES:
+            errors.append(f"Worker pool {name} uses unknown pool {pool['pool']}.")
+    for task, key in settings.CELERY_QUEUE_ROUTES.items():
+        if key not in consumed:
+            errors.append(
+                f"Task {task} is routed to {key}, no worker pool consumes it."
+            )
+        if f"{settings.APP_NAME}.{task}" not in current_app.tasks:
+            errors.append(f"Task {task} is routed but not registered.")
+    return errors
+
+
+def get_task_concurrency(task: str) -> int:
+    """
+    Number of tasks ``task`` the worker pools can run at once.
+    """
+    key = settings.CELERY_QUEUE_ROUTES.get(task, "default")
+    return (
+        sum(
+            pool["concurrency"]
+            for pool in settings.CELERY_WORKER_POOLS.values()
+            if key in pool["queues"]
+        )
+        or 1
+    )
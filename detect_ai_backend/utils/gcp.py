@@ -1,3 +1,4 @@
+import base64
 import datetime
 import logging
 import uuid
@@ -9,9 +10,12 @@ from google.auth.transport import requests
 logger = logging.getLogger(__name__)
 
 
-def generate_upload_signed_url_v4(mime_type: str):
+def generate_upload_signed_url_v4(mime_type: str, content_md5: str | None = None):
     """Generates a v4 signed URL for uploading a blob using HTTP PUT.
 
+    With ``content_md5`` (hex digest) the upload must send the matching
+    Content-MD5 header, so the stored object is known to have that digest.
+
     Note that this method requires a service account key file. You can not use
     this if you are using Application Default Credentials from Google Compute
     Engine or from the Google Cloud SDK.
@@ -26,6 +30,7 @@ def generate_upload_signed_url_v4(mime_type: str):
                     expiration=datetime.timedelta(minutes=5),
                     method="PUT",
                     content_type=mime_type,
+                    content_md5=md5_header,
                     service_account_email=settings.GCP_CREDENTIALS.service_account_email,
                     access_token=settings.GCP_CREDENTIALS.token,
                 )
@@ -42,6 +47,9 @@ def generate_upload_signed_url_v4(mime_type: str):
                 logger.error(f"Failed to generate signed URL (Attempt {attempt + 1})")
         raise RuntimeError("Unable to generate signed URL after multiple attempts")
 
+    md5_header = None
+    if content_md5:
+        md5_header = base64.b64encode(bytes.fromhex(content_md5)).decode()
     file_name = str(uuid.uuid4())
     url = _generate_signed_url(file_name, attempts=3)
     return url, file_name
@@ -0,0 +1,115 @@
+import ipaddress
+import os
+import socket
+import threading
+
+import requests
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _reset_after_fork() -> None:
+    # Pooled sockets must not be shared with the parent process
+    global _sessions_lock
+    _sessions_lock = threading.Lock()
+    _sessions.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def is_public_address(address: str) -> bool:
+    """
+    Whether an IP address is globally routable, i.e. not private, loopback,
+    link-local, reserved or multicast.
+    """
+    try:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+    except ValueError:
+        return False
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def resolves_to_public_addresses(host: str) -> bool:
+    """
+    Whether every address the host resolves to is public. Unresolvable hosts
+    are not.
+    """
+    try:
+        infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError):
+        return False
+    return bool(infos) and all(is_public_address(info[4][0]) for info in infos)
+
+
+class _PublicAddressMixin:
+    def _new_conn(self):
+        # Checked on the connected socket, so a host re-resolving to a private
+        # address after validation (DNS rebinding) is still refused
+        sock = super()._new_conn()
+        address = sock.getpeername()[0]
+        if not is_public_address(address):
+            sock.close()
+            raise NewConnectionError(
+                self, f"Refusing to connect to non-public address {address}"
+            )
+        return sock
+
+
+class _PublicHTTPConnection(_PublicAddressMixin, HTTPConnection):
+    pass
+
+
+class _PublicHTTPSConnection(_PublicAddressMixin, HTTPSConnection):
+    pass
+
+
+class _PublicHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _PublicHTTPConnection
+
+
+class _PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _PublicHTTPSConnection
+
+
+class PublicAddressAdapter(requests.adapters.HTTPAdapter):
+    """
+    Adapter that only connects to public addresses.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _PublicHTTPConnectionPool,
+            "https": _PublicHTTPSConnectionPool,
+        }
+
+
+def get_session(
+    name: str, pool_maxsize: int, public_only: bool = False
+) -> requests.Session:
+    """
+    Session shared per purpose by the threads of the process, so connections
+    to the same host are kept alive and reused. Sessions to user supplied URLs
+    are ``public_only``: they refuse to connect to non-public addresses and
+    ignore proxies from the environment, which would hide the peer address.
+    """
+    key = (name, public_only)
+    with _sessions_lock:
+        if key not in _sessions:
+            adapter_class = (
+                PublicAddressAdapter if public_only else requests.adapters.HTTPAdapter
+            )
+            adapter = adapter_class(pool_maxsize=pool_maxsize)
+            session = requests.Session()
+            session.trust_env = not public_only
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+        return _sessions[key]
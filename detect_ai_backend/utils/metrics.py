@@ -0,0 +1,60 @@
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+_pending: Counter = Counter()
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _reset_after_fork() -> None:
+    # Increments buffered by the parent are flushed by the parent, not by
+    # every forked worker process
+    global _lock
+    _lock = threading.Lock()
+    _pending.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _cache_key(name: str) -> str:
+    return f"metrics:{name}"
+
+
+def flush() -> None:
+    """
+    Push the increments buffered in this process to the shared cache.
+    """
+    global _last_flush
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    for name, value in pending.items():
+        key = _cache_key(name)
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, value)
+
+
+def incr(name: str, value: int = 1) -> None:
+    """
+    Increment a counter shared by every process. Increments are buffered
+    locally and pushed every ``METRICS_FLUSH_INTERVAL`` seconds so hot paths
+    do not pay a cache round trip per event.
+    """
+    with _lock:
+        _pending[name] += value
+        due = time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+def get_counters(*names: str) -> dict[str, int]:
+    flush()
+    values = cache.get_many([_cache_key(name) for name in names])
+    return {name: values.get(_cache_key(name), 0) for name in names}
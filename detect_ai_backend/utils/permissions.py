@@ -1,7 +1,9 @@
 from django.utils.translation import gettext_lazy as _
 from rest_framework import exceptions, permissions, status
 
-from detect_ai_backend.api_keys.models import APIKey
+from detect_ai_backend.api_keys.cache import get_api_key
+from detect_ai_backend.api_keys.models import hash_api_key
+from detect_ai_backend.api_keys.quota import get_usage
 
 
 class LimitExceededException(exceptions.APIException):
@@ -22,17 +24,16 @@ class HasAPIKey(permissions.BasePermission):
         is_authenticated = False
         api_key_instance = None
         if request.user and request.user.is_authenticated and api_key:
-            try:
-                api_key_instance = APIKey.objects.get(
-                    api_key=api_key, user=request.user
-                )
-                if api_key_instance.total_usage >= api_key_instance.maximum_usage:
+            api_key_instance = get_api_key(hash_api_key(api_key))
+            if api_key_instance and api_key_instance.user_id != request.user.id:
+                api_key_instance = None
+            if api_key_instance:
+                # Early rejection only, the view reserves usage atomically
+                if get_usage(api_key_instance.id) >= api_key_instance.maximum_usage:
                     raise LimitExceededException
                 if not api_key_instance.is_default:
                     raise APIKeyNotDefaultException
                 is_authenticated = True
-            except APIKey.DoesNotExist:
-                pass
         request.api_key = api_key_instance
         return is_authenticated
 
@@ -0,0 +1,130 @@
+import base64
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LocalHTTPServer:
+    """
+    HTTP server on a free local port, serving from a thread while used as a
+    context manager. Subclasses answer requests in ``handle`` and may record
+    them in ``requests`` under ``_lock``.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/"
+
+    def handle(self, request: BaseHTTPRequestHandler) -> None:
+        raise NotImplementedError
+
+    @staticmethod
+    def respond(request, status: int, headers=None, body: bytes = b"") -> None:
+        request.send_response(status)
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.handle(self)
+
+            def do_POST(self):
+                server.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class WebhookReceiver(LocalHTTPServer):
+    """
+    Local HTTP server standing in for a webhook receiver, to exercise and
+    benchmark deliveries offline. Records every request and answers with the
+    queued ``responses`` status codes, then ``default_status``.
+
+        with WebhookReceiver(responses=[500]) as receiver:
+            ...post to receiver.url...
+            receiver.requests  # [{"headers": ..., "body": ...}, ...]
+    """
+
+    def __init__(self, responses=None, default_status=200, delay=0):
+        super().__init__()
+        self.responses = list(responses or [])
+        self.default_status = default_status
+        self.delay = delay
+
+    def handle(self, request):
+        body = request.rfile.read(int(request.headers.get("Content-Length", 0)))
+        if self.delay:
+            self._stopped.wait(self.delay)
+        with self._lock:
+            self.requests.append(
+                {"headers": dict(request.headers), "body": json.loads(body)}
+            )
+            status = self.responses.pop(0) if self.responses else self.default_status
+        self.respond(request, status)
+
+
+class ImageServer(LocalHTTPServer):
+    """
+    Local HTTP server standing in for the image storage. Serves ``images``,
+    a mapping of path to ``(content_type, size)`` of zero bytes, honouring
+    ``Range`` headers and reporting the MD5 in ``x-goog-hash`` like the
+    storage does; other paths are not found.
+
+        with ImageServer({"/cat.png": ("image/png", 1024)}) as server:
+            ...fetch server.url + "cat.png"...
+            server.requests  # ["/cat.png", ...]
+    """
+
+    def __init__(self, images=None):
+        super().__init__()
+        self.images = dict(images or {})
+
+    def handle(self, request):
+        path = request.path.split("?")[0]
+        with self._lock:
+            self.requests.append(path)
+        if path not in self.images:
+            self.respond(request, 404)
+            return
+        content_type, size = self.images[path]
+        md5 = hashlib.md5(b"\0" * size, usedforsecurity=False).digest()
+        headers = {
+            "Content-Type": content_type,
+            "x-goog-hash": f"crc32c=AAAAAA==, md5={base64.b64encode(md5).decode()}",
+        }
+        status, length = 200, size
+        if request.headers.get("Range") and size:
+            # Only the first byte is ever requested
+            status, length = 206, 1
+            headers["Content-Range"] = f"bytes 0-0/{size}"
+        self.respond(request, status, headers, b"\0" * length)
@@ -1,10 +1,15 @@
+import threading
 import uuid
 from unittest.mock import MagicMock, patch
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
 # Assuming the function is in detect_ai_backend.utils.gcp
+from detect_ai_backend.utils import metrics
+from detect_ai_backend.utils.celery import check_task_routes, get_task_concurrency
 from detect_ai_backend.utils.gcp import generate_upload_signed_url_v4
+from detect_ai_backend.utils.throttling import TokenBucket
 
 
 class GenerateUploadSignedURLV4Test(TestCase):
@@ -100,3 +105,111 @@ class GenerateUploadSignedURLV4Test(TestCase):
             self.assertTrue(url.startswith("https://"))
             self.assertTrue(len(file_name) == 36)  # UUID length
             mock_url_gen.assert_called_once_with("image/jpeg")
+
+
+class TokenBucketTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @patch("detect_ai_backend.utils.throttling.time.time")
+    def test_consume_up_to_burst(self, mock_time):
+        mock_time.return_value = 1000.0
+        bucket = TokenBucket("test", rate=1, burst=3)
+
+        self.assertEqual(bucket.consume(2), (True, 1, 0))
+        self.assertEqual(bucket.consume(1), (True, 0, 0))
+        allowed, remaining, wait = bucket.consume(1)
+        self.assertFalse(allowed)
+        self.assertEqual(wait, 1)
+
+    @patch("detect_ai_backend.utils.throttling.time.time")
+    def test_refill_is_capped_at_burst(self, mock_time):
+        mock_time.return_value = 1000.0
+        bucket = TokenBucket("test", rate=2, burst=3)
+        bucket.consume(3)
+
+        mock_time.return_value = 1001.0
+        self.assertEqual(bucket.consume(2), (True, 0, 0))
+
+        # A long idle period does not grow the bucket past its burst
+        mock_time.return_value = 2000.0
+        self.assertEqual(bucket.consume(3), (True, 0, 0))
+        self.assertFalse(bucket.consume(1)[0])
+
+    @patch("detect_ai_backend.utils.throttling.time.time")
+    def test_concurrent_consumers_after_idle(self, mock_time):
+        mock_time.return_value = 1000.0
+        bucket = TokenBucket("test", rate=1, burst=20)
+        bucket.consume(20)
+
+        # Interleaved refills after an idle hour fill the bucket only once
+        mock_time.return_value = 4600.0
+        barrier = threading.Barrier(30)
+        results = []
+
+        def consume():
+            barrier.wait()
+            results.append(bucket.consume(1))
+
+        threads = [threading.Thread(target=consume) for _ in range(30)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        granted = [result for result in results if result[0]]
+        self.assertEqual(len(granted), 20)
+        self.assertEqual(sorted(result[1] for result in granted), list(range(20)))
+        self.assertEqual({result[2] for result in results if not result[0]}, {1})
+
+    @patch("detect_ai_backend.utils.throttling.time.time")
+    def test_request_larger_than_burst_leaves_debt(self, mock_time):
+        mock_time.return_value = 1000.0
+        bucket = TokenBucket("test", rate=1, burst=3)
+
+        self.assertEqual(bucket.consume(10), (True, -7, 0))
+        self.assertEqual(bucket.consume(1), (False, -7, 8))
+
+        mock_time.return_value = 1008.0
+        self.assertEqual(bucket.consume(1), (True, 0, 0))
+
+
+class CheckTaskRoutesTestCase(TestCase):
+    def test_configured_routes_are_valid(self):
+        self.assertEqual(check_task_routes(), [])
+
+    @override_settings(
+        CELERY_QUEUE_ROUTES={"send_results": "unknown", "missing": "delivery"},
+        CELERY_WORKER_POOLS={"delivery": {"queues": ["delivery"]}},
+    )
+    def test_invalid_routes_are_reported(self):
+        self.assertEqual(
+            check_task_routes(),
+            [
+                "No worker pool consumes the default queue.",
+                "Task send_results is routed to unknown, no worker pool consumes it.",
+                "Task missing is routed but not registered.",
+            ],
+        )
+
+    @override_settings(
+        CELERY_WORKER_POOLS={
+            "backend": {"queues": ["default"], "concurrency": 1},
+            "persistence": {"queues": ["persistence"], "concurrency": 4},
+            "spare": {"queues": ["persistence", "delivery"], "concurrency": 2},
+        }
+    )
+    def test_get_task_concurrency(self):
+        self.assertEqual(get_task_concurrency("ingest_results"), 6)
+        self.assertEqual(get_task_concurrency("dispatch_predictions"), 1)
+
+
+class MetricsForkTestCase(TestCase):
+    @override_settings(METRICS_FLUSH_INTERVAL=3600)
+    def test_forked_process_drops_parent_increments(self):
+        metrics.incr("tests.forked")
+        self.assertTrue(metrics._pending)
+
+        metrics._reset_after_fork()
+
+        self.assertFalse(metrics._pending)
@@ -0,0 +1,144 @@
+import math
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework import throttling
+
+# Refill, cap and consume in one step on the Redis server. The bucket is a
+# hash of the tokens left and the time they were counted, a missing bucket is
+# full. A request may take more than the tokens left, leaving the bucket in
+# debt, as long as min(cost, burst) tokens are available.
+CONSUME_SCRIPT = """
+local rate, burst, now, cost = tonumber(ARGV[1]), tonumber(ARGV[2]),
+    tonumber(ARGV[3]), tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - ts, 0) * rate)
+local allowed = 0
+if tokens >= math.min(cost, burst) then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+_local_lock = threading.Lock()
+
+
+def _reset_after_fork() -> None:
+    # The lock may have been held by another thread of the parent
+    global _local_lock
+    _local_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class TokenBucket:
+    """
+    Token bucket kept in the shared cache.
+
+    Refilling, capping at ``burst`` and consuming are one atomic step: a Lua
+    script on Redis, or a read and write of the single (tokens, time) value
+    under a process lock on other backends, such as the local memory cache of
+    the tests.
+    Concurrent requests can neither exceed the rate nor refill twice.
+    """
+
+    def __init__(self, key: str, rate: float, burst: int):
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+
+    def consume(self, tokens: int = 1) -> tuple[bool, float, float]:
+        """
+        Take ``tokens`` from the bucket. A request larger than the burst is
+        granted on a full bucket and leaves it in debt, so it is paid for in
+        full. Returns whether the tokens were granted, the tokens left and the
+        seconds until the request could succeed.
+        """
+        now = time.time()
+        backend = caches[DEFAULT_CACHE_ALIAS]
+        if isinstance(backend, RedisCache):
+            allowed, left = self._consume_redis(backend, now, tokens)
+        else:
+            allowed, left = self._consume_local(backend, now, tokens)
+
+        wait = 0
+        if not allowed:
+            wait = (min(tokens, self.burst) - left) / self.rate
+        return allowed, left, wait
+
+    def _consume_redis(self, backend, now: float, cost: int) -> tuple[bool, float]:
+        key = backend.make_and_validate_key(self.key)
+        client = backend._cache.get_client(key, write=True)
+        allowed, left = client.eval(
+            CONSUME_SCRIPT, 1, key, self.rate, self.burst, now, cost
+        )
+        return bool(allowed), float(left)
+
+    def _consume_local(self, backend, now: float, cost: int) -> tuple[bool, float]:
+        with _local_lock:
+            left, ts = backend.get(self.key, (self.burst, now))
+            left = min(self.burst, left + max(now - ts, 0) * self.rate)
+            allowed = left >= min(cost, self.burst)
+            if allowed:
+                left -= cost
+            timeout = math.ceil((self.burst - left) / self.rate) + 1
+            backend.set(self.key, (left, now), timeout=timeout)
+        return allowed, left
+
+
+class APIKeyRateThrottle(throttling.BaseThrottle):
+    """
+    Limits the request rate of each API key with a token bucket whose rate
+    and burst depend on the key's tier, see ``API_KEY_RATE_LIMITS``.
+
+    Must run after ``HasAPIKey``, which resolves ``request.api_key``. Views
+    can define ``get_throttle_cost(request)`` to charge more than one token.
+    """
+
+    def allow_request(self, request, view):
+        api_key = getattr(request, "api_key", None)
+        limit = settings.API_KEY_RATE_LIMITS.get(getattr(api_key, "api_key_type", None))
+        if not api_key or not limit:
+            return True
+
+        rate, burst = limit["rate"], limit["burst"]
+        cost = 1
+        if hasattr(view, "get_throttle_cost"):
+            cost = view.get_throttle_cost(request)
+
+        bucket = TokenBucket(f"throttle:api_key:{api_key.id}", rate, burst)
+        allowed, remaining, self._wait = bucket.consume(cost)
+        request.rate_limit = {
+            "limit": burst,
+            "remaining": max(math.floor(remaining), 0),
+            "reset": math.ceil((burst - remaining) / rate),
+        }
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class RateLimitHeadersMixin:
+    """
+    Adds the ``X-RateLimit-*`` headers computed by ``APIKeyRateThrottle``.
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        rate_limit = getattr(request, "rate_limit", None)
+        if rate_limit:
+            response["X-RateLimit-Limit"] = str(rate_limit["limit"])
+            response["X-RateLimit-Remaining"] = str(rate_limit["remaining"])
+            response["X-RateLimit-Reset"] = str(rate_limit["reset"])
+        return response
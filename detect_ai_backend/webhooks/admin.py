@@ -0,0 +1,16 @@
+from django.contrib import admin
+
+from detect_ai_backend.webhooks.models import Webhook, WebhookDelivery
+
+
+# Register your models here.
+@admin.register(Webhook)
+class WebhookAdmin(admin.ModelAdmin):
+    list_display = ["api_key", "url", "is_active", "created_at"]
+    readonly_fields = ["secret"]
+
+
+@admin.register(WebhookDelivery)
+class WebhookDeliveryAdmin(admin.ModelAdmin):
+    list_display = ["webhook", "api_key_log", "status", "attempts", "next_attempt_at"]
+    list_filter = ["status"]
@@ -0,0 +1,181 @@
+import hashlib
+import hmac
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from detect_ai_backend.api_keys.models import APIKeyLog
+from detect_ai_backend.celery import app as celery_app
+from detect_ai_backend.utils import metrics
+from detect_ai_backend.utils.http import get_session
+from detect_ai_backend.webhooks.models import WebhookDelivery, WebhookDeliveryStatus
+
+DELIVERY_SCHEDULED_KEY = "webhooks:delivery_scheduled"
+
+
+def sign(secret: str, timestamp: int, body: bytes) -> str:
+    """
+    HMAC-SHA256 of ``<timestamp>.<body>``, sent as ``X-Webhook-Signature``.
+    Receivers recompute it with their secret and reject stale timestamps.
+    """
+    message = f"{timestamp}.".encode() + body
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def enqueue_webhook_deliveries(results: dict[int, dict]) -> None:
+    """
+    Queue the results, by log id, for the webhooks of the logs' API keys.
+    """
+    webhook_ids = dict(
+        APIKeyLog.objects.filter(
+            id__in=results, api_key__webhook__is_active=True
+        ).values_list("id", "api_key__webhook__id")
+    )
+    if not webhook_ids:
+        return
+    WebhookDelivery.objects.bulk_create(
+        [
+            WebhookDelivery(
+                webhook_id=webhook_id, api_key_log_id=log_id, payload=results[log_id]
+            )
+            for log_id, webhook_id in webhook_ids.items()
+        ]
+    )
+    transaction.on_commit(schedule_delivery)
+
+
+def schedule_delivery() -> None:
+    if cache.add(DELIVERY_SCHEDULED_KEY, 1, timeout=settings.WEBHOOK_DELIVERY_INTERVAL):
+        celery_app.send_task(f"{settings.APP_NAME}.deliver_webhooks")
+
+
+def _post(deliveries) -> str:
+    """
+    Post a batch of results to their webhook. Returns an error, empty on success.
+    """
+    webhook = deliveries[0].webhook
+    body = json.dumps(
+        {
+            "results": [
+                {"log_id": delivery.api_key_log_id, **delivery.payload}
+                for delivery in deliveries
+            ]
+        }
+    ).encode()
+    timestamp = int(time.time())
+    try:
+        session = get_session(
+            "webhooks",
+            settings.WEBHOOK_DELIVERY_CONCURRENCY,
+            public_only=not settings.WEBHOOK_ALLOW_PRIVATE_ADDRESSES,
+        )
+        response = session.post(
+            webhook.url,
+            data=body,
+            headers={
+                "Content-Type": "application/json",
+                "X-Webhook-Timestamp": str(timestamp),
+                "X-Webhook-Signature": f"sha256={sign(webhook.secret, timestamp, body)}",
+            },
+            timeout=settings.WEBHOOK_TIMEOUT,
+            allow_redirects=False,
+        )
+    except requests.RequestException as exc:
+        return str(exc) or exc.__class__.__name__
+    if not 200 <= response.status_code < 300:
+        return f"HTTP {response.status_code}"
+    return ""
+
+
+def _get_backoff(attempts: int) -> timedelta:
+    return timedelta(
+        seconds=min(
+            settings.WEBHOOK_RETRY_BACKOFF * 2 ** (attempts - 1),
+            settings.WEBHOOK_RETRY_BACKOFF_MAX,
+        )
+    )
+
+
+def _claim_due_deliveries() -> list[list[WebhookDelivery]]:
+    """
+    Lock the due deliveries, skipping those locked by concurrent passes, and
+    push their next attempt past the time this pass may take to post them, so
+    other passes leave them alone. Returns them batched per webhook.
+    """
+    with transaction.atomic():
+        deliveries = list(
+            WebhookDelivery.objects.filter(
+                status=WebhookDeliveryStatus.PENDING,
+                next_attempt_at__lte=timezone.now(),
+            )
+            .select_related("webhook")
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("id")[: settings.WEBHOOK_DELIVERY_LIMIT]
+        )
+        batches = {}
+        for delivery in deliveries:
+            # Retried deliveries are batched again with those of the same attempt
+            key = (delivery.webhook_id, delivery.attempts)
+            batches.setdefault(key, []).append(delivery)
+        chunk_size = settings.WEBHOOK_BATCH_SIZE
+        chunks = []
+        for batch in batches.values():
+            for start in range(0, len(batch), chunk_size):
+                end = start + chunk_size
+                chunks.append(batch[start:end])
+        if chunks:
+            # Each post may wait for the connect and the read timeouts
+            rounds = -(-len(chunks) // settings.WEBHOOK_DELIVERY_CONCURRENCY)
+            lease = timedelta(seconds=2 * settings.WEBHOOK_TIMEOUT * (rounds + 1))
+            WebhookDelivery.objects.filter(
+                id__in=[delivery.id for delivery in deliveries]
+            ).update(next_attempt_at=timezone.now() + lease)
+    return chunks
+
+
+def deliver_pending_webhooks() -> int:
+    """
+    Post due deliveries, batched per webhook and sent concurrently over the
+    pooled session. Failed batches are retried with exponential backoff until
+    ``WEBHOOK_MAX_ATTEMPTS``. Returns the number of deliveries attempted.
+    """
+    chunks = _claim_due_deliveries()
+    if not chunks:
+        return 0
+
+    with ThreadPoolExecutor(settings.WEBHOOK_DELIVERY_CONCURRENCY) as executor:
+        errors = list(executor.map(_post, chunks))
+
+    now = timezone.now()
+    for chunk, error in zip(chunks, errors):
+        ids = [delivery.id for delivery in chunk]
+        if not error:
+            WebhookDelivery.objects.filter(id__in=ids).update(
+                status=WebhookDeliveryStatus.DELIVERED,
+                attempts=F("attempts") + 1,
+                delivered_at=now,
+                last_error="",
+            )
+            metrics.incr("webhooks.delivered", len(ids))
+            continue
+        attempts = chunk[0].attempts + 1
+        WebhookDelivery.objects.filter(id__in=ids).update(
+            status=(
+                WebhookDeliveryStatus.FAILED
+                if attempts >= settings.WEBHOOK_MAX_ATTEMPTS
+                else WebhookDeliveryStatus.PENDING
+            ),
+            attempts=attempts,
+            next_attempt_at=now + _get_backoff(attempts),
+            last_error=error[:1000],
+        )
+        metrics.incr("webhooks.failed_attempts", len(ids))
+    return sum(len(chunk) for chunk in chunks)
@@ -0,0 +1,56 @@
+import secrets
+
+from django.db import models
+from django.utils import timezone
+
+from detect_ai_backend.api_keys.models import APIKey, APIKeyLog
+
+# Create your models here.
+
+
+def webhook_secret_generator():
+    return f"whsec_{secrets.token_urlsafe(32)}"
+
+
+class Webhook(models.Model):
+    """
+    URL the results of an API key's predictions are posted to, signed with
+    ``secret``.
+    """
+
+    api_key = models.OneToOneField(
+        APIKey, on_delete=models.CASCADE, related_name="webhook"
+    )
+    url = models.URLField(max_length=2048)
+    secret = models.CharField(
+        max_length=64, default=webhook_secret_generator, editable=False
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class WebhookDeliveryStatus(models.TextChoices):
+    PENDING = "pending"
+    DELIVERED = "delivered"
+    FAILED = "failed"
+
+
+class WebhookDelivery(models.Model):
+    webhook = models.ForeignKey(
+        Webhook, on_delete=models.CASCADE, related_name="deliveries"
+    )
+    api_key_log = models.ForeignKey(APIKeyLog, on_delete=models.CASCADE)
+    payload = models.JSONField()
+    status = models.CharField(
+        choices=WebhookDeliveryStatus.choices,
+        default=WebhookDeliveryStatus.PENDING,
+        max_length=15,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(blank=True, null=True, default=None)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
@@ -0,0 +1,29 @@
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from rest_framework import serializers
+
+from detect_ai_backend.utils.http import resolves_to_public_addresses
+from detect_ai_backend.webhooks.models import Webhook
+
+
+class WebhookSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Webhook
+        fields = ["url", "secret", "is_active", "created_at"]
+        read_only_fields = ["secret", "created_at"]
+
+    def validate_url(self, value):
+        url = urlsplit(value)
+        if url.scheme not in settings.WEBHOOK_ALLOWED_SCHEMES:
+            raise serializers.ValidationError(
+                "Webhook URL scheme must be one of: "
+                + ", ".join(settings.WEBHOOK_ALLOWED_SCHEMES)
+            )
+        if not settings.WEBHOOK_ALLOW_PRIVATE_ADDRESSES and not (
+            url.hostname and resolves_to_public_addresses(url.hostname)
+        ):
+            raise serializers.ValidationError(
+                "Webhook URL host must resolve to public addresses only."
+            )
+        return value
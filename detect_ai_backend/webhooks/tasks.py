@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from detect_ai_backend.celery import app as celery_app
+from detect_ai_backend.webhooks.delivery import (
+    DELIVERY_SCHEDULED_KEY,
+    deliver_pending_webhooks,
+)
+
+
+@celery_app.task(name=f"{settings.APP_NAME}.deliver_webhooks")
+def deliver_webhooks():
+    cache.delete(DELIVERY_SCHEDULED_KEY)
+    delivered = deliver_pending_webhooks()
+    if delivered >= settings.WEBHOOK_DELIVERY_LIMIT:
+        celery_app.send_task(f"{settings.APP_NAME}.deliver_webhooks")
+    return delivered
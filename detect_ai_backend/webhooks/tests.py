@@ -0,0 +1,219 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from detect_ai_backend.api_keys.models import APIKey, APIKeyLog
+from detect_ai_backend.users.models import User
+from detect_ai_backend.utils.testing import WebhookReceiver
+from detect_ai_backend.webhooks.delivery import (
+    _claim_due_deliveries,
+    deliver_pending_webhooks,
+    enqueue_webhook_deliveries,
+    sign,
+)
+from detect_ai_backend.webhooks.models import (
+    Webhook,
+    WebhookDelivery,
+    WebhookDeliveryStatus,
+)
+
+
+class WebhookViewTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="hooks@example.com",
+            password="testpass",  # nosec
+        )
+        self.api_key = APIKey.objects.create(user=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("api_key_webhook", args=[self.api_key.id])
+
+    def test_register_webhook(self):
+        response = self.client.put(self.url, {"url": "https://example.com/hook"})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data["secret"].startswith("whsec_"))
+        self.assertEqual(self.api_key.webhook.url, "https://example.com/hook")
+
+        response = self.client.put(self.url, {"url": "https://example.com/other"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Webhook.objects.get().url, "https://example.com/other")
+
+    @override_settings(WEBHOOK_ALLOWED_SCHEMES=["https"])
+    def test_register_webhook_rejects_plain_http(self):
+        response = self.client.put(self.url, {"url": "http://example.com/hook"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(WEBHOOK_ALLOW_PRIVATE_ADDRESSES=False)
+    def test_register_webhook_rejects_private_hosts(self):
+        for url in [
+            "http://127.0.0.1/hook",
+            "http://localhost/hook",
+            "http://10.0.0.1/hook",
+            "http://169.254.169.254/latest/meta-data",
+            "http://[::ffff:127.0.0.1]/hook",
+            "http://unresolvable.invalid/hook",
+        ]:
+            with self.subTest(url=url):
+                response = self.client.put(self.url, {"url": url})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.put(self.url, {"url": "http://93.184.216.34/hook"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_webhook_of_other_user_is_not_found(self):
+        other = User.objects.create_user(
+            email="other@example.com", password="testpass"  # nosec
+        )
+        self.client.force_authenticate(user=other)
+        response = self.client.put(self.url, {"url": "https://example.com/hook"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_delete_webhook(self):
+        Webhook.objects.create(api_key=self.api_key, url="https://example.com/hook")
+        response = self.client.delete(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Webhook.objects.exists())
+
+
+@patch("detect_ai_backend.webhooks.delivery.celery_app")
+class WebhookDeliveryTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="hooks@example.com",
+            password="testpass",  # nosec
+        )
+        self.api_key = APIKey.objects.create(user=self.user)
+        self.logs = [APIKeyLog.objects.create(api_key=self.api_key) for _ in range(5)]
+
+    def enqueue(self, receiver):
+        self.webhook = Webhook.objects.create(api_key=self.api_key, url=receiver.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue_webhook_deliveries(
+                {log.id: {"status": "success"} for log in self.logs}
+            )
+
+    def test_enqueue_skips_keys_without_webhook(self, mock_celery_app):
+        enqueue_webhook_deliveries({self.logs[0].id: {"status": "success"}})
+
+        self.assertFalse(WebhookDelivery.objects.exists())
+        mock_celery_app.send_task.assert_not_called()
+
+    @override_settings(WEBHOOK_BATCH_SIZE=2)
+    def test_deliveries_are_batched_and_signed(self, mock_celery_app):
+        with WebhookReceiver() as receiver:
+            self.enqueue(receiver)
+            mock_celery_app.send_task.assert_called_once()
+
+            self.assertEqual(deliver_pending_webhooks(), 5)
+
+        self.assertEqual(len(receiver.requests), 3)
+        batches = sorted(
+            [item["log_id"] for item in request["body"]["results"]]
+            for request in receiver.requests
+        )
+        ids = [log.id for log in self.logs]
+        self.assertEqual(batches, [ids[0:2], ids[2:4], ids[4:]])
+        self.assertFalse(
+            WebhookDelivery.objects.exclude(
+                status=WebhookDeliveryStatus.DELIVERED
+            ).exists()
+        )
+
+        request = next(
+            request
+            for request in receiver.requests
+            if request["body"]["results"][0]["log_id"] == self.logs[0].id
+        )
+        headers = request["headers"]
+        body = (
+            '{"results": [{"log_id": %d, "status": "success"}, '
+            '{"log_id": %d, "status": "success"}]}'
+        ) % (self.logs[0].id, self.logs[1].id)
+        self.assertEqual(
+            headers["X-Webhook-Signature"],
+            "sha256="
+            + sign(
+                self.webhook.secret,
+                int(headers["X-Webhook-Timestamp"]),
+                body.encode(),
+            ),
+        )
+
+    @override_settings(WEBHOOK_RETRY_BACKOFF=10, WEBHOOK_MAX_ATTEMPTS=2)
+    def test_failed_deliveries_are_retried_with_backoff(self, mock_celery_app):
+        with WebhookReceiver(responses=[500, 503]) as receiver:
+            self.enqueue(receiver)
+            deliver_pending_webhooks()
+
+            delivery = WebhookDelivery.objects.first()
+            self.assertEqual(delivery.status, WebhookDeliveryStatus.PENDING)
+            self.assertEqual(delivery.attempts, 1)
+            self.assertEqual(delivery.last_error, "HTTP 500")
+            self.assertGreater(
+                delivery.next_attempt_at, timezone.now() + timedelta(seconds=5)
+            )
+            # Not due yet
+            self.assertEqual(deliver_pending_webhooks(), 0)
+
+            WebhookDelivery.objects.update(next_attempt_at=timezone.now())
+            deliver_pending_webhooks()
+
+        self.assertEqual(len(receiver.requests), 2)
+        self.assertEqual(
+            set(WebhookDelivery.objects.values_list("status", flat=True)),
+            {WebhookDeliveryStatus.FAILED},
+        )
+
+    @override_settings(WEBHOOK_TIMEOUT=1)
+    def test_unreachable_webhook_is_retried(self, mock_celery_app):
+        with WebhookReceiver() as receiver:
+            url = receiver.url
+        self.webhook = Webhook.objects.create(api_key=self.api_key, url=url)
+        enqueue_webhook_deliveries({self.logs[0].id: {"status": "success"}})
+
+        deliver_pending_webhooks()
+
+        delivery = WebhookDelivery.objects.get()
+        self.assertEqual(delivery.status, WebhookDeliveryStatus.PENDING)
+        self.assertTrue(delivery.last_error)
+
+    @override_settings(WEBHOOK_ALLOW_PRIVATE_ADDRESSES=False)
+    def test_private_address_is_refused_on_delivery(self, mock_celery_app):
+        # e.g. a host re-resolving to a private address after registration
+        with WebhookReceiver() as receiver:
+            self.enqueue(receiver)
+            deliver_pending_webhooks()
+
+        self.assertEqual(receiver.requests, [])
+        delivery = WebhookDelivery.objects.first()
+        self.assertEqual(delivery.status, WebhookDeliveryStatus.PENDING)
+        self.assertIn("non-public address", delivery.last_error)
+
+    def test_claimed_deliveries_are_skipped_by_other_passes(self, mock_celery_app):
+        with WebhookReceiver() as receiver:
+            self.enqueue(receiver)
+            chunks = _claim_due_deliveries()
+            self.assertEqual(sum(len(chunk) for chunk in chunks), 5)
+
+            self.assertEqual(deliver_pending_webhooks(), 0)
+            self.assertFalse(
+                WebhookDelivery.objects.filter(
+                    next_attempt_at__lte=timezone.now()
+                ).exists()
+            )
+
+            # Claims of a pass that died are picked up once they lapse
+            WebhookDelivery.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(deliver_pending_webhooks(), 5)
+
+        self.assertEqual(len(receiver.requests), 1)
@@ -0,0 +1,34 @@
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, response, status
+
+from detect_ai_backend.api_keys.models import APIKey
+from detect_ai_backend.utils.permissions import IsAuthenticationButNotAdmin
+from detect_ai_backend.webhooks.models import Webhook
+from detect_ai_backend.webhooks.serializers import WebhookSerializer
+
+
+class WebhookView(generics.RetrieveUpdateDestroyAPIView):
+    """
+    Webhook of one of the user's API keys. PUT registers or replaces it.
+    """
+
+    permission_classes = [IsAuthenticationButNotAdmin]
+    serializer_class = WebhookSerializer
+    http_method_names = ["get", "put", "delete"]
+
+    def get_api_key(self):
+        return get_object_or_404(APIKey, user=self.request.user, id=self.kwargs["id"])
+
+    def get_object(self):
+        return get_object_or_404(Webhook, api_key=self.get_api_key())
+
+    def put(self, request, *args, **kwargs):
+        api_key = self.get_api_key()
+        instance = Webhook.objects.filter(api_key=api_key).first()
+        serializer = self.get_serializer(instance, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(api_key=api_key)
+        return response.Response(
+            serializer.data,
+            status=status.HTTP_200_OK if instance else status.HTTP_201_CREATED,
+        )
@@ -1,8 +1 @@
-from django.contrib import admin
-
-from detect_ai_backend.websocket.models import Websocket
-
 # Register your models here.
-
-# Register your models here.
-admin.site.register(Websocket)
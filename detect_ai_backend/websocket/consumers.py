@@ -1,58 +1,71 @@
 import json
-import uuid
+from urllib.parse import parse_qs
 
-from asgiref.sync import async_to_sync
-from channels.generic.websocket import WebsocketConsumer
-from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from rest_framework_simplejwt.tokens import AccessToken
+from channels.generic.websocket import AsyncWebsocketConsumer
 
-from detect_ai_backend.websocket.models import Websocket
+from detect_ai_backend.predictions.status import areplay_missed_results
+from detect_ai_backend.utils.celery import get_user_group
 
-User = get_user_model()
 
+class WsConsumer(AsyncWebsocketConsumer):
+    """
+    Pushes the user's prediction results. Runs on the event loop, so an idle
+    connection holds no thread.
 
-class WsConsumer(WebsocketConsumer):
-    def connect(self):
-        user = self.scope["user"]
-        self.connection_id = uuid.uuid4().hex
-        async_to_sync(self.channel_layer.group_add)(
-            str(self.connection_id), self.channel_name
-        )
-        Websocket.objects.create(**{"connection_id": self.connection_id, "user": user})
-        self.accept("Token")
+    Each message carries its ``log_id`` and ``event_id``, the event id of the
+    result's ``History`` row, which increases in storing order: a client
+    reconnecting to ``/ws?last_event_id=<id>`` first receives the results it
+    missed.
+    """
 
-    def disconnect(self, close_code):
-        async_to_sync(
-            self.channel_layer.group_discard(self.connection_id, self.channel_name)
-        )
-        Websocket.objects.filter(connection_id=self.connection_id).delete()
+    async def connect(self):
+        # Results are published once to the user's group, which every
+        # connection of the user joins
+        self.group = get_user_group(self.scope["user"].id)
+        # Subscribe before replaying so nothing published meanwhile is lost
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept("Token")
+
+        self.replayed = set()
+        last_event_id = self.get_last_event_id()
+        if last_event_id:
+            missed = areplay_missed_results(self.scope["user"].id, last_event_id)
+            async for event_id, log_id, result in missed:
+                self.replayed.add(log_id)
+                await self.send_message(log_id, event_id, result)
 
-    def receive(self, text_data):
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
         pass
 
-    def send_result(self, event):
+    async def send_result(self, event):
         # Receive message from room group
-        message = event["message"]
-        # Send message to WebSocket
-        self.send(text_data=json.dumps(message))
-
-    def authenticate_user(self, token):
-        try:
-            # Validate the token
-            validated_token = AccessToken(token)
+        if event.get("log_id") in self.replayed:
+            return
+        await self.send_message(
+            event.get("log_id"), event.get("event_id"), event["message"]
+        )
 
-            # Get the user ID from the token
-            user_id = validated_token["user_id"]
+    async def settle_predictions(self, event):
+        # Predictions settled without a result, only the status endpoint uses it
+        pass
 
-            # Fetch the user
-            user = User.objects.get(id=user_id)
-            return user
+    async def send_message(self, log_id, event_id, result):
+        # Send message to WebSocket
+        await self.send(
+            text_data=json.dumps({**result, "log_id": log_id, "event_id": event_id})
+        )
 
-        except (InvalidToken, TokenError, User.DoesNotExist):
-            return None
+    def get_last_event_id(self) -> int:
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        try:
+            return int(query.get("last_event_id", ["0"])[0])
+        except ValueError:
+            return 0
 
 
-class Handle404Consumer(WebsocketConsumer):
-    def connect(self):
-        self.close(code=404)
+class Handle404Consumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        await self.close(code=404)
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import WebsocketConsumer
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from detect_ai_backend.utils.admission import CLOSE_CODE_OVERLOADED, AdmissionMiddleware
+from detect_ai_backend.utils.authentication import AuthMiddlewareStack
+from detect_ai_backend.utils.celery import get_user_group
+from detect_ai_backend.websocket.consumers import WsConsumer
+
+BENCHMARK_USER_ID = 0
+
+
+class SyncWsConsumer(WebsocketConsumer):
+    """
+    The previous thread-bound consumer, kept as the benchmark baseline.
+    """
+
+    def connect(self):
+        self.group = get_user_group(self.scope["user"].id)
+        async_to_sync(self.channel_layer.group_add)(self.group, self.channel_name)
+        self.accept("Token")
+
+    def disconnect(self, close_code):
+        async_to_sync(self.channel_layer.group_discard)(self.group, self.channel_name)
+
+    def send_result(self, event):
+        self.send(text_data=json.dumps(event["message"]))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run_benchmark(consumer_class, connections, rounds) -> dict:
+    """
+    Open the connections of one user, publish results to the user's group and
+    time their delivery to every connection.
+    """
+    application = consumer_class.as_asgi()
+    channel_layer = get_channel_layer()
+    group = get_user_group(BENCHMARK_USER_ID)
+    threads = threading.active_count()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    communicators = []
+    for _ in range(connections):
+        communicator = WebsocketCommunicator(application, "/ws", subprotocols=["Token"])
+        communicator.scope["user"] = SimpleNamespace(id=BENCHMARK_USER_ID)
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise RuntimeError(f"{consumer_class.__name__} rejected the connection")
+        communicators.append(communicator)
+    connect_time = time.perf_counter() - started
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    threads = threading.active_count() - threads
+
+    latencies = []
+
+    async def receive(communicator, sent_at):
+        await communicator.receive_from(timeout=30)
+        latencies.append(time.perf_counter() - sent_at)
+
+    for index in range(rounds):
+        sent_at = time.perf_counter()
+        await channel_layer.group_send(
+            group,
+            {"type": "send_result", "log_id": index, "message": {"status": "success"}},
+        )
+        await asyncio.gather(
+            *(receive(communicator, sent_at) for communicator in communicators)
+        )
+
+    for communicator in communicators:
+        await communicator.disconnect()
+
+    return {
+        "connections_per_second": connections / connect_time,
+        "memory_per_connection": memory / connections,
+        "threads": threads,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "mean": statistics.fmean(latencies),
+    }
+
+
+async def run_storm(connections, time_scale) -> dict:
+    """
+    Reconnect every client at once through the admission control. Refused
+    clients retry after the advertised delay, multiplied by ``time_scale``.
+    """
+    application = AdmissionMiddleware(AuthMiddlewareStack(WsConsumer.as_asgi()))
+    communicators = []
+    refusals = 0
+    peak = 0
+
+    async def connect(user_id):
+        nonlocal refusals
+        token = AccessToken()
+        token[api_settings.USER_ID_CLAIM] = user_id
+        token = str(token)
+        while True:
+            communicator = WebsocketCommunicator(
+                application,
+                "/ws",
+                headers=[(b"sec-websocket-protocol", f"Token, {token}".encode())],
+                subprotocols=["Token", token],
+            )
+            connected, _ = await communicator.connect(timeout=30)
+            if not connected:
+                raise RuntimeError("Handshake rejected")
+            # Refused handshakes are closed right after the accept
+            if await communicator.receive_nothing(timeout=0.01, interval=0.001):
+                communicators.append(communicator)
+                return
+            message = await communicator.receive_output()
+            if message.get("code") != CLOSE_CODE_OVERLOADED:
+                raise RuntimeError(f"Unexpected message {message}")
+            refusals += 1
+            retry_after = int(message["reason"].removeprefix("retry-after="))
+            await asyncio.sleep(retry_after * time_scale)
+
+    async def sample():
+        nonlocal peak
+        while True:
+            peak = max(peak, application.handshakes)
+            await asyncio.sleep(0.001)
+
+    sampler = asyncio.ensure_future(sample())
+    started = time.perf_counter()
+    await asyncio.gather(*(connect(user_id) for user_id in range(connections)))
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+
+    for communicator in communicators:
+        await communicator.disconnect()
+
+    return {"elapsed": elapsed, "refusals": refusals, "peak": peak}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare connections per process and result delivery latency of the "
+        "async websocket consumer against the previous sync one, and measure "
+        "handshakes under a reconnect storm."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=1000)
+        parser.add_argument("--rounds", type=int, default=20)
+        parser.add_argument(
+            "--storm",
+            type=int,
+            default=0,
+            help="Also reconnect this many clients at once through admission control.",
+        )
+        parser.add_argument(
+            "--time-scale",
+            type=float,
+            default=0.1,
+            help="Factor applied to the retry-after delays of refused clients.",
+        )
+
+    def handle(self, *args, **options):
+        # Measure the consumers, not the broker
+        channel_layers = {
+            "default": {
+                "BACKEND": "channels.layers.InMemoryChannelLayer",
+                "CONFIG": {"capacity": options["rounds"] + 1},
+            }
+        }
+        with override_settings(CHANNEL_LAYERS=channel_layers):
+            for consumer_class in (SyncWsConsumer, WsConsumer):
+                result = asyncio.run(
+                    run_benchmark(
+                        consumer_class, options["connections"], options["rounds"]
+                    )
+                )
+                self.stdout.write(
+                    f"{consumer_class.__name__}: "
+                    f"{result['connections_per_second']:.0f} connections/s, "
+                    f"{result['memory_per_connection'] / 1024:.1f} KiB/connection, "
+                    f"{result['threads']} extra threads, "
+                    f"delivery p50 {result['p50'] * 1000:.1f} ms, "
+                    f"p95 {result['p95'] * 1000:.1f} ms, "
+                    f"mean {result['mean'] * 1000:.1f} ms"
+                )
+            if options["storm"]:
+                result = asyncio.run(run_storm(options["storm"], options["time_scale"]))
+                self.stdout.write(
+                    f"Storm of {options['storm']} reconnects: "
+                    f"all connected in {result['elapsed']:.2f} s "
+                    f"({options['storm'] / result['elapsed']:.0f} handshakes/s), "
+                    f"{result['refusals']} refusals, "
+                    f"at most {result['peak']} handshakes in progress "
+                    f"(cap {settings.WEBSOCKET_MAX_HANDSHAKES})"
+                )
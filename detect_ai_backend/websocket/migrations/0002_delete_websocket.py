@@ -0,0 +1,16 @@
+# Generated by Django 5.0.10 on 2026-10-18 16:48
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("websocket", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name="Websocket",
+        ),
+    ]
@@ -0,0 +1,290 @@
+import asyncio
+from datetime import timedelta
+from unittest.mock import patch
+
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from detect_ai_backend.api_keys.models import APIKey, APIKeyLog
+from detect_ai_backend.history.models import History
+from detect_ai_backend.users.models import User
+from detect_ai_backend.utils.admission import CLOSE_CODE_OVERLOADED, AdmissionMiddleware
+from detect_ai_backend.utils.authentication import (
+    AuthMiddlewareStack,
+    LazyUser,
+    verified_tokens,
+    verify_token,
+)
+from detect_ai_backend.utils.celery import get_user_group
+from detect_ai_backend.websocket.consumers import WsConsumer
+
+
+class WsConsumerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="socket@example.com",
+            password="testpass",  # nosec
+        )
+
+    async def connect(self, path="/ws"):
+        communicator = WebsocketCommunicator(
+            WsConsumer.as_asgi(), path, subprotocols=["Token"]
+        )
+        communicator.scope["user"] = self.user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_connections_of_user_receive_group_results(self):
+        communicators = [await self.connect(), await self.connect()]
+
+        await get_channel_layer().group_send(
+            get_user_group(self.user.id),
+            {"type": "send_result", "log_id": 1, "message": {"status": "success"}},
+        )
+
+        for communicator in communicators:
+            self.assertEqual(
+                await communicator.receive_json_from(),
+                {"status": "success", "log_id": 1, "event_id": None},
+            )
+            await communicator.disconnect()
+
+    async def test_reconnect_replays_missed_results(self):
+        api_key = await APIKey.objects.acreate(user=self.user)
+        logs = [await APIKeyLog.objects.acreate(api_key=api_key) for _ in range(3)]
+        # Results complete out of submission order, and rows are stored out of
+        # id order by concurrent transactions
+        histories = [
+            await History.objects.acreate(
+                user=self.user,
+                image_url="https://example.com/a.png",
+                results={"status": "success"},
+                api_key_log=log,
+                event_id=event_id,
+            )
+            for log, event_id in [(logs[2], 1), (logs[0], 3), (logs[1], 2)]
+        ]
+        seen, second, first = histories
+
+        communicator = await self.connect("/ws?last_event_id=1")
+
+        for history in [first, second]:
+            self.assertEqual(
+                await communicator.receive_json_from(),
+                {
+                    "status": "success",
+                    "log_id": history.api_key_log_id,
+                    "event_id": history.event_id,
+                },
+            )
+        # A result published meanwhile and already replayed is not sent twice
+        for log_id, event_id in [
+            (second.api_key_log_id, 3),
+            (seen.api_key_log_id + 1, 4),
+        ]:
+            await get_channel_layer().group_send(
+                get_user_group(self.user.id),
+                {
+                    "type": "send_result",
+                    "log_id": log_id,
+                    "event_id": event_id,
+                    "message": {},
+                },
+            )
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {"log_id": seen.api_key_log_id + 1, "event_id": 4},
+        )
+        await communicator.disconnect()
+
+    @override_settings(PREDICTION_STREAM_REPLAY_PAGE_SIZE=2)
+    async def test_replay_is_not_truncated(self):
+        api_key = await APIKey.objects.acreate(user=self.user)
+        for event_id in range(1, 7):
+            await History.objects.acreate(
+                user=self.user,
+                image_url="https://example.com/a.png",
+                results={},
+                api_key_log=await APIKeyLog.objects.acreate(api_key=api_key),
+                event_id=event_id,
+            )
+
+        communicator = await self.connect("/ws?last_event_id=1")
+
+        for event_id in range(2, 7):
+            message = await communicator.receive_json_from()
+            self.assertEqual(message["event_id"], event_id)
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_disconnected_socket_leaves_group(self):
+        communicator = await self.connect()
+        await communicator.disconnect()
+
+        channel_layer = get_channel_layer()
+        self.assertFalse(channel_layer.groups.get(get_user_group(self.user.id)))
+
+
+class AuthMiddlewareTestCase(TestCase):
+    def setUp(self):
+        verified_tokens.clear()
+        self.user = User.objects.create_user(
+            email="socket@example.com",
+            password="testpass",  # nosec
+        )
+
+    def communicator(self, token):
+        return WebsocketCommunicator(
+            AuthMiddlewareStack(WsConsumer.as_asgi()),
+            "/ws",
+            headers=[(b"sec-websocket-protocol", f"Token, {token}".encode())],
+            subprotocols=["Token", token],
+        )
+
+    async def test_token_subprotocol_handshake(self):
+        token = str(AccessToken.for_user(self.user))
+        communicator = self.communicator(token)
+
+        connected, subprotocol = await communicator.connect()
+
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, "Token")
+        await communicator.disconnect()
+
+    async def test_expired_token_is_rejected(self):
+        token = AccessToken.for_user(self.user)
+        token.set_exp(lifetime=-timedelta(seconds=1))
+
+        connected, code = await self.communicator(str(token)).connect()
+
+        self.assertFalse(connected)
+        self.assertEqual(code, 4001)
+
+    def test_verified_tokens_are_cached(self):
+        token = str(AccessToken.for_user(self.user))
+
+        with patch(
+            "detect_ai_backend.utils.authentication.AccessToken", wraps=AccessToken
+        ) as mock_access_token:
+            self.assertEqual(verify_token(token)["user_id"], self.user.id)
+            self.assertEqual(verify_token(token)["user_id"], self.user.id)
+
+        mock_access_token.assert_called_once()
+        self.assertIsNone(verify_token("invalid"))
+
+    async def test_lazy_user_loads_user_on_demand(self):
+        user = LazyUser(verify_token(str(AccessToken.for_user(self.user))))
+
+        self.assertEqual(user.id, self.user.id)
+        self.assertTrue(user.is_authenticated)
+        self.assertEqual(await user.aget_user(), self.user)
+
+
+class HeldConsumer(AsyncWebsocketConsumer):
+    """
+    Accepts once the test releases the handshakes, or before when
+    ``accept_first``, like a consumer replaying missed results after accepting.
+    """
+
+    released = None
+    accept_first = False
+
+    async def connect(self):
+        if self.accept_first:
+            await self.accept("Token")
+        await self.released.wait()
+        if not self.accept_first:
+            await self.accept("Token")
+
+
+@override_settings(
+    WEBSOCKET_MAX_HANDSHAKES=3, WEBSOCKET_MAX_USER_HANDSHAKES=2, WEBSOCKET_RETRY_AFTER=1
+)
+class AdmissionMiddlewareTestCase(TestCase):
+    def setUp(self):
+        verified_tokens.clear()
+        HeldConsumer.released = asyncio.Event()
+        HeldConsumer.accept_first = False
+        self.application = AdmissionMiddleware(
+            AuthMiddlewareStack(HeldConsumer.as_asgi())
+        )
+
+    def communicator(self, user_id):
+        token = AccessToken()
+        token["user_id"] = user_id
+        return WebsocketCommunicator(
+            self.application,
+            "/ws",
+            headers=[(b"sec-websocket-protocol", f"Token, {token}".encode())],
+            subprotocols=["Token", str(token)],
+        )
+
+    async def assert_refused(self, communicator):
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        message = await communicator.receive_output()
+        self.assertEqual(message["code"], CLOSE_CODE_OVERLOADED)
+        self.assertIn(message["reason"], ["retry-after=1", "retry-after=2"])
+
+    async def test_storm_is_capped_per_process_and_per_user(self):
+        communicators = [self.communicator(user_id) for user_id in [1, 1, 1, 2, 3, 4]]
+        handshakes = [
+            asyncio.ensure_future(communicator.connect(timeout=5))
+            for communicator in communicators[:2]
+        ]
+        await asyncio.sleep(0.05)
+
+        # The third handshake of user 1 exceeds the per user cap
+        await self.assert_refused(communicators[2])
+        handshakes.append(asyncio.ensure_future(communicators[3].connect(timeout=5)))
+        await asyncio.sleep(0.05)
+        # Three handshakes are in progress, the process is full
+        await self.assert_refused(communicators[4])
+        self.assertEqual(self.application.handshakes, 3)
+
+        HeldConsumer.released.set()
+        for handshake in handshakes:
+            self.assertEqual(await handshake, (True, "Token"))
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.application.handshakes, 0)
+        self.assertFalse(self.application.user_handshakes)
+
+        # Established connections do not count
+        self.assertEqual(await communicators[5].connect(), (True, "Token"))
+        for communicator in communicators:
+            await communicator.disconnect()
+
+    async def test_handshake_lasts_until_connect_returns(self):
+        HeldConsumer.accept_first = True
+        communicators = [self.communicator(user_id) for user_id in [1, 2, 3, 4]]
+        for communicator in communicators[:3]:
+            self.assertEqual(await communicator.connect(), (True, "Token"))
+
+        # Accepted but still sending after the accept
+        self.assertEqual(self.application.handshakes, 3)
+        await self.assert_refused(communicators[3])
+
+        HeldConsumer.released.set()
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.application.handshakes, 0)
+        self.assertFalse(self.application.user_handshakes)
+        for communicator in communicators:
+            await communicator.disconnect()
+
+    async def test_rejected_token_ends_handshake(self):
+        communicator = WebsocketCommunicator(
+            self.application,
+            "/ws",
+            headers=[(b"sec-websocket-protocol", b"Token, invalid")],
+            subprotocols=["Token", "invalid"],
+        )
+
+        connected, code = await communicator.connect()
+
+        self.assertFalse(connected)
+        self.assertEqual(code, 4001)
+        self.assertEqual(self.application.handshakes, 0)
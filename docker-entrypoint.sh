@@ -6,6 +6,11 @@ python3 manage.py migrate
 echo "Starting collectstatic"
 python3 manage.py collectstatic
 
-echo "Starting server & celery server"
+echo "Starting server, outbox relay, celery beat & workers"
 daphne -b 0.0.0.0 -p 80 detect_ai_backend.asgi:application &
-celery -A detect_ai_backend worker -l INFO --concurrency 4 -P solo -E -n backend_worker
+python3 manage.py relay_outbox &
+python3 manage.py run_beat &
+# Workers run many short tasks, their database connections are kept open
+DB_CONN_MAX_AGE=300 python3 manage.py run_worker delivery &
+DB_CONN_MAX_AGE=300 python3 manage.py run_worker persistence &
+DB_CONN_MAX_AGE=300 python3 manage.py run_worker backend